@@ -13,15 +13,18 @@ def check_cases(api_url):
     """
     Compare cases to cards for a given tag
     """
-    cases = requests.get("{}/api/cases".format(api_url))
+    cases = requests.get(
+        "{}/api/cases".format(api_url), params={"status": "Closed", "fields": "status"}
+    )
     if cases.status_code == 200:
-        closed_cases = {
-            c: d for (c, d) in cases.json().items() if d["status"] == "Closed"
-        }
+        closed_cases = cases.json()
     else:
         print("could not retrieve cases: {}".format(cases.status_code))
         sys.exit(1)
-    cards = requests.get("{}/api/cards".format(api_url))
+    cards = requests.get(
+        "{}/api/cards".format(api_url),
+        params={"fields": "card_status,case_number,assignee"},
+    )
     if cases.status_code == 200:
         open_cards = {
             c: d
@@ -1,8 +1,9 @@
 """API endpoints for t5gweb"""
 
 import json
+from datetime import date
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, make_response, request
 from flask_login import login_required
 from t5gweb.cache import (
     get_bz_details,
@@ -13,11 +14,27 @@ from t5gweb.cache import (
     get_issue_details,
     get_stats,
 )
-from t5gweb.libtelco5g import generate_stats, redis_get, redis_set, sync_portal_to_jira
-from t5gweb.utils import set_cfg
+from t5gweb.database import case_counts, comment_velocity, db_config, time_to_close
+from t5gweb.libtelco5g import (
+    RECORD_FILTERS,
+    card_writer_status,
+    compression_stats,
+    get_stats_snapshot,
+    query_records,
+    redis_get,
+    redis_get_raw,
+    redis_pool_stats,
+    redis_set,
+    redis_version,
+    sync_portal_to_jira,
+)
+from t5gweb.utils import set_cfg, to_epoch
 
 BP = Blueprint("api", __name__, url_prefix="/api")
 
+# bytes of serialized records sent per chunk of a streamed response
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 @BP.route("/")
 @login_required
@@ -39,6 +56,10 @@ def index():
             "{}escalations".format(request.base_url),
             "{}issues".format(request.base_url),
             "{}stats".format(request.base_url),
+            "{}status".format(request.base_url),
+            "{}analytics/case-counts".format(request.base_url),
+            "{}analytics/comment-velocity".format(request.base_url),
+            "{}analytics/time-to-close".format(request.base_url),
         ]
     }
     return endpoints
@@ -100,17 +121,142 @@ def refresh(data_type):
 @BP.route("/cards")
 @login_required
 def show_cards():
-    """Return cached JIRA cards data in JSON format."""
-    cards = redis_get("cards")
-    return jsonify(cards)
+    """Return cached JIRA cards data in JSON format, see _show_records()."""
+    return _show_records("cards")
 
 
 @BP.route("/cases")
 @login_required
 def show_cases():
-    """Return all Red Hat Portal cases from cache in JSON format."""
-    cases = redis_get("cases")
-    return jsonify(cases)
+    """Return Red Hat Portal cases from cache in JSON format, see _show_records()."""
+    return _show_records("cases")
+
+
+def _show_records(name):
+    """Return filtered cards or cases in JSON format
+
+    Supported query parameters:
+        - status, account, engineer, severity: exact matches, see RECORD_FILTERS
+        - updated_since: epoch seconds or a '%Y-%m-%dT%H:%M:%SZ' date
+        - fields: comma-separated list of record keys to return
+        - limit: maximum number of records; the cursor of the next page is
+          returned in the X-Next-Cursor header
+        - cursor: value of X-Next-Cursor from the previous page
+        - format: 'json' (default) or 'ndjson' for one record per line
+
+    Without query parameters the cached JSON is sent as stored in Redis,
+    without decoding it, but the whole value is still read (and decompressed)
+    into memory first. Filtered results are fetched as a whole page and then
+    serialized while they are streamed, see _stream_records(), so memory
+    grows with the page size; use limit to bound it.
+
+    Responses carry an ETag derived from the dataset's version counter, so
+    requests with a matching If-None-Match get an empty 304 until the data is
+    rewritten.
+
+    Args:
+        name: Dataset name, either 'cards' or 'cases'
+
+    Returns:
+        Response: JSON response with the matching records keyed by ID, a 304
+            response, or a 400 response describing an invalid parameter
+    """
+    args = request.args
+    filters = {field: args[field] for field in RECORD_FILTERS if field in args}
+    fields = args["fields"].split(",") if "fields" in args else None
+    # invalid requests get a 400 even if their ETag would match
+    try:
+        updated_since = args.get("updated_since")
+        if updated_since is not None:
+            try:
+                updated_since = float(updated_since)
+            except ValueError:
+                updated_since = to_epoch(updated_since)
+        limit = int(args["limit"]) if "limit" in args else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be positive")
+        output_format = args.get("format", "json")
+        if output_format not in ("json", "ndjson"):
+            raise ValueError("unknown format: {}".format(output_format))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # read the version before the data, so the ETag never claims newer data
+    version = redis_version(name)
+    etag = "{}-{}".format(name, version) if version is not None else None
+    if etag is not None and request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    if not args:
+        response = _raw_response(name)
+        if etag is not None:
+            response.set_etag(etag)
+        return response
+
+    try:
+        records, next_cursor = query_records(
+            name, filters, updated_since, fields, limit, args.get("cursor")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = Response(
+        _stream_records(records, output_format == "ndjson"),
+        mimetype=(
+            "application/x-ndjson" if output_format == "ndjson" else "application/json"
+        ),
+    )
+    if etag is not None:
+        response.set_etag(etag)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+def _raw_response(key):
+    """Respond with a cached JSON value exactly as it is stored in Redis
+
+    The value is read from Redis in one piece, see redis_get_raw().
+    """
+    raw = redis_get_raw(key)
+    return Response(raw if raw is not None else b"{}", mimetype="application/json")
+
+
+def _stream_records(records, ndjson=False):
+    """Serialize records piecewise for a streamed response
+
+    The records are already in memory, but their serialized form is only
+    held one chunk at a time instead of as the whole response body.
+
+    Args:
+        records: Dictionary of records keyed by ID
+        ndjson: Boolean indicating whether to write one '{"<id>": <record>}'
+            object per line instead of a single JSON object
+
+    Yields:
+        str: Chunks of the response body of about STREAM_CHUNK_SIZE bytes
+    """
+    chunk = [] if ndjson else ["{"]
+    size = 0
+    for i, (record_id, record) in enumerate(records.items()):
+        if ndjson:
+            item = json.dumps({record_id: record}) + "\n"
+        else:
+            item = "{}{}: {}".format(
+                ", " if i else "", json.dumps(record_id), json.dumps(record)
+            )
+        chunk.append(item)
+        size += len(item)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    if not ndjson:
+        chunk.append("}")
+    if chunk:
+        yield "".join(chunk)
 
 
 @BP.route("/bugs")
@@ -141,13 +287,73 @@ def show_details():
 @login_required
 def show_issues():
     """Return all JIRA issues associated with open cases in JSON format."""
-    issues = redis_get("issues")
-    return jsonify(issues)
+    return _raw_response("issues")
 
 
 @BP.route("/stats")
 @login_required
 def show_stats():
-    """Generate and return current statistics in JSON format."""
-    stats = generate_stats()
+    """Return the current statistics in JSON format."""
+    stats = get_stats_snapshot()["stats"]
     return jsonify(stats)
+
+
+@BP.route("/status")
+@login_required
+def show_status():
+    """Return Redis and database pool usage, compression and card writer lag."""
+    status = {
+        "redis": redis_pool_stats(),
+        "database": db_config.pool_stats(),
+        "compression": compression_stats(),
+        "card_writer": card_writer_status(),
+    }
+    return jsonify(status)
+
+
+@BP.route("/analytics/case-counts")
+@login_required
+def show_case_counts():
+    """Return the number of cases per account and status, see _analytics()."""
+    return _analytics(case_counts, "account")
+
+
+@BP.route("/analytics/comment-velocity")
+@login_required
+def show_comment_velocity():
+    """Return the JIRA comments per engineer and week, see _analytics()."""
+    return _analytics(comment_velocity, "engineer")
+
+
+@BP.route("/analytics/time-to-close")
+@login_required
+def show_time_to_close():
+    """Return the days to close cases per quarter and severity, see _analytics()."""
+    return _analytics(time_to_close, "account")
+
+
+def _analytics(query, filter_name):
+    """Return the result of an analytics query in JSON format
+
+    The query runs as SQL aggregates in Postgres, see t5gweb.database.analytics.
+
+    Supported query parameters:
+        - from, to: first and last date included, in 'YYYY-MM-DD' format
+        - the filter passed to the query, 'account' or 'engineer'
+
+    Args:
+        query: Analytics function taking start, end and the filter
+        filter_name: Name of the query's filter parameter
+
+    Returns:
+        Response: JSON response with the query result, or a 400 response
+            describing an invalid parameter
+    """
+    args = request.args
+    try:
+        start = date.fromisoformat(args["from"]) if "from" in args else None
+        end = date.fromisoformat(args["to"]) if "to" in args else None
+        result = query(start, end, args.get(filter_name))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
@@ -3,19 +3,86 @@
 import datetime
 import json
 import logging
+import math
 import re
+import statistics
+import threading
 import time
+import uuid
 import xmlrpc
+from concurrent.futures import ThreadPoolExecutor
 
 import bugzilla
 import requests
 from jira.exceptions import JIRAError
 from t5gweb import libtelco5g
-from t5gweb.database import load_cases_postgres, load_jira_card_postgres
-from t5gweb.utils import format_comment, format_date, make_headers
-
-
-def get_cases(cfg):
+from t5gweb.database import jira_card_record, upsert_cases_postgres
+from t5gweb.utils import (
+    comment_epoch,
+    format_comment,
+    format_date,
+    make_headers,
+    to_epoch,
+)
+
+# JIRA fields read from each card by _build_card_data() and
+# jira_card_record() (customfield_10007 is the sprint)
+CARD_FIELDS = [
+    "summary",
+    "status",
+    "comment",
+    "assignee",
+    "customfield_12315950",
+    "labels",
+    "priority",
+    "created",
+    "customfield_10007",
+]
+
+# JIRA fields read from issues linked to cases by _extract_jira_fields()
+ISSUE_FIELDS = [
+    "customfield_12315948",
+    "customfield_12316142",
+    "issuetype",
+    "assignee",
+    "fixVersions",
+    "priority",
+    "customfield_12323649",
+]
+
+# number of issues requested per JIRA search call
+JIRA_PAGE_SIZE = 100
+
+# Bugzilla fields read by get_bz_details() and taskmgr.tag_bz()
+BZ_FIELDS = [
+    "id",
+    "target_release",
+    "assigned_to",
+    "last_change_time",
+    "internal_whiteboard",
+    "qa_contact",
+    "severity",
+]
+
+# Card fields taken from the JIRA issue, the rest of a card is derived from
+# the cached case data and can be recomputed without asking JIRA
+CARD_JIRA_KEYS = (
+    "case_number",
+    "card_status",
+    "card_created",
+    "comments",
+    "assignee",
+    "contributor",
+    "labels",
+    "priority",
+)
+
+# Extra minutes added to the lookback of incremental card and case refreshes,
+# so clock differences with JIRA and the portal don't lose updates
+SYNC_MARGIN_MINUTES = 5
+
+
+def get_cases(cfg, incremental=False):
     """Get cases from Red Hat Portal API and cache them
 
     Queries the Red Hat Portal API using configured search parameters and
@@ -25,17 +92,80 @@ def get_cases(cfg):
     Args:
         cfg: Configuration dictionary containing API credentials, query
             parameters, and field specifications
+        incremental: Boolean indicating whether to only pull the cases
+            modified since the last refresh. Defaults to False.
+
+    In incremental mode the query is limited with a case_lastModifiedDate
+    range starting at the last refresh of the same query, and the returned
+    cases are merged into the cached ones. Only those cases are written to
+    PostgreSQL. A full pull is still done when the query has no previous
+    refresh, when the last full pull is older than
+    cfg['case_full_sync_hours'], or when the delta hits max_portal_results.
+    Cases that stop matching the query are only dropped by a full pull.
 
     Returns:
-        None. Results are cached in Redis under the 'cases' key.
+        None. Results are cached in Redis under the 'cases' key and as
+            per-case records, see libtelco5g.redis_set_dataset().
     """
     # https://source.redhat.com/groups/public/hydra/hydra_integration_platform_cee_integration_wiki/hydras_api_layer
 
     token = libtelco5g.get_token(cfg["offline_token"])
-    query = cfg["query"]
+    num_cases = int(cfg["max_portal_results"])
+
+    # Decide between a full and an incremental pull
+    sync_started = time.time()
+    sync_states = dict(libtelco5g.redis_get("cases_sync"))
+    sync_state = sync_states.get(cfg["query"], {})
+    previous_cases = libtelco5g.redis_get("cases") if incremental else {}
+    full_sync = (
+        not previous_cases
+        or "last_sync" not in sync_state
+        or sync_started - sync_state["last_full_sync"]
+        >= float(cfg["case_full_sync_hours"]) * 3600
+    )
+
+    if not full_sync:
+        since = datetime.datetime.fromtimestamp(
+            sync_state["last_sync"] - SYNC_MARGIN_MINUTES * 60, datetime.timezone.utc
+        ).strftime("%Y-%m-%dT%H:%M:%SZ")
+        query = f"({cfg['query']}) AND case_lastModifiedDate:[{since} TO NOW]"
+        changed_cases = _search_portal_cases(cfg, token, query, num_cases)
+        if len(changed_cases) >= num_cases:
+            logging.warning("too many modified cases for a delta, pulling all")
+            full_sync = True
+        else:
+            cases = {**previous_cases, **changed_cases}
+
+    if full_sync:
+        changed_cases = _search_portal_cases(cfg, token, f"({cfg['query']})", num_cases)
+        cases = changed_cases
+
+    try:
+        upsert_cases_postgres(changed_cases, int(cfg["postgres_batch_size"]))
+    except Exception as e:
+        logging.error("Failed to load cases to Postgres: %s ", e)
+
+    libtelco5g.redis_set_dataset("cases", cases)
+    sync_states[cfg["query"]] = {
+        "last_sync": sync_started,
+        "last_full_sync": sync_started if full_sync else sync_state["last_full_sync"],
+    }
+    libtelco5g.redis_set("cases_sync", json.dumps(sync_states))
+
+
+def _search_portal_cases(cfg, token, query, num_cases):
+    """Search the portal for cases and parse the results
+
+    Args:
+        cfg: Configuration dictionary containing the API url and case fields
+        token: Access token for the Red Hat API
+        query: Search query string
+        num_cases: Maximum number of cases to return
+
+    Returns:
+        dict: Case data keyed by case number
+    """
     fields = ",".join(cfg["fields"])
-    query = f"({query})"
-    num_cases = cfg["max_portal_results"]
     payload = {"q": query, "partnerSearch": "false", "rows": num_cases, "fl": fields}
     headers = make_headers(token)
     url = f"{cfg['redhat_api']}/search/cases"
@@ -74,13 +204,14 @@ def get_cases(cfg):
             cases[case["case_number"]]["tags"] = tags
         if "case_closedDate" in case:
             cases[case["case_number"]]["closeddate"] = case["case_closedDate"]
+        # epoch copies of the dates, so the views don't parse the strings
+        for key in ("createdate", "last_update", "closeddate"):
+            if key in cases[case["case_number"]]:
+                cases[case["case_number"]][f"{key}_ts"] = to_epoch(
+                    cases[case["case_number"]][key]
+                )
 
-    try:
-        load_cases_postgres(cases)
-    except Exception as e:
-        logging.error("Failed to load cases to Postgres: %s ", e)
-
-    libtelco5g.redis_set("cases", json.dumps(cases))
+    return cases
 
 
 def get_escalations(cfg, cases):
@@ -120,7 +251,7 @@ def get_escalations(cfg, cases):
     return escalations
 
 
-def get_cards(cfg, self=None, background=False):
+def get_cards(cfg, self=None, background=False, incremental=False):
     """Pull the latest information from the JIRA cards
 
     Retrieves all JIRA cards matching the configured query, processes each
@@ -134,6 +265,20 @@ def get_cards(cfg, self=None, background=False):
             in background mode. Defaults to None.
         background: Boolean indicating whether to report progress updates for
             background processing. Defaults to False.
+        incremental: Boolean indicating whether to only rebuild the cards that
+            changed in JIRA since the last refresh. Defaults to False.
+
+    Cards are built from the paged search results, so a full refresh costs
+    roughly one JIRA request per JIRA_PAGE_SIZE cards. Once the cards
+    are cached, the fetched ones are queued in batches for
+    taskmgr.persist_cards, so PostgreSQL doesn't slow down the refresh.
+
+    In incremental mode only the cards updated in JIRA since the last refresh
+    are fetched and queued for PostgreSQL. The other cards are rebuilt from
+    their cached JIRA fields and the current case data, and cards that no
+    longer match the query are dropped. A full refresh is still done when
+    there is no previous refresh to build on, or when the last one is older
+    than cfg['card_full_sync_hours'].
 
     Returns:
         dict: Dictionary with key 'cards cached' containing the count of
@@ -142,48 +287,274 @@ def get_cards(cfg, self=None, background=False):
 
     # Get cached data
     cached_data = _get_cached_data()
-    cases, bugs, issues, escalations, details = cached_data
 
-    # Get JIRA connection and card list
+    # Get JIRA connection and query
     jira_conn = libtelco5g.jira_connection(cfg)
-    card_list = _get_jira_cards_list(cfg, jira_conn)
+    jira_query = _get_jira_cards_query(cfg, jira_conn)
+
+    # Decide between a full and an incremental refresh
+    sync_started = time.time()
+    sync_state = libtelco5g.redis_get("cards_sync")
+    previous_cards = libtelco5g.redis_get("cards") if incremental else {}
+    full_sync = (
+        not previous_cards
+        or "last_sync" not in sync_state
+        or sync_started - sync_state["last_full_sync"]
+        >= float(cfg["card_full_sync_hours"]) * 3600
+    )
 
-    # Process each card
-    jira_cards = {}
-    time_now = datetime.datetime.now(datetime.timezone.utc)
+    if full_sync:
+        logging.warning("pulling cards from jira")
+        card_list = _execute_jira_query_with_retry(
+            jira_conn,
+            jira_query,
+            cfg,
+            int(cfg["max_jira_results"]),
+            fields=CARD_FIELDS,
+        )
+        card_keys = [card.key for card in card_list]
+    else:
+        card_keys, card_list = _get_changed_cards(
+            cfg, jira_conn, jira_query, sync_state["last_sync"], previous_cards
+        )
+        logging.warning(
+            "%s of %s cards changed since last refresh",
+            len(card_list),
+            len(card_keys),
+        )
 
-    for index, card in enumerate(card_list):
-        if background:
-            _update_progress(self, index, len(card_list))
+    # Process each fetched card
+    time_now = datetime.datetime.now(datetime.timezone.utc)
+    results = _process_cards(card_list, cached_data, time_now, cfg, self, background)
+    built_cards = {card.key: card_data for (card, card_data) in zip(card_list, results)}
 
-        try:
-            card_data = _build_card_data(
-                card,
-                jira_conn,
-                cases,
-                bugs,
-                issues,
-                escalations,
-                details,
-                time_now,
-                cfg,
+    # Keep the order of the JIRA query regardless of how the cards were built
+    jira_cards = {}
+    for card_key in card_keys:
+        if card_key in built_cards:
+            card_data = built_cards[card_key]
+        elif card_key in previous_cards:
+            card_data = _rebuild_card(
+                card_key, previous_cards[card_key], cached_data, time_now, cfg
             )
-            if card_data:
-                jira_cards[card.key] = card_data
-                load_jira_card_postgres(cases, card_data["case_number"], card)
-
-        except Exception as e:
-            logging.warning("Error processing card %s: %s", card, str(e))
+        else:
             continue
+        if card_data:
+            jira_cards[card_key] = card_data
 
-    # Cache the results
-    libtelco5g.redis_set("cards", json.dumps(jira_cards))
+    # Cache the results, then hand the fetched cards over to PostgreSQL
+    libtelco5g.redis_set_dataset("cards", jira_cards)
     libtelco5g.redis_set(
         "timestamp", json.dumps(str(datetime.datetime.now(datetime.timezone.utc)))
     )
+    _queue_cards_postgres(cached_data[0], card_list, built_cards, cfg)
+    libtelco5g.redis_set(
+        "cards_sync",
+        json.dumps(
+            {
+                "last_sync": sync_started,
+                "last_full_sync": (
+                    sync_started if full_sync else sync_state["last_full_sync"]
+                ),
+            }
+        ),
+    )
     return {"cards cached": len(jira_cards)}
 
 
+def _get_changed_cards(cfg, jira_conn, jira_query, last_sync, previous_cards):
+    """Find the cards matching the query and fetch the ones that changed
+
+    Args:
+        cfg: Configuration dictionary
+        jira_conn: Active JIRA connection object
+        jira_query: JQL query string for the cards
+        last_sync: Epoch time at which the last refresh started
+        previous_cards: Dictionary of cached cards from the last refresh
+
+    Returns:
+        tuple: (card_keys, card_list) where card_keys lists every card key
+            matching the query in query order, and card_list holds the JIRA
+            card objects that were updated since last_sync or are not cached
+    """
+    max_cards = int(cfg["max_jira_results"])
+    logging.warning("pulling card keys from jira")
+    card_keys = [
+        card.key
+        for card in _execute_jira_query_with_retry(
+            jira_conn, jira_query, cfg, max_cards, fields=["key"]
+        )
+    ]
+
+    # JQL has minute resolution, so look back a little further than needed
+    minutes = math.ceil((time.time() - last_sync) / 60) + SYNC_MARGIN_MINUTES
+    logging.warning("pulling cards updated in the last %s minutes", minutes)
+    card_list = _execute_jira_query_with_retry(
+        jira_conn,
+        '{} AND updated >= "-{}m"'.format(jira_query, minutes),
+        cfg,
+        max_cards,
+        fields=CARD_FIELDS,
+    )
+
+    # Cards can match the query without being updated (e.g. a label change
+    # on an old card), fetch any that were never cached
+    fetched = {card.key for card in card_list}
+    missing = [
+        card_key
+        for card_key in card_keys
+        if card_key not in fetched and card_key not in previous_cards
+    ]
+    if missing:
+        card_list.extend(
+            _execute_jira_query_with_retry(
+                jira_conn,
+                "key in ({})".format(",".join(missing)),
+                cfg,
+                len(missing),
+                fields=CARD_FIELDS,
+            )
+        )
+
+    known = set(card_keys)
+    card_keys.extend(card.key for card in card_list if card.key not in known)
+    return card_keys, card_list
+
+
+def _process_cards(card_list, cached_data, time_now, cfg, self=None, background=False):
+    """Build cards from JIRA card objects
+
+    Args:
+        card_list: List of JIRA card objects to process
+        cached_data: Tuple of (cases, bugs, issues, escalations, details)
+        time_now: Current datetime for calculating days open
+        cfg: Configuration dictionary
+        self: Optional Celery task instance for progress updates
+        background: Boolean indicating whether to report progress updates
+
+    Returns:
+        list: Card data (or None) for each card, in the order of card_list
+    """
+    results = []
+    for index, card in enumerate(card_list):
+        if background:
+            _update_progress(self, index, len(card_list))
+        results.append(_process_card(card, cached_data, time_now, cfg))
+    return results
+
+
+def _rebuild_card(card_key, card, cached_data, time_now, cfg):
+    """Rebuild an unchanged card from its cached JIRA fields
+
+    The case-derived fields are recomputed, so case updates still show up on
+    cards that were not touched in JIRA.
+
+    Args:
+        card_key: Key of the JIRA card
+        card: Cached card data from the last refresh
+        cached_data: Tuple of (cases, bugs, issues, escalations, details)
+        time_now: Current datetime for calculating days open
+        cfg: Configuration dictionary
+
+    Returns:
+        dict: Card data as returned by _assemble_card_data(), or None if the
+            card was discarded or could not be processed
+    """
+    cases, bugs, issues, escalations, details = cached_data
+    jira_fields = {field: card.get(field) for field in CARD_JIRA_KEYS}
+    try:
+        return _assemble_card_data(
+            card_key,
+            jira_fields,
+            cases,
+            bugs,
+            issues,
+            escalations,
+            details,
+            time_now,
+            cfg,
+        )
+    except Exception as e:
+        logging.warning("Error rebuilding card %s: %s", card_key, str(e))
+        return None
+
+
+def _queue_cards_postgres(cases, card_list, built_cards, cfg):
+    """Queue the fetched cards that were kept for storage in PostgreSQL
+
+    The cards are sent to taskmgr.persist_cards in batches of
+    cfg['postgres_batch_size'], together with their cases. Pending batches
+    are tracked in Redis, see libtelco5g.card_writer_status(). A batch that
+    can't be queued is counted as failed instead of staying pending.
+
+    Args:
+        cases: Dictionary of cached case data
+        card_list: List of JIRA card objects that were fetched
+        built_cards: Dictionary of card data (or None) keyed by card key
+        cfg: Configuration dictionary
+    """
+    records = []
+    for card in card_list:
+        if not built_cards.get(card.key):
+            continue
+        try:
+            records.append(jira_card_record(built_cards[card.key]["case_number"], card))
+        except Exception as e:
+            logging.warning("Error reading card %s for Postgres: %s", card, str(e))
+    # taskmgr imports this module
+    from t5gweb.taskmgr import persist_cards
+
+    batch_size = int(cfg["postgres_batch_size"])
+    for index in range(0, len(records), batch_size):
+        batch = records[index : index + batch_size]
+        batch_cases = {
+            card["case_number"]: cases[card["case_number"]] for card in batch
+        }
+        batch_id = uuid.uuid4().hex
+        try:
+            # registered first, the worker may finish the batch before delay()
+            # returns
+            libtelco5g.card_writer_queued(batch_id, len(batch))
+            try:
+                persist_cards.delay(batch_id, batch_cases, batch)
+            except Exception:
+                libtelco5g.card_writer_done(batch_id, failed=True)
+                raise
+        except Exception as e:
+            logging.error("Failed to queue cards for Postgres: %s ", e)
+
+
+def _process_card(card, cached_data, time_now, cfg):
+    """Build a single card
+
+    Args:
+        card: JIRA card object from the card search
+        cached_data: Tuple of (cases, bugs, issues, escalations, details) as
+            returned by _get_cached_data()
+        time_now: Current datetime for calculating days open
+        cfg: Configuration dictionary
+
+    Returns:
+        dict: Card data as returned by _build_card_data(), or None if the card
+            was discarded or could not be processed
+    """
+    cases, bugs, issues, escalations, details = cached_data
+    try:
+        return _build_card_data(
+            card,
+            cases,
+            bugs,
+            issues,
+            escalations,
+            details,
+            time_now,
+            cfg,
+        )
+    except Exception as e:
+        logging.warning("Error processing card %s: %s", card, str(e))
+        return None
+
+
 def _get_cached_data():
     # Generated by: Cursor
     """Get all cached data needed for card processing
@@ -203,7 +574,9 @@ def _get_cached_data():
     return cases, bugs, issues, escalations, details
 
 
-def _execute_jira_query_with_retry(jira_conn, jira_query, cfg, max_results):
+def _execute_jira_query_with_retry(
+    jira_conn, jira_query, cfg, max_results, fields=None, validate_query=True
+):
     # Generated by: Cursor
     """Execute JIRA query with automatic retry on authentication errors
 
@@ -215,47 +588,61 @@ def _execute_jira_query_with_retry(jira_conn, jira_query, cfg, max_results):
         jira_query: JQL query string to execute
         cfg: Configuration dictionary for reconnection if needed
         max_results: Maximum number of results to return
+        fields: Optional list of fields to request for each issue. Defaults
+            to None (JIRA's default field set).
+        validate_query: Boolean indicating whether JIRA should reject a query
+            referring to unknown or inaccessible issues. Defaults to True.
 
     Returns:
-        iterable: Iterator of JIRA issue objects matching the query
+        list: JIRA issue objects matching the query
     """
     try:
-        return jira_conn.search_issues(jira_query, 0, max_results).iterable
+        return _search_issues_paged(
+            jira_conn, jira_query, max_results, fields, validate_query
+        )
     except JIRAError:
         logging.warning("JIRA Exception. Possible 401. Reconnecting.....")
         jira_conn = libtelco5g.jira_connection(cfg)
-        return jira_conn.search_issues(jira_query, 0, max_results).iterable
+        return _search_issues_paged(
+            jira_conn, jira_query, max_results, fields, validate_query
+        )
 
 
-def _get_jira_issue_with_retry(jira_conn, issue_key, cfg):
-    # Generated by: Cursor
-    """Get JIRA issue with automatic retry on authentication errors
-
-    Attempts to retrieve a JIRA issue and automatically reconnects if a
-    JIRAError occurs (typically 401 authentication errors).
+def _search_issues_paged(
+    jira_conn, jira_query, max_results, fields=None, validate_query=True
+):
+    """Run a JQL search in pages of JIRA_PAGE_SIZE issues
 
     Args:
         jira_conn: Active JIRA connection object
-        issue_key: JIRA issue key (e.g., 'PROJECT-123')
-        cfg: Configuration dictionary for reconnection if needed
+        jira_query: JQL query string to execute
+        max_results: Maximum number of results to return
+        fields: Optional list of fields to request for each issue
+        validate_query: Boolean passed on to JIRA's search
 
     Returns:
-        Issue: JIRA issue object
+        list: JIRA issue objects matching the query, in query order
     """
-    try:
-        return jira_conn.issue(issue_key)
-    except JIRAError:
-        logging.warning("JIRA Exception. Possible 401. Reconnecting.....")
-        jira_conn = libtelco5g.jira_connection(cfg)
-        return jira_conn.issue(issue_key)
+    issues = []
+    while len(issues) < max_results:
+        page = jira_conn.search_issues(
+            jira_query,
+            startAt=len(issues),
+            maxResults=min(JIRA_PAGE_SIZE, max_results - len(issues)),
+            fields=fields,
+            validate_query=validate_query,
+        )
+        issues.extend(page)
+        if len(page) == 0 or len(issues) >= page.total:
+            break
+    return issues
 
 
-def _get_jira_cards_list(cfg, jira_conn):
+def _get_jira_cards_query(cfg, jira_conn):
     # Generated by: Cursor
-    """Get the list of JIRA cards based on configuration
+    """Get the JQL query for the JIRA cards based on configuration
 
-    Constructs a JQL query based on configuration settings (sprint or project)
-    and retrieves matching JIRA cards.
+    Constructs a JQL query based on configuration settings (sprint or project).
 
     Args:
         cfg: Configuration dictionary containing project, board, sprint, and
@@ -263,9 +650,8 @@ def _get_jira_cards_list(cfg, jira_conn):
         jira_conn: Active JIRA connection object
 
     Returns:
-        iterable: Iterator of JIRA card objects matching the query
+        str: JQL query string matching the cards
     """
-    max_cards = cfg["max_jira_results"]
     project = libtelco5g.get_project_id(jira_conn, cfg["project"])
     board = libtelco5g.get_board_id(jira_conn, cfg["board"])
 
@@ -280,10 +666,7 @@ def _get_jira_cards_list(cfg, jira_conn):
             "project=" + str(project.id) + ' AND labels = "' + cfg["jira_query"] + '"'
         )
 
-    logging.warning("pulling cards from jira")
-    card_list = _execute_jira_query_with_retry(jira_conn, jira_query, cfg, max_cards)
-
-    return card_list
+    return jira_query
 
 
 def _update_progress(self, current, total):
@@ -308,9 +691,7 @@ def _update_progress(self, current, total):
     )
 
 
-def _build_card_data(
-    card, jira_conn, cases, bugs, issues, escalations, details, time_now, cfg
-):
+def _build_card_data(card, cases, bugs, issues, escalations, details, time_now, cfg):
     # Generated by: Cursor
     """Build complete card data for a single JIRA card
 
@@ -318,8 +699,8 @@ def _build_card_data(
     case information, bugzilla details, escalation status, and labels.
 
     Args:
-        card: JIRA card object to process
-        jira_conn: Active JIRA connection object
+        card: JIRA card object from the card search, with the fields listed
+            in CARD_FIELDS
         cases: Dictionary of cached case data
         bugs: Dictionary of cached bugzilla data
         issues: Dictionary of cached JIRA issues
@@ -332,7 +713,7 @@ def _build_card_data(
         dict: Complete card data dictionary with all relevant fields, or None
             if the card cannot be processed
     """
-    issue = _get_jira_issue_with_retry(jira_conn, card, cfg)
+    issue = card
 
     # Extract case number from summary
     case_number = issue.fields.summary.split(":")[0]
@@ -340,17 +721,46 @@ def _build_card_data(
         logging.warning("error parsing case number for (%s)", card)
         return None
 
+    jira_fields = {
+        "case_number": case_number,
+        "card_status": libtelco5g.status_map[issue.fields.status.name],
+        "card_created": issue.fields.created,
+        "comments": _get_card_comments(issue.fields.comment.comments),
+        "assignee": _get_assignee_info(issue),
+        "contributor": _get_contributor_info(issue),
+        "labels": issue.fields.labels,
+        "priority": issue.fields.priority.name,
+    }
+    return _assemble_card_data(
+        card, jira_fields, cases, bugs, issues, escalations, details, time_now, cfg
+    )
+
+
+def _assemble_card_data(
+    card, jira_fields, cases, bugs, issues, escalations, details, time_now, cfg
+):
+    """Combine the JIRA fields of a card with its cached case data
+
+    Args:
+        card: JIRA card object or card key, used for logging
+        jira_fields: Dictionary with the card fields listed in CARD_JIRA_KEYS
+        cases: Dictionary of cached case data
+        bugs: Dictionary of cached bugzilla data
+        issues: Dictionary of cached JIRA issues
+        escalations: List of escalated case numbers
+        details: Dictionary of cached case detail information
+        time_now: Current datetime for calculating days open
+        cfg: Configuration dictionary
+
+    Returns:
+        dict: Complete card data dictionary with all relevant fields, or None
+            if the card isn't associated with a cached case
+    """
+    case_number = jira_fields["case_number"]
     if not case_number or case_number not in cases.keys():
         logging.warning("card isn't associated with a case. discarding (%s)", card)
         return None
 
-    # Get comments
-    comments = _get_card_comments(issue.fields.comment.comments)
-
-    # Get assignee and contributor info
-    assignee = _get_assignee_info(issue)
-    contributor = _get_contributor_info(issue)
-
     # Get case-related data
     case_data = cases[case_number]
     tags = case_data.get("tags", [])
@@ -363,32 +773,32 @@ def _build_card_data(
 
     # Get escalation info
     escalation_info = _get_escalation_info(
-        case_number, escalations, case_issues, issue.fields.labels, cfg
+        case_number, escalations, case_issues, jira_fields["labels"], cfg
     )
 
     # Get case details
     case_detail_info = _get_case_detail_info(case_number, details)
 
     # Get label-based flags
-    label_flags = _get_label_flags(issue.fields.labels, escalation_info["escalated"])
+    label_flags = _get_label_flags(jira_fields["labels"], escalation_info["escalated"])
 
     # Build the complete card data
     return {
-        "card_status": libtelco5g.status_map[issue.fields.status.name],
-        "card_created": issue.fields.created,
+        "card_status": jira_fields["card_status"],
+        "card_created": jira_fields["card_created"],
         "account": case_data["account"],
         "summary": case_data["problem"],
         "description": case_data["description"],
-        "comments": comments,
-        "assignee": assignee,
-        "contributor": contributor,
+        "comments": jira_fields["comments"],
+        "assignee": jira_fields["assignee"],
+        "contributor": jira_fields["contributor"] or [],
         "case_number": case_number,
         "tags": tags,
-        "labels": issue.fields.labels,
+        "labels": jira_fields["labels"],
         "bugzilla": bugzilla,
         "issues": case_issues,
         "severity": re.search(r"[a-zA-Z]+", case_data["severity"]).group(),
-        "priority": issue.fields.priority.name,
+        "priority": jira_fields["priority"],
         "escalated": escalation_info["escalated"],
         "escalated_link": escalation_info["escalated_link"],
         "potential_escalation": label_flags["potential_escalation"],
@@ -400,17 +810,26 @@ def _build_card_data(
             format_date(case_data["last_update"]),
             "%Y-%m-%d %H:%M",
         ),
+        "case_updated_ts": to_epoch(case_data["last_update"]),
         "case_days_open": (
             time_now.replace(tzinfo=None) - format_date(case_data["createdate"])
         ).days,
         "case_created": case_data["createdate"],
+        "case_created_ts": to_epoch(case_data["createdate"]),
         "notified_users": case_detail_info["notified_users"],
         "relief_at": case_detail_info["relief_at"],
+        "relief_at_ts": _optional_epoch(case_detail_info["relief_at"]),
         "resolved_at": case_detail_info["resolved_at"],
+        "resolved_at_ts": _optional_epoch(case_detail_info["resolved_at"]),
         "daily_telco": label_flags["daily_telco"],
     }
 
 
+def _optional_epoch(the_date):
+    """Convert a date that may be missing with to_epoch()"""
+    return to_epoch(the_date) if the_date is not None else None
+
+
 def _get_card_comments(comments):
     # Generated by: Cursor
     """Extract and format card comments
@@ -421,14 +840,14 @@ def _get_card_comments(comments):
         comments: List of JIRA comment objects
 
     Returns:
-        list: List of tuples containing (formatted_body, timestamp) for each
-            comment
+        list: List of tuples containing (formatted_body, timestamp, epoch
+            seconds of timestamp) for each comment
     """
     card_comments = []
     for comment in comments:
         body = format_comment(comment)
         tstamp = comment.updated
-        card_comments.append((body, tstamp))
+        card_comments.append((body, tstamp, comment_epoch(tstamp)))
     return card_comments
 
 
@@ -593,6 +1012,11 @@ def get_case_details(cfg):
     API including CritSit status, group names, notified users, and associated
     bugzillas. Results are cached in Redis.
 
+    The open cases are fetched concurrently by cfg['portal_workers'] threads
+    sharing one keep-alive session and one access token, and the latency
+    percentiles of the requests are logged. Cases whose request fails are
+    left out of the details.
+
     Args:
         cfg: Configuration dictionary containing API credentials and endpoints
 
@@ -605,38 +1029,128 @@ def get_case_details(cfg):
         libtelco5g.redis_set("case_bz", json.dumps(None))
         return
 
+    open_cases = [case for case in cases if cases[case]["status"] != "Closed"]
+    workers = int(cfg["portal_workers"])
+    token = _PortalToken(cfg["offline_token"])
     bz_dict = {}
-    token = libtelco5g.get_token(cfg["offline_token"])
-    headers = make_headers(token)
     case_details = {}
+    latencies = []
     logging.warning("getting all bugzillas and case details")
-    for case in cases:
-        if cases[case]["status"] != "Closed":
-            case_endpoint = f"{cfg['redhat_api']}/v1/cases/{case}"
-            r_case = requests.get(case_endpoint, headers=headers)
-            if r_case.status_code == 401:
-                token = libtelco5g.get_token(cfg["offline_token"])
-                headers = make_headers(token)
-                r_case = requests.get(case_endpoint, headers=headers)
-
-            crit_sit = r_case.json().get("critSit", False)
-            group_name = r_case.json().get("groupName", None)
-            notified_users = r_case.json().get("notifiedUsers", [])
-            relief_at = r_case.json().get("reliefAt", None)
-            resolved_at = r_case.json().get("resolvedAt", None)
-
-            case_details[case] = {
-                "crit_sit": crit_sit,
-                "group_name": group_name,
-                "notified_users": notified_users,
-                "relief_at": relief_at,
-                "resolved_at": resolved_at,
-            }
-            if "bug" in cases[case]:
-                bz_dict[case] = r_case.json()["bugzillas"]
+    with _portal_session(workers) as session:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            responses = executor.map(
+                lambda case: _get_case_detail(cfg, session, token, case), open_cases
+            )
+            for case, (detail, elapsed) in zip(open_cases, responses):
+                latencies.append(elapsed)
+                if detail is None:
+                    continue
+                case_details[case] = {
+                    "crit_sit": detail.get("critSit", False),
+                    "group_name": detail.get("groupName", None),
+                    "notified_users": detail.get("notifiedUsers", []),
+                    "relief_at": detail.get("reliefAt", None),
+                    "resolved_at": detail.get("resolvedAt", None),
+                }
+                if "bug" in cases[case]:
+                    bz_dict[case] = detail["bugzillas"]
+
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100)
+        logging.warning(
+            "fetched %s case details: p50 %.3fs, p90 %.3fs, p99 %.3fs",
+            len(latencies),
+            percentiles[49],
+            percentiles[89],
+            percentiles[98],
+        )
+
+    libtelco5g.redis_set("details", libtelco5g.serialize(case_details))
+    libtelco5g.redis_set("case_bz", libtelco5g.serialize(bz_dict))
+
+
+class _PortalToken:
+    """Access token for the Red Hat API shared between threads
+
+    The first request that gets a 401 refreshes the token. Requests that were
+    sent with the same token and fail afterwards reuse the refreshed one
+    instead of asking SSO again.
+
+    Args:
+        offline_token: Red Hat offline token used to get access tokens
+    """
+
+    def __init__(self, offline_token):
+        self._offline_token = offline_token
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._headers = make_headers(libtelco5g.get_token(offline_token))
+
+    def headers(self):
+        """Return the current (generation, headers) pair"""
+        with self._lock:
+            return self._generation, self._headers
+
+    def refresh(self, generation):
+        """Refresh the token unless it changed since generation
 
-    libtelco5g.redis_set("details", json.dumps(case_details))
-    libtelco5g.redis_set("case_bz", json.dumps(bz_dict))
+        Args:
+            generation: Generation of the headers that got a 401
+
+        Returns:
+            tuple: The current (generation, headers) pair
+        """
+        with self._lock:
+            if generation == self._generation:
+                logging.warning("portal token expired, refreshing")
+                self._headers = make_headers(libtelco5g.get_token(self._offline_token))
+                self._generation += 1
+            return self._generation, self._headers
+
+
+def _portal_session(workers):
+    """Create a requests session that keeps up to workers connections open
+
+    Args:
+        workers: Number of threads sharing the session
+
+    Returns:
+        requests.Session: Session with a connection pool sized for workers
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get_case_detail(cfg, session, token, case):
+    """Fetch the details of a single case from the portal
+
+    Args:
+        cfg: Configuration dictionary containing the API url
+        session: Shared requests session
+        token: Shared _PortalToken
+        case: Case number
+
+    Returns:
+        tuple: (detail, elapsed) with the decoded response, or None if the
+            request failed, and the time spent on the request(s) in seconds
+    """
+    case_endpoint = f"{cfg['redhat_api']}/v1/cases/{case}"
+    start = time.perf_counter()
+    try:
+        generation, headers = token.headers()
+        r_case = session.get(case_endpoint, headers=headers)
+        if r_case.status_code == 401:
+            generation, headers = token.refresh(generation)
+            r_case = session.get(case_endpoint, headers=headers)
+        r_case.raise_for_status()
+        detail = r_case.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.warning("error retrieving details of case %s: %s", case, e)
+        detail = None
+    return detail, time.perf_counter() - start
 
 
 def get_bz_details(cfg):
@@ -646,50 +1160,105 @@ def get_bz_details(cfg):
     associated with cases, including target release, assignee, last change
     time, and other metadata. Results are cached in Redis.
 
+    Each bug is fetched once even if several cases link to it, see
+    fetch_bz_bugs(). The details are also cached per bug under the 'bz_bugs'
+    key for tag_bz.
+
     Args:
         cfg: Configuration dictionary containing Bugzilla API key
 
     Returns:
-        None. Results are cached in Redis under the 'bugs' key.
+        None. Results are cached in Redis under the 'bugs' and 'bz_bugs' keys,
+        and the stats snapshot is refreshed with the new bug counts.
     """
     logging.warning("getting additional info via bugzilla API")
     bz_dict = libtelco5g.redis_get("case_bz")
     if bz_dict is None or cfg["bz_key"] is None or cfg["bz_key"] == "":
         libtelco5g.redis_set("bugs", json.dumps(None))
+        libtelco5g.refresh_stats_snapshot()
         return
 
     bz_url = "bugzilla.redhat.com"
     bz_api = bugzilla.Bugzilla(bz_url, api_key=cfg["bz_key"])
+    bug_ids = list(
+        dict.fromkeys(
+            bug["bugzillaNumber"] for case in bz_dict for bug in bz_dict[case]
+        )
+    )
+    bz_bugs = {}
+    for bug_id, bugs in fetch_bz_bugs(bz_api, bug_ids, cfg).items():
+        bz_bugs[bug_id] = {
+            "target_release": bugs.target_release,
+            "assignee": bugs.assigned_to,
+            "last_change_time": datetime.datetime.strftime(
+                datetime.datetime.strptime(
+                    str(bugs.last_change_time), "%Y%m%dT%H:%M:%S"
+                ),
+                "%Y-%m-%d",
+            ),  # convert from xmlrpc.client.DateTime to str and reformat
+            "internal_whiteboard": bugs.internal_whiteboard,
+            "qa_contact": bugs.qa_contact,
+            "severity": bugs.severity,
+        }
+
+    unavailable = {
+        "target_release": ["unavailable"],
+        "assignee": "unavailable",
+        "last_change_time": "unavailable",
+        "internal_whiteboard": "unavailable",
+        "qa_contact": "unavailable",
+        "severity": "unavailable",
+    }
     for case in bz_dict:
         for bug in bz_dict[case]:
-            try:
-                bugs = bz_api.getbug(bug["bugzillaNumber"])
-            except xmlrpc.client.Fault:
-                logging.warning(
-                    "error retrieving bug %s - restricted?", bug["bugzillaNumber"]
-                )
-                bugs = None
-            if bugs:
-                bug["target_release"] = bugs.target_release
-                bug["assignee"] = bugs.assigned_to
-                bug["last_change_time"] = datetime.datetime.strftime(
-                    datetime.datetime.strptime(
-                        str(bugs.last_change_time), "%Y%m%dT%H:%M:%S"
-                    ),
-                    "%Y-%m-%d",
-                )  # convert from xmlrpc.client.DateTime to str and reformat
-                bug["internal_whiteboard"] = bugs.internal_whiteboard
-                bug["qa_contact"] = bugs.qa_contact
-                bug["severity"] = bugs.severity
+            bug.update(bz_bugs.get(bug["bugzillaNumber"], unavailable))
+
+    libtelco5g.redis_set("bugs", libtelco5g.serialize(bz_dict))
+    libtelco5g.redis_set("bz_bugs", libtelco5g.serialize(bz_bugs))
+    # the snapshot's bug counts are derived from the bugs
+    libtelco5g.refresh_stats_snapshot()
+
+
+def fetch_bz_bugs(bz_api, bug_ids, cfg):
+    """Fetch bugs from Bugzilla in chunks of cfg['bz_chunk_size']
+
+    Only the fields listed in BZ_FIELDS are requested. If a chunk fails, its
+    bugs are fetched one at a time so a restricted bug only loses itself.
+    Bugzilla leaves restricted or missing bugs out of a chunk's result, so
+    the bugs are matched to the requested IDs by their own ID.
+
+    Args:
+        bz_api: Bugzilla API connection
+        bug_ids: List of bug IDs without duplicates
+        cfg: Configuration dictionary
+
+    Returns:
+        dict: Bugzilla bug objects keyed by bug ID, without the bugs that
+            could not be retrieved
+    """
+    chunk_size = int(cfg["bz_chunk_size"])
+    bz_bugs = {}
+    for index in range(0, len(bug_ids), chunk_size):
+        chunk = bug_ids[index : index + chunk_size]
+        try:
+            fetched = bz_api.getbugs(chunk, include_fields=BZ_FIELDS)
+        except xmlrpc.client.Fault:
+            fetched = [_fetch_bz_bug(bz_api, bug_id) for bug_id in chunk]
+        returned = {str(bug.id): bug for bug in fetched if bug}
+        for bug_id in chunk:
+            if str(bug_id) in returned:
+                bz_bugs[bug_id] = returned[str(bug_id)]
             else:
-                bug["target_release"] = ["unavailable"]
-                bug["assignee"] = "unavailable"
-                bug["last_change_time"] = "unavailable"
-                bug["internal_whiteboard"] = "unavailable"
-                bug["qa_contact"] = "unavailable"
-                bug["severity"] = "unavailable"
+                logging.warning("error retrieving bug %s - restricted?", bug_id)
+    return bz_bugs
 
-    libtelco5g.redis_set("bugs", json.dumps(bz_dict))
+
+def _fetch_bz_bug(bz_api, bug_id):
+    """Fetch a single bug, returning None if Bugzilla refuses it"""
+    try:
+        return bz_api.getbug(bug_id, include_fields=BZ_FIELDS)
+    except xmlrpc.client.Fault:
+        return None
 
 
 def get_issue_details(cfg):
@@ -699,38 +1268,58 @@ def get_issue_details(cfg):
     Portal API and JIRA, extracting detailed information for each issue.
     Results are cached in Redis.
 
+    An issue linked from several cases is only fetched from JIRA once, see
+    _get_linked_jira_fields().
+
     Args:
         cfg: Configuration dictionary containing API credentials and JIRA
             connection parameters
 
     Returns:
-        None. Results are cached in Redis under the 'issues' key.
+        None. Results are cached in Redis under the 'issues' key, and the
+        stats snapshot is refreshed with the new issue counts.
     """
     logging.warning("caching issues")
 
     cases = libtelco5g.redis_get("cases")
     if cases is None:
         libtelco5g.redis_set("issues", json.dumps(None))
+        libtelco5g.refresh_stats_snapshot()
         return
 
     # Setup authentication and JIRA connection
     token, headers, jira_conn = _setup_issue_processing(cfg)
 
-    # Process issues for all open cases
-    jira_issues = {}
+    # Get the issues linked to each open case
+    case_links = {}
     open_cases = [case for case in cases if cases[case]["status"] != "Closed"]
 
     for case in open_cases:
         try:
-            case_issues = _process_case_issues(case, cfg, token, headers, jira_conn)
-            if case_issues:
-                jira_issues[case] = case_issues
+            issues_data = _get_case_issues_from_api(case, cfg, token, headers)
         except Exception as e:
             logging.warning("Error processing issues for case %s: %s", case, str(e))
             continue
+        if issues_data:
+            case_links[case] = [issue for issue in issues_data if "title" in issue]
+
+    # Fetch every linked JIRA issue once, however many cases link to it
+    resource_keys = list(
+        dict.fromkeys(
+            issue["resourceKey"] for links in case_links.values() for issue in links
+        )
+    )
+    jira_fields = _get_linked_jira_fields(cfg, jira_conn, resource_keys)
+
+    jira_issues = {}
+    for case, links in case_links.items():
+        case_issues = _process_case_issues(links, jira_fields)
+        if case_issues:
+            jira_issues[case] = case_issues
 
     # Cache the results
-    libtelco5g.redis_set("issues", json.dumps(jira_issues))
+    libtelco5g.redis_set("issues", libtelco5g.serialize(jira_issues))
+    libtelco5g.refresh_stats_snapshot()
     logging.warning("issues cached")
 
 
@@ -756,46 +1345,85 @@ def _setup_issue_processing(cfg):
     return token, headers, jira_conn
 
 
-def _process_case_issues(case, cfg, token, headers, jira_conn):
-    # Generated by: Cursor
-    """Process all issues for a specific case
+def _get_linked_jira_fields(cfg, jira_conn, resource_keys):
+    """Fetch the JIRA fields of the issues linked to cases
 
-    Retrieves issues from the API for a case and processes each one to extract
-    detailed JIRA information.
+    The issues are searched with "key in (...)" queries of up to
+    JIRA_PAGE_SIZE keys, requesting only ISSUE_FIELDS. Keys the search
+    doesn't return (moved or inaccessible issues) are fetched one by one, as
+    are all keys of a search that fails, so a bad key only loses itself.
 
     Args:
-        case: Case number to process
         cfg: Configuration dictionary
-        token: Authentication token for Red Hat Portal API
-        headers: HTTP headers for API requests
         jira_conn: Active JIRA connection object
+        resource_keys: List of JIRA issue keys without duplicates
+
+    Returns:
+        dict: Fields extracted by _extract_jira_fields(), keyed by issue key.
+            Issues that can't be accessed are left out.
+    """
+    jira_fields = {}
+    for index in range(0, len(resource_keys), JIRA_PAGE_SIZE):
+        chunk = resource_keys[index : index + JIRA_PAGE_SIZE]
+        try:
+            bugs = _execute_jira_query_with_retry(
+                jira_conn,
+                "key in ({})".format(",".join(chunk)),
+                cfg,
+                len(chunk),
+                fields=ISSUE_FIELDS,
+                validate_query=False,
+            )
+        except JIRAError as e:
+            logging.warning("Error searching %s issues: %s", len(chunk), str(e))
+            continue
+        for bug in bugs:
+            jira_fields[bug.key] = _extract_jira_fields(bug)
+
+    for resource_key in resource_keys:
+        if resource_key in jira_fields:
+            continue
+        try:
+            bug = jira_conn.issue(resource_key, fields=",".join(ISSUE_FIELDS))
+        except JIRAError:
+            logging.warning("Can't access %s", resource_key)
+            continue
+        jira_fields[resource_key] = _extract_jira_fields(bug)
+
+    return jira_fields
+
+
+def _process_case_issues(links, jira_fields):
+    # Generated by: Cursor
+    """Process all issues for a specific case
+
+    Combines the issues linked to a case in the Red Hat API with the fields
+    of the matching JIRA issues.
+
+    Args:
+        links: List of issue data from the Red Hat API for the case
+        jira_fields: Dictionary of JIRA fields keyed by issue key, as returned
+            by _get_linked_jira_fields()
 
     Returns:
         list: List of processed issue dictionaries, or None if no valid issues
             found
     """
-    # Get issues from API
-    issues_data = _get_case_issues_from_api(case, cfg, token, headers)
-    if not issues_data:
-        return None
-
     case_issues = []
-    for issue in issues_data:
-        if "title" in issue.keys():
-            try:
-                processed_issue = _process_single_jira_issue(issue, jira_conn)
-                if processed_issue:
-                    case_issues.append(processed_issue)
-            except JIRAError:
-                logging.warning("Can't access %s", issue["resourceKey"])
-                continue
-            except Exception as e:
-                logging.warning(
-                    "Error processing issue %s: %s",
-                    issue.get("resourceKey", "unknown"),
-                    str(e),
-                )
-                continue
+    for issue in links:
+        if issue["resourceKey"] not in jira_fields:
+            continue
+        try:
+            case_issues.append(
+                _process_single_jira_issue(issue, jira_fields[issue["resourceKey"]])
+            )
+        except Exception as e:
+            logging.warning(
+                "Error processing issue %s: %s",
+                issue.get("resourceKey", "unknown"),
+                str(e),
+            )
+            continue
 
     return case_issues if case_issues else None
 
@@ -832,31 +1460,22 @@ def _get_case_issues_from_api(case, cfg, token, headers):
     return None
 
 
-def _process_single_jira_issue(issue, jira_conn):
+def _process_single_jira_issue(issue, jira_fields):
     # Generated by: Cursor
     """Process a single JIRA issue and extract all relevant fields
 
-    Retrieves full details for a JIRA issue and extracts all relevant fields
-    including status, QA contact, severity, assignee, and more.
+    Combines the basic issue info from the Red Hat API with the fields
+    extracted from JIRA, including status, QA contact, severity, assignee,
+    and more.
 
     Args:
         issue: Issue data dictionary from Red Hat API containing resourceKey
             and other basic info
-        jira_conn: Active JIRA connection object
+        jira_fields: Dictionary of fields extracted by _extract_jira_fields()
 
     Returns:
-        dict: Complete issue data dictionary with all extracted fields, or
-            None if issue cannot be accessed
+        dict: Complete issue data dictionary with all extracted fields
     """
-    try:
-        bug = jira_conn.issue(issue["resourceKey"])
-    except JIRAError:
-        logging.warning("Can't access %s", issue["resourceKey"])
-        return None
-
-    # Extract all JIRA fields
-    jira_fields = _extract_jira_fields(bug)
-
     # Build the complete issue data
     return {
         "id": issue["resourceKey"],
@@ -1040,17 +1659,14 @@ def _extract_private_keywords(bug):
 def get_stats():
     """Generate and cache daily statistics
 
-    Generates statistics for the current day and adds them to the cached
-    historical stats data. The stats are keyed by date in YYYY-MM-DD format.
+    Generates statistics for the current day and adds them to the stats
+    history. The stats are keyed by date in YYYY-MM-DD format.
 
     Returns:
-        None. Results are cached in Redis under the 'stats' key.
+        None. Results are cached in Redis, see libtelco5g.add_daily_stats().
     """
     logging.warning("caching {} stats")
-    all_stats = libtelco5g.redis_get("stats")
     new_stats = libtelco5g.generate_stats()
     tstamp = datetime.datetime.now(datetime.timezone.utc)
     today = tstamp.strftime("%Y-%m-%d")
-    stats = {today: new_stats}
-    all_stats.update(stats)
-    libtelco5g.redis_set("stats", json.dumps(all_stats))
+    libtelco5g.add_daily_stats(today, new_stats)
@@ -2,19 +2,30 @@
 
 This module provides database functionality including:
 - Database models (Case, Comment, JiraCard, JiraComment)
-- Session management (engine, SessionLocal, Base)
-- Database operations (load_cases_postgres, load_jira_cards_postgres)
-- Utility functions (create_postgres_tables)
+- Session management (engine, SessionLocal, Base), one pool per process
+- Database operations (load_cases_postgres, upsert_cases_postgres,
+  load_jira_card_postgres, load_jira_cards_postgres)
+- Analytics queries (case_counts, comment_velocity, time_to_close)
+- Utility functions (create_postgres_tables, ensure_indexes)
 """
 
+# Import analytics queries
+from .analytics import case_counts, comment_velocity, time_to_close
+
 # Import database models
 from .models import Case, Comment, JiraCard, JiraComment
 
 # Import database operations
-from .operations import load_cases_postgres, load_jira_card_postgres
+from .operations import (
+    jira_card_record,
+    load_cases_postgres,
+    load_jira_card_postgres,
+    load_jira_cards_postgres,
+    upsert_cases_postgres,
+)
 
 # Import session management components
-from .session import Base, create_postgres_tables, db_config
+from .session import Base, create_postgres_tables, db_config, ensure_indexes
 
 # Export all components that were previously available from postgres_db.py
 __all__ = [
@@ -22,6 +33,7 @@ __all__ = [
     "Base",
     "db_config",
     "create_postgres_tables",
+    "ensure_indexes",
     # Models
     "Case",
     "Comment",
@@ -29,5 +41,12 @@ __all__ = [
     "JiraComment",
     # Operations
     "load_cases_postgres",
+    "upsert_cases_postgres",
     "load_jira_card_postgres",
+    "load_jira_cards_postgres",
+    "jira_card_record",
+    # Analytics
+    "case_counts",
+    "comment_velocity",
+    "time_to_close",
 ]
@@ -0,0 +1,199 @@
+"""Historical metrics computed as SQL aggregates over the Postgres tables"""
+
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Integer, cast, distinct, extract, func, select
+from t5gweb.utils import SECONDS_PER_DAY
+
+from .models import Case, JiraComment
+from .session import db_config
+
+# days covered by the analytics queries when no start date is given
+DEFAULT_WINDOW_DAYS = 90
+
+
+def _window(start, end):
+    """Resolve optional start and end dates to a half-open datetime range
+
+    Args:
+        start: Optional first date included. Defaults to DEFAULT_WINDOW_DAYS
+            before end.
+        end: Optional last date included. Defaults to today.
+
+    Returns:
+        tuple: (start, end) datetimes, end being midnight after the last day
+
+    Raises:
+        ValueError: If start is after end
+    """
+    if end is None:
+        end = date.today()
+    if start is None:
+        start = end - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    if start > end:
+        raise ValueError("start date is after end date")
+    return (
+        datetime.combine(start, time()),
+        datetime.combine(end + timedelta(days=1), time()),
+    )
+
+
+def _days_between(dialect, start, end):
+    """SQL expression for the fractional days from start to end columns"""
+    if dialect == "postgresql":
+        return func.date_part("epoch", end - start) / SECONDS_PER_DAY
+    # SQLite (e.g. in tests) stores datetimes as text
+    return func.julianday(end) - func.julianday(start)
+
+
+def _round(value):
+    """Round an aggregate to 2 places, keeping missing values"""
+    return round(float(value), 2) if value is not None else None
+
+
+def time_to_close(start=None, end=None, account=None):
+    """Days from creation to closure of closed cases per quarter and severity
+
+    Cases don't record when they were closed, so the last update of a closed
+    case is taken as its closing time. Cases are grouped by the quarter they
+    were closed in.
+
+    Args:
+        start: Optional first closing date included, see _window()
+        end: Optional last closing date included, see _window()
+        account: Optional account name to restrict the cases to
+
+    Returns:
+        list: Dictionaries ordered by quarter and severity, with the
+            'quarter' (e.g. '2024-Q1'), 'severity', number of 'cases', and
+            'mean_days', 'min_days' and 'max_days' to close
+    """
+    window_start, window_end = _window(start, end)
+    session = db_config.SessionLocal()
+    try:
+        dialect = session.get_bind().dialect.name
+        days = _days_between(dialect, Case.created_date, Case.last_update)
+        year = cast(extract("year", Case.last_update), Integer)
+        quarter = (cast(extract("month", Case.last_update), Integer) + 2) // 3
+        query = (
+            select(
+                year,
+                quarter,
+                Case.severity,
+                func.count(),
+                func.avg(days),
+                func.min(days),
+                func.max(days),
+            )
+            .where(
+                Case.status == "Closed",
+                Case.last_update >= window_start,
+                Case.last_update < window_end,
+            )
+            .group_by(year, quarter, Case.severity)
+            .order_by(year, quarter, Case.severity)
+        )
+        if account is not None:
+            query = query.where(Case.account == account)
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+
+    return [
+        {
+            "quarter": "{}-Q{}".format(year, quarter),
+            "severity": severity,
+            "cases": count,
+            "mean_days": _round(mean_days),
+            "min_days": _round(min_days),
+            "max_days": _round(max_days),
+        }
+        for (year, quarter, severity, count, mean_days, min_days, max_days) in rows
+    ]
+
+
+def comment_velocity(start=None, end=None, engineer=None):
+    """Number of JIRA comments per engineer and week
+
+    Args:
+        start: Optional first comment date included, see _window()
+        end: Optional last comment date included, see _window()
+        engineer: Optional JIRA username to restrict the comments to
+
+    Returns:
+        list: Dictionaries ordered by number of comments, with the
+            'engineer', number of 'comments', number of distinct 'cards'
+            commented on, and the mean comments 'per_week' over the window
+    """
+    window_start, window_end = _window(start, end)
+    weeks = (window_end - window_start).days / 7
+    session = db_config.SessionLocal()
+    try:
+        comments = func.count()
+        query = (
+            select(
+                JiraComment.author,
+                comments,
+                func.count(distinct(JiraComment.jira_card_id)),
+            )
+            .where(
+                JiraComment.last_update_date >= window_start,
+                JiraComment.last_update_date < window_end,
+            )
+            .group_by(JiraComment.author)
+            .order_by(comments.desc(), JiraComment.author)
+        )
+        if engineer is not None:
+            query = query.where(JiraComment.author == engineer)
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+
+    return [
+        {
+            "engineer": author,
+            "comments": count,
+            "cards": cards,
+            "per_week": _round(count / weeks),
+        }
+        for (author, count, cards) in rows
+    ]
+
+
+def case_counts(start=None, end=None, account=None):
+    """Number of cases per account and status
+
+    Args:
+        start: Optional first creation date included, see _window()
+        end: Optional last creation date included, see _window()
+        account: Optional account name to restrict the cases to
+
+    Returns:
+        dict: Case counts keyed by account, then by status. Cases without an
+            account or status are counted under ''.
+    """
+    window_start, window_end = _window(start, end)
+    # NULL keys can't be sorted with the others when serialized
+    case_account = func.coalesce(Case.account, "")
+    status = func.coalesce(Case.status, "")
+    session = db_config.SessionLocal()
+    try:
+        query = (
+            select(case_account, status, func.count())
+            .where(
+                Case.created_date >= window_start,
+                Case.created_date < window_end,
+            )
+            .group_by(case_account, status)
+            .order_by(case_account, status)
+        )
+        if account is not None:
+            query = query.where(Case.account == account)
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+
+    counts = {}
+    for row_account, row_status, count in rows:
+        counts.setdefault(row_account, {})[row_status] = count
+    return counts
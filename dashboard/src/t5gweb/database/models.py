@@ -1,4 +1,10 @@
-"""SQLAlchemy database models"""
+"""SQLAlchemy database models
+
+Lookups by primary key (cases by case_number and created_date, JIRA cards by
+jira_card_id, JIRA comments by jira_comment_id) use the primary key indexes.
+The other filtered columns have named indexes in __table_args__, so
+session.ensure_indexes() can add them to existing databases.
+"""
 
 from datetime import date, datetime
 from typing import List, Optional
@@ -8,6 +14,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     ForeignKeyConstraint,
+    Index,
     Integer,
     String,
     Text,
@@ -58,6 +65,19 @@ class Case(Base):
         String, unique=True, nullable=True
     )
 
+    __table_args__ = (
+        # per account/status aggregates over a range of creation dates,
+        # see analytics.case_counts()
+        Index(
+            "ix_cases_account_status_created_date",
+            "account",
+            "status",
+            "created_date",
+        ),
+        # closed cases by closing date, see analytics.time_to_close()
+        Index("ix_cases_status_last_update", "status", "last_update"),
+    )
+
     jira_cards: Mapped[List["JiraCard"]] = relationship(
         "JiraCard", back_populates="case", cascade="all, delete-orphan"
     )
@@ -100,6 +120,8 @@ class Comment(Base):
             ["cases.case_number", "cases.created_date"],
             ondelete="CASCADE",
         ),
+        # comments of a case, also used by cascaded deletes
+        Index("ix_comments_case", "case_number", "created_date"),
     )
     case: Mapped["Case"] = relationship("Case", back_populates="comments")
 
@@ -160,6 +182,8 @@ class JiraCard(Base):
             ["cases.case_number", "cases.created_date"],
             ondelete="CASCADE",
         ),
+        # cards of a case, see Case.jira_cards
+        Index("ix_jira_cards_case", "case_number", "created_date"),
     )
 
     case: Mapped["Case"] = relationship("Case", back_populates="jira_cards")
@@ -196,4 +220,11 @@ class JiraComment(Base):
     body: Mapped[str] = mapped_column(Text, nullable=False)
     last_update_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
+    __table_args__ = (
+        # comments of a card, see operations.load_jira_cards_postgres()
+        Index("ix_jira_comments_jira_card_id", "jira_card_id"),
+        # per engineer comment counts, see analytics.comment_velocity()
+        Index("ix_jira_comments_author_last_update_date", "author", "last_update_date"),
+    )
+
     jira_card: Mapped["JiraCard"] = relationship("JiraCard", back_populates="comments")
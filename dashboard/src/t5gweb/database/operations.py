@@ -5,6 +5,8 @@ import re
 from datetime import datetime, timezone
 
 from dateutil import parser
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 from t5gweb.utils import format_comment
 
 from .models import Case, JiraCard, JiraComment
@@ -73,6 +75,334 @@ def load_cases_postgres(cases):
         logging.warning("Loaded cases to Postgres")
 
 
+def upsert_cases_postgres(cases, batch_size=500):
+    """Insert or update cases in PostgreSQL with bulk upserts
+
+    Does the same as load_cases_postgres() with one SELECT and at most one
+    INSERT ... ON CONFLICT (case_number, created_date) DO UPDATE statement
+    per batch of cases, instead of a query per case. Cases whose stored row
+    already matches are not written. SQLite's equivalent statement is used
+    when the session is bound to SQLite (e.g. in tests).
+
+    Args:
+        cases: Dictionary of case data keyed by case number, in the format
+            expected by load_cases_postgres()
+        batch_size: Number of cases per SELECT/upsert round trip. Defaults
+            to 500.
+
+    Returns:
+        dict: Number of cases 'inserted', 'updated' and 'unchanged'
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    rows = [_case_row(case_number, case) for (case_number, case) in cases.items()]
+    session = db_config.SessionLocal()
+    try:
+        dialect = session.get_bind().dialect.name
+        for index in range(0, len(rows), batch_size):
+            batch = rows[index : index + batch_size]
+            existing = {
+                (case.case_number, _naive_utc(case.created_date)): case
+                for case in session.scalars(
+                    select(Case).where(
+                        Case.case_number.in_([row["case_number"] for row in batch])
+                    )
+                )
+            }
+            changed = []
+            for row in batch:
+                stored = existing.get(
+                    (row["case_number"], _naive_utc(row["created_date"]))
+                )
+                if stored is None:
+                    counts["inserted"] += 1
+                elif _case_row_changed(stored, row):
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                changed.append(row)
+            if changed:
+                _upsert_rows(
+                    session, dialect, Case, changed, ["case_number", "created_date"]
+                )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logging.error(f"Failed to upsert cases: {e}")
+        raise
+    finally:
+        session.close()
+
+    logging.warning(
+        "Upserted cases to Postgres: %(inserted)s inserted, %(updated)s updated, "
+        "%(unchanged)s unchanged",
+        counts,
+    )
+    return counts
+
+
+def _case_row(case_number, case):
+    """Map cached case data to the columns of the cases table"""
+    severity = case["severity"]
+    return {
+        "case_number": case_number,
+        "owner": case["owner"],
+        "severity": int(severity[0]) if severity[:1].isdigit() else None,
+        "account": case["account"],
+        "summary": case["problem"],
+        "status": case["status"],
+        "created_date": parser.parse(case["createdate"]),
+        "last_update": parser.parse(case["last_update"]),
+        "description": case["description"],
+        "product": case["product"],
+        "product_version": case["product_version"],
+    }
+
+
+def _naive_utc(value):
+    """Convert a datetime to naive UTC, the way the cases table stores it"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _case_row_changed(stored, row):
+    """Check whether a stored Case differs from a row built by _case_row()"""
+    for column, value in row.items():
+        if isinstance(value, datetime):
+            if _naive_utc(getattr(stored, column)) != _naive_utc(value):
+                return True
+        elif getattr(stored, column) != value:
+            return True
+    return False
+
+
+# most bind parameters a dialect accepts in one statement (SQLite before
+# 3.32 accepts 999)
+_MAX_BIND_PARAMETERS = {"postgresql": 65535, "sqlite": 32766}
+
+
+def _upsert_rows(session, dialect, model, rows, keys):
+    """Write rows with the dialect's INSERT ... ON CONFLICT DO UPDATE
+
+    Rows are written with as many statements as needed to stay below the
+    dialect's limit of bind parameters per statement.
+
+    Args:
+        session: Database session
+        dialect: Name of the session's database dialect
+        model: Model class of the table to write
+        rows: List of column dictionaries, all with the same keys
+        keys: Names of the primary key columns, which aren't updated
+    """
+    if dialect == "postgresql":
+        insert = postgresql.insert
+    elif dialect == "sqlite":
+        insert = sqlite.insert
+    else:
+        for row in rows:
+            session.merge(model(**row))
+        return
+    rows_per_statement = _MAX_BIND_PARAMETERS[dialect] // len(rows[0])
+    for index in range(0, len(rows), rows_per_statement):
+        stmt = insert(model).values(rows[index : index + rows_per_statement])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={
+                column: stmt.excluded[column]
+                for column in rows[0]
+                if column not in keys
+            },
+        )
+        session.execute(stmt)
+
+
+def jira_card_record(case_number, issue):
+    """Extract what load_jira_cards_postgres() stores from a JIRA card
+
+    Args:
+        case_number: Case number that this JIRA card is associated with
+        issue: JIRA issue object with the fields read by
+            load_jira_card_postgres()
+
+    Returns:
+        dict: JSON serializable card record, with its comments
+    """
+    return {
+        "jira_card_id": issue.key,
+        "case_number": case_number,
+        "summary": issue.fields.summary,
+        "priority": issue.fields.priority.name if issue.fields.priority else None,
+        "status": issue.fields.status.name,
+        "assignee": issue.fields.assignee.key if issue.fields.assignee else None,
+        "sprint": (
+            str(issue.fields.customfield_10007[0])
+            if hasattr(issue.fields, "customfield_10007")
+            and issue.fields.customfield_10007
+            else None
+        ),
+        "comments": [
+            {
+                "jira_comment_id": comment.id,
+                "author": comment.author.key,
+                "body": format_comment(comment),
+                "last_update_date": comment.updated,
+            }
+            for comment in issue.fields.comment.comments
+        ],
+    }
+
+
+def load_jira_cards_postgres(cases, cards, batch_size=500):
+    """Insert or update JIRA cards and their comments in bulk
+
+    Batch version of load_jira_card_postgres(). Each chunk of cards is
+    written in one transaction: one query each for the stored cards, their
+    cases and their comments, then one upsert per table. Cards whose case
+    isn't in the database are skipped. Cards and comments are only written
+    when they are new or changed, so a comment is rewritten only when its
+    last update date moved. Unlike load_jira_card_postgres(), changed
+    summary, priority, status, assignee, sprint and severity values are
+    stored for existing cards too.
+
+    Args:
+        cases: Dictionary of all case data keyed by case number
+        cards: List of card records as returned by jira_card_record()
+        batch_size: Number of cards per transaction. Defaults to 500.
+
+    Returns:
+        dict: Number of cards 'inserted', 'updated', 'unchanged' and
+            'skipped', and number of 'comments' written
+    """
+    counts = {
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "skipped": 0,
+        "comments": 0,
+    }
+    time_now = datetime.now(timezone.utc)
+    session = db_config.SessionLocal()
+    try:
+        dialect = session.get_bind().dialect.name
+        for index in range(0, len(cards), batch_size):
+            batch = cards[index : index + batch_size]
+            card_ids = [card["jira_card_id"] for card in batch]
+            stored_cards = {
+                jira_card.jira_card_id: jira_card
+                for jira_card in session.scalars(
+                    select(JiraCard).where(JiraCard.jira_card_id.in_(card_ids))
+                )
+            }
+            stored_cases = {
+                (case_number, _naive_utc(created_date))
+                for (case_number, created_date) in session.execute(
+                    select(Case.case_number, Case.created_date).where(
+                        Case.case_number.in_([card["case_number"] for card in batch])
+                    )
+                )
+            }
+            stored_comments = dict(
+                session.execute(
+                    select(
+                        JiraComment.jira_comment_id, JiraComment.last_update_date
+                    ).where(JiraComment.jira_card_id.in_(card_ids))
+                ).all()
+            )
+
+            card_rows = []
+            comment_rows = []
+            for card in batch:
+                row = _jira_card_row(cases, card)
+                stored = stored_cards.get(card["jira_card_id"])
+                if stored is None:
+                    if (
+                        row["case_number"],
+                        _naive_utc(row["created_date"]),
+                    ) not in stored_cases:
+                        logging.warning(
+                            "Cannot create JiraCard for %s - "
+                            "corresponding case not found in database",
+                            row["case_number"],
+                        )
+                        counts["skipped"] += 1
+                        continue
+                    counts["inserted"] += 1
+                    card_rows.append(dict(row, last_update_date=time_now))
+                else:
+                    # the case of an existing card is left as it is
+                    row.update(
+                        case_number=stored.case_number,
+                        created_date=stored.created_date,
+                    )
+                    if any(
+                        getattr(stored, column) != row[column]
+                        for column in _JIRA_CARD_COLUMNS
+                    ):
+                        counts["updated"] += 1
+                        card_rows.append(dict(row, last_update_date=time_now))
+                    else:
+                        counts["unchanged"] += 1
+
+                for comment in card["comments"]:
+                    last_update = parser.parse(comment["last_update_date"])
+                    if comment["jira_comment_id"] in stored_comments and _naive_utc(
+                        stored_comments[comment["jira_comment_id"]]
+                    ) == _naive_utc(last_update):
+                        continue
+                    comment_rows.append(
+                        dict(
+                            comment,
+                            jira_card_id=card["jira_card_id"],
+                            last_update_date=last_update,
+                        )
+                    )
+
+            if card_rows:
+                _upsert_rows(session, dialect, JiraCard, card_rows, ["jira_card_id"])
+            if comment_rows:
+                _upsert_rows(
+                    session, dialect, JiraComment, comment_rows, ["jira_comment_id"]
+                )
+            session.commit()
+            counts["comments"] += len(comment_rows)
+    except Exception as e:
+        session.rollback()
+        logging.error(f"Failed to load Jira cards: {e}")
+        raise
+    finally:
+        session.close()
+
+    logging.warning(
+        "Loaded Jira cards to Postgres: %(inserted)s inserted, %(updated)s "
+        "updated, %(unchanged)s unchanged, %(skipped)s skipped, "
+        "%(comments)s comments written",
+        counts,
+    )
+    return counts
+
+
+# JiraCard columns compared by load_jira_cards_postgres() to detect changes
+_JIRA_CARD_COLUMNS = ("summary", "priority", "status", "assignee", "sprint", "severity")
+
+
+def _jira_card_row(cases, card):
+    """Map a card record to the columns of the jira_cards table"""
+    case = cases[card["case_number"]]
+    severity_match = re.search(r"\d+", case.get("severity", ""))
+    return {
+        "jira_card_id": card["jira_card_id"],
+        "case_number": card["case_number"],
+        "created_date": parser.parse(case["createdate"]),
+        "summary": card["summary"],
+        "priority": card["priority"],
+        "status": card["status"],
+        "assignee": card["assignee"],
+        "sprint": card["sprint"],
+        "severity": int(severity_match.group()) if severity_match else None,
+    }
+
+
 def load_jira_card_postgres(cases, case_number, issue):
     """Load or update a JIRA card and its comments in PostgreSQL database
 
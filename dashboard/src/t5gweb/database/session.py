@@ -1,20 +1,87 @@
 """Database session and connection management"""
 
+import functools
+import logging
+import os
+import sys
 import threading
+import time
 from typing import Optional
 
-from sqlalchemy import URL, create_engine
+from sqlalchemy import URL, create_engine, exc, inspect
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateIndex
 from t5gweb.utils import set_cfg
 
 
+class _TimedQueuePool(QueuePool):
+    """QueuePool that counts checkouts and the time spent waiting for them
+
+    The wait of a checkout includes opening a new connection when the pool
+    has none idle. The counters belong to the pool, so they start over when
+    the pool is recreated by Engine.dispose().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return connection
+
+
+def pool_stats(pool):
+    """Report usage of a database connection pool
+
+    Args:
+        pool: Connection pool of an engine created by DatabaseConfig
+
+    Returns:
+        dict: Dictionary containing:
+            - pool_size: Connections kept open in the pool
+            - checked_out: Connections currently checked out of the pool
+            - overflow: Connections currently open beyond pool_size
+            - checkouts: Checkouts since the pool was created
+            - timeouts: Checkouts that gave up waiting for a connection
+            - wait_seconds: Total time spent waiting for checkouts
+            - max_wait_seconds: Longest wait for a checkout
+    """
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_seconds": round(pool.wait_seconds, 3),
+        "max_wait_seconds": round(pool.max_wait_seconds, 3),
+    }
+
+
 class DatabaseConfig:
-    """Database configuration and session management with execution context awareness
+    """Database configuration and per-process session management
 
-    Manages PostgreSQL database connections with different session strategies
-    for web requests vs Celery workers. Web requests use cached sessionmaker
-    while Celery workers get fresh sessions to avoid connection issues across
-    process boundaries.
+    Lazily creates one engine and one sessionmaker per process, shared by
+    web requests and Celery tasks. Connections can't be shared across a
+    fork, so a process that finds an engine created by its parent (e.g. a
+    Celery prefork child) discards it and creates its own, see dispose().
+    The pool is sized from the postgres_pool_* settings.
 
     Thread-safe lazy initialization of database engine with connection pooling
     and automatic ping testing.
@@ -24,25 +91,26 @@ class DatabaseConfig:
         self._engine: Optional[create_engine] = None  # type: ignore
         self._session_local: Optional[sessionmaker] = None
         self._lock = threading.Lock()
+        # process that created the engine
+        self._pid: Optional[int] = None
 
     @staticmethod
+    @functools.cache
     def get_execution_context():
         """Detect execution context (web vs Celery worker)
 
         Determines if code is running in a Celery worker process or web
         application context by checking environment variables and process name.
+        The context can't change during the life of a process, so it is only
+        detected once.
 
         Returns:
             str: 'celery' if running in Celery worker, 'web' otherwise
         """
-        import os
-
         # Check for Celery worker environment variables
         if any(key in os.environ for key in ["CELERY_WORKER_PROCESS", "C_FORCE_ROOT"]):
             return "celery"
         # Check if current process name contains celery
-        import sys
-
         if "celery" in sys.argv[0].lower():
             return "celery"
         return "web"
@@ -70,55 +138,90 @@ class DatabaseConfig:
 
     @property
     def engine(self) -> create_engine:  # type: ignore
-        """Lazy initialize the database engine with connection pooling
+        """Lazy initialize this process' database engine with connection pooling
 
-        Creates database engine on first access with thread-safe initialization.
-        Configured with connection pool pre-ping, 1-hour recycle time, and
-        10-second connection timeout.
+        Creates database engine on first access in each process with
+        thread-safe initialization. Configured with connection pool pre-ping,
+        1-hour recycle time, 10-second connection timeout, and the pool size,
+        overflow, checkout timeout and statement timeout from the
+        configuration.
 
         Returns:
             Engine: SQLAlchemy database engine instance
         """
+        if self._pid is not None and self._pid != os.getpid():
+            # created before this process was forked
+            self.dispose(close=False)
         if not self._engine:
             with self._lock:
                 if not self._engine:
+                    cfg = set_cfg()
+                    connect_args = {"connect_timeout": 10}
+                    statement_timeout = int(cfg["postgres_statement_timeout"])
+                    if statement_timeout > 0:
+                        connect_args["options"] = "-c statement_timeout={}".format(
+                            statement_timeout
+                        )
                     DATABASE_URL = self.get_database_url()
                     self._engine = create_engine(
                         DATABASE_URL,
+                        poolclass=_TimedQueuePool,
+                        pool_size=int(cfg["postgres_pool_size"]),
+                        max_overflow=int(cfg["postgres_max_overflow"]),
+                        pool_timeout=float(cfg["postgres_pool_timeout"]),
                         pool_pre_ping=True,
                         pool_recycle=3600,
-                        connect_args={"connect_timeout": 10},
+                        connect_args=connect_args,
                     )
+                    self._pid = os.getpid()
         return self._engine
 
     def SessionLocal(self):
-        """Create a new database session with context-aware strategy
-
-        Returns different session types based on execution context:
-        - Celery workers: Fresh session from new sessionmaker (non-scoped)
-        - Web requests: Session from cached sessionmaker (scoped)
+        """Create a new database session from this process' sessionmaker
 
-        This prevents connection issues in Celery workers where connections
-        can't be shared across process boundaries.
+        The sessionmaker is created once per process and bound to the
+        process' engine, see engine.
 
         Returns:
             Session: SQLAlchemy database session instance
         """
-        if self.get_execution_context() == "celery":
-            # Return fresh session for Celery workers (non-scoped)
-            sessionmaker_class = sessionmaker(
-                autocommit=False, autoflush=False, bind=self.engine
-            )
-            return sessionmaker_class()
-        else:
-            # Return session from cached sessionmaker for web requests (scoped)
-            if not self._session_local:
-                with self._lock:
-                    if not self._session_local:
-                        self._session_local = sessionmaker(
-                            autocommit=False, autoflush=False, bind=self.engine
-                        )
-            return self._session_local()
+        engine = self.engine
+        if not self._session_local:
+            with self._lock:
+                if not self._session_local:
+                    self._session_local = sessionmaker(
+                        autocommit=False, autoflush=False, bind=engine
+                    )
+        return self._session_local()
+
+    def dispose(self, close=True):
+        """Discard the engine and sessionmaker
+
+        The next session creates a new engine. Celery calls this with
+        close=False in each new worker process, see
+        taskmgr.reset_database_pool(), so the child doesn't use or close the
+        connections its parent keeps using.
+
+        Args:
+            close: Whether to close the pool's idle connections. Defaults to
+                True; pass False in a forked child.
+        """
+        engine = self._engine
+        # a lock held by another thread of the parent at fork stays locked
+        self._lock = threading.Lock()
+        self._engine = None
+        self._session_local = None
+        self._pid = None
+        if engine is not None:
+            engine.dispose(close=close)
+
+    def pool_stats(self):
+        """Report usage of this process' connection pool, see pool_stats()
+
+        Returns:
+            dict: Statistics of pool_stats() and the 'pid' of the process
+        """
+        return dict(pool_stats(self.engine.pool), pid=os.getpid())
 
 
 db_config = DatabaseConfig()
@@ -137,10 +240,51 @@ class Base(DeclarativeBase):
 def create_postgres_tables():
     """Create all database tables defined in models
 
-    Uses SQLAlchemy metadata to create all tables that don't already exist.
-    Safe to call multiple times - only creates missing tables.
+    Uses SQLAlchemy metadata to create all tables that don't already exist,
+    with their indexes. Indexes missing from tables that already existed are
+    added by the Celery worker at startup, see ensure_indexes(). Safe to call
+    multiple times - only creates missing tables.
 
     Returns:
         None. Tables are created in PostgreSQL database.
     """
     Base.metadata.create_all(bind=db_config.engine)
+
+
+def ensure_indexes(engine):
+    """Create the indexes declared by the models that a database lacks
+
+    create_all() only creates the indexes of the tables it creates, so
+    databases created before an index was declared need it added. Each
+    missing index is created in its own transaction; on PostgreSQL, writes
+    to its table wait while it is built, so this runs once per Celery worker
+    rather than in every web worker.
+
+    The indexes are created with IF NOT EXISTS, so another process adding
+    the same index in the meantime is not an error. An index that fails to
+    build is logged and left for the next start.
+
+    Args:
+        engine: Database engine to migrate
+
+    Returns:
+        list: Names of the indexes that were created
+    """
+    inspector = inspect(engine)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            try:
+                with engine.begin() as connection:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+            except exc.SQLAlchemyError as e:
+                logging.error("Failed to create index %s: %s", index.name, e)
+                continue
+            logging.warning("Created index %s on %s", index.name, table.name)
+            created.append(index.name)
+    return created
@@ -2,28 +2,53 @@
 
 from __future__ import print_function
 
+import bisect
 import datetime
 import json
 import logging
 import re
 import statistics
+import threading
 import time
+import zlib
 from urllib.parse import urlparse
 
 import redis
 import requests
 from jira import JIRA
 from t5gweb.utils import (
+    card_engineer,
+    days_since,
     email_notify,
     exists_or_zero,
-    format_date,
     get_random_member,
     get_token,
     make_headers,
     set_cfg,
     slack_notify,
+    to_epoch,
 )
 
+try:
+    import zstandard
+except ImportError:  # optional, zlib is used without it
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:  # optional, the json module is used without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, see _serializer()
+    msgpack = None
+
+try:
+    from t5gweb import stats_numpy
+except ImportError:  # numpy is optional, see _stats_engine()
+    stats_numpy = None
+
 # for portal to jira mapping
 portal2jira_sevs = {
     "1 (Urgent)": "Critical",
@@ -46,6 +71,74 @@ status_map = {
     "Closed": "Done",
 }
 
+# process-wide redis client, see redis_connection()
+_redis_client = None
+_redis_lock = threading.Lock()
+_redis_connections_opened = 0
+
+# large, frequently read keys whose decoded value is kept in each process
+# and only reloaded when the key's version counter changes, see redis_get()
+LOCAL_CACHE_KEYS = ("cards", "cases", "bugs", "issues", "cards_index")
+_local_cache = {}
+
+# large keys stored compressed when redis_compression is enabled. Compressed
+# values start with a header byte naming the codec, which plain JSON never
+# starts with, so values written before compression was enabled still read
+COMPRESSED_KEYS = ("cards", "cases", "bugs", "issues")
+COMPRESSION_HEADERS = {"zlib": b"\x01", "zstd": b"\x02"}
+COMPRESSION_STATS = "compression_stats"
+_compression_codec = None
+
+# header byte of values encoded with msgpack by serialize(), values without
+# it are JSON
+MSGPACK_HEADER = b"\x03"
+_serializer_name = None
+
+# secondary indexes kept alongside the per-record hashes of cards and cases,
+# see redis_set_records(). Unassigned cards are indexed under an empty engineer.
+RECORD_INDEXES = {
+    "cards": {
+        "account": lambda card: card["account"],
+        "engineer": lambda card: card_engineer(card) or "",
+        "status": lambda card: card["case_status"],
+        "severity": lambda card: card["severity"],
+    },
+    "cases": {
+        "account": lambda case: case["account"],
+        "status": lambda case: case["status"],
+        "severity": lambda case: case["severity"],
+    },
+}
+
+# redis hashes tracking the card batches queued for taskmgr.persist_cards
+CARD_WRITER_PENDING = "card_writer:pending"
+CARD_WRITER_STATE = "card_writer:state"
+
+# filters accepted by query_records(), i.e. the /api/cards and /api/cases
+# query parameters served by the record indexes
+RECORD_FILTERS = ("status", "account", "engineer", "severity")
+
+# case and engineer lookups derived from the cached cards, see build_card_index()
+CARD_INDEX = "cards_index"
+
+# redis hash of precomputed stats, see refresh_stats_snapshot()
+STATS_SNAPSHOT = "stats_snapshot"
+
+# engine computing generate_stats() and generate_histogram_stats(), see
+# _stats_engine()
+_stats_engine_name = None
+
+# daily stats history: a sorted set of 'YYYY-MM-DD' dates scored by their
+# ordinal and a hash of the stats of each date. STATS_LEGACY is the single
+# blob the history used to be stored in, see add_daily_stats()
+STATS_DAYS = "stats:days"
+STATS_DAILY = "stats:daily"
+STATS_LEGACY = "stats"
+
+# longest ranges, in days, that plot_stats() shows per day and per week
+PLOT_DAILY_MAX_DAYS = 92
+PLOT_WEEKLY_MAX_DAYS = 731
+
 
 def jira_connection(cfg):
     """Initiate a connection to the JIRA server
@@ -767,27 +860,114 @@ def generate_notification_content(cfg, assignee, new_card, case, cases):
     return notification_content
 
 
+class _CountingConnection(redis.Connection):
+    """Redis connection that records every new socket it opens
+
+    Used by the shared connection pool so that connection churn can be
+    observed via redis_pool_stats().
+    """
+
+    def _connect(self):
+        global _redis_connections_opened
+        sock = super()._connect()
+        with _redis_lock:
+            _redis_connections_opened += 1
+        return sock
+
+
+def redis_connection():
+    """Return the process-wide Redis client
+
+    Lazily creates a single Redis client backed by a blocking connection pool
+    and returns it on every subsequent call, so that callers reuse open
+    connections instead of doing a fresh TCP handshake per command. The pool
+    is sized and configured from the redis_* settings in the configuration.
+    redis-py resets the pool automatically in forked children (e.g. Celery
+    prefork workers), so the client is safe to create before forking.
+
+    Returns:
+        redis.Redis: Shared Redis client
+    """
+    global _redis_client
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                cfg = set_cfg()
+                pool = redis.BlockingConnectionPool(
+                    connection_class=_CountingConnection,
+                    host=cfg["redis_host"],
+                    port=int(cfg["redis_port"]),
+                    db=int(cfg["redis_db"]),
+                    max_connections=int(cfg["redis_max_connections"]),
+                    timeout=int(cfg["redis_pool_timeout"]),
+                    socket_timeout=float(cfg["redis_socket_timeout"]),
+                    socket_connect_timeout=float(cfg["redis_socket_connect_timeout"]),
+                )
+                _redis_client = redis.Redis(connection_pool=pool)
+    return _redis_client
+
+
+def redis_pool_stats():
+    """Report usage of the shared Redis connection pool
+
+    Returns:
+        dict: Dictionary containing:
+            - connections_opened: Sockets opened by this process since start
+            - max_connections: Configured size of the pool
+            - in_use: Connections currently checked out of the pool
+    """
+    pool = redis_connection().connection_pool
+    return {
+        "connections_opened": _redis_connections_opened,
+        "max_connections": pool.max_connections,
+        "in_use": pool.max_connections - pool.pool.qsize(),
+    }
+
+
+def _version_key(key):
+    """Name of the Redis counter that is bumped whenever key is rewritten"""
+    return f"{key}:version"
+
+
 def redis_set(key, value):
     """Store a key-value pair in Redis cache
 
-    Connects to the Redis server and stores the provided value under the
-    specified key.
+    Stores the provided value under the specified key using the shared
+    Redis client. For keys in LOCAL_CACHE_KEYS the key's version counter is
+    incremented in the same transaction, which tells every process holding
+    a decoded copy to reload it. Keys in COMPRESSED_KEYS are compressed with
+    the configured codec, see _compress().
 
     Args:
         key: Redis key name
-        value: Value to store (should be JSON-serialized string for complex data)
+        value: Value to store (JSON string or output of serialize() for complex
+            data)
     """
     logging.warning("syncing {}..".format(key))
-    r_cache = redis.Redis(host="redis")
-    r_cache.mset({key: value})
+    r_cache = redis_connection()
+    if key in LOCAL_CACHE_KEYS:
+        pipe = r_cache.pipeline()
+        if key in COMPRESSED_KEYS:
+            value, stats = _compress(value)
+            pipe.hset(COMPRESSION_STATS, key, json.dumps(stats))
+        pipe.mset({key: value})
+        pipe.incr(_version_key(key))
+        pipe.execute()
+    else:
+        r_cache.mset({key: value})
     logging.warning("{}....synced".format(key))
 
 
 def redis_get(key):
     """Retrieve a value from Redis cache
 
-    Connects to the Redis server and retrieves the value for the specified
-    key. JSON-decodes the value if it exists.
+    Retrieves the value for the specified key using the shared Redis client.
+    JSON-decodes the value if it exists.
+
+    Keys in LOCAL_CACHE_KEYS are served from a process-local copy as long as
+    their version counter in Redis is unchanged, so a read costs a single
+    GET of an integer instead of transferring and decoding the whole blob.
+    The returned object is shared between callers and must not be modified.
 
     Args:
         key: Redis key name to retrieve
@@ -797,21 +977,528 @@ def redis_get(key):
             doesn't exist or connection fails
     """
     logging.warning("fetching {}..".format(key))
-    r_cache = redis.Redis(host="redis")
+    r_cache = redis_connection()
     try:
-        data = r_cache.get(key)
+        if key in LOCAL_CACHE_KEYS:
+            data = _redis_get_versioned(r_cache, key)
+        else:
+            data = _decode(r_cache.get(key))
     except redis.exceptions.ConnectionError:
         logging.warning("Couldn't connect to redis host, setting data to None")
-        data = None
-    if data is not None:
-        data = json.loads(data.decode("utf-8"))
-    else:
         data = {}
     logging.warning("{} ....fetched".format(key))
 
     return data
 
 
+def redis_version(key):
+    """Current version counter of one of LOCAL_CACHE_KEYS
+
+    Args:
+        key: Redis key name
+
+    Returns:
+        int: Number of times the key was written, or None if never counted
+            or Redis can't be reached
+    """
+    try:
+        version = redis_connection().get(_version_key(key))
+    except redis.exceptions.ConnectionError:
+        logging.warning("Couldn't connect to redis host, no version for %s", key)
+        return None
+    return int(version) if version is not None else None
+
+
+def redis_get_raw(key):
+    """Retrieve the stored JSON of a key without decoding it
+
+    Compressed values are decompressed, but not parsed. msgpack values are
+    converted to JSON.
+
+    Args:
+        key: Redis key name
+
+    Returns:
+        bytes: JSON-encoded value, or None if the key doesn't exist or Redis
+            can't be reached
+    """
+    try:
+        data = redis_connection().get(key)
+    except redis.exceptions.ConnectionError:
+        logging.warning("Couldn't connect to redis host, setting data to None")
+        return None
+    if data is None:
+        return None
+    data = _decompress(data)
+    if data[:1] == MSGPACK_HEADER:
+        return json.dumps(deserialize(data)).encode("utf-8")
+    return data
+
+
+def _decode(data):
+    """Decode a raw Redis value, using an empty dict for missing keys"""
+    if data is not None:
+        return deserialize(_decompress(data))
+    return {}
+
+
+def _serializer():
+    """Serializer used by serialize(), read from the config once"""
+    global _serializer_name
+    if _serializer_name is None:
+        name = set_cfg()["redis_serializer"]
+        if name == "msgpack" and msgpack is None:
+            logging.warning("msgpack is not installed, serializing with json")
+            name = "json"
+        if name != "msgpack":
+            name = "json"
+        _serializer_name = name
+    return _serializer_name
+
+
+def serialize(data):
+    """Encode a value for the Redis cache
+
+    Uses msgpack if configured, otherwise JSON written by orjson when it is
+    installed. msgpack values are prefixed with MSGPACK_HEADER, so both
+    formats can be read back by deserialize() while a rollout is in progress.
+
+    Args:
+        data: Value to encode
+
+    Returns:
+        bytes: Encoded value
+    """
+    if _serializer() == "msgpack":
+        return MSGPACK_HEADER + msgpack.packb(data)
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data).encode("utf-8")
+
+
+def deserialize(data):
+    """Decode a value written by serialize() or as plain JSON text
+
+    Args:
+        data: Encoded value, bytes or str
+
+    Returns:
+        dict or other: Decoded value
+
+    Raises:
+        RuntimeError: If the value is msgpack-encoded and msgpack isn't
+            installed
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if data[:1] == MSGPACK_HEADER:
+        if msgpack is None:
+            raise RuntimeError("value is msgpack-encoded, install msgpack to read it")
+        # serialize() accepts non-str keys, as orjson does with OPT_NON_STR_KEYS
+        return msgpack.unpackb(data[1:], strict_map_key=False)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def _compression():
+    """Codec used to compress COMPRESSED_KEYS, read from the config once"""
+    global _compression_codec
+    if _compression_codec is None:
+        codec = set_cfg()["redis_compression"]
+        if codec == "zstd" and zstandard is None:
+            logging.warning("zstandard is not installed, compressing with zlib")
+            codec = "zlib"
+        if codec not in COMPRESSION_HEADERS:
+            codec = "none"
+        _compression_codec = codec
+    return _compression_codec
+
+
+def _compress(value):
+    """Compress a JSON value with the configured codec
+
+    Args:
+        value: JSON-encoded value
+
+    Returns:
+        tuple: A 2-tuple containing:
+            - Value to store, the header byte and compressed data, or the
+              unchanged value if compression is disabled
+            - Dictionary with the codec and the raw and stored sizes in bytes
+    """
+    codec = _compression()
+    raw = value.encode("utf-8") if isinstance(value, str) else value
+    if codec == "zlib":
+        value = COMPRESSION_HEADERS[codec] + zlib.compress(raw)
+    elif codec == "zstd":
+        value = COMPRESSION_HEADERS[codec] + zstandard.ZstdCompressor().compress(raw)
+    stored = value.encode("utf-8") if isinstance(value, str) else value
+    return value, {"codec": codec, "raw_bytes": len(raw), "stored_bytes": len(stored)}
+
+
+def _decompress(data):
+    """Undo _compress(), passing uncompressed values through unchanged
+
+    Raises:
+        RuntimeError: If the value is zstd-compressed and zstandard isn't
+            installed
+    """
+    header = data[:1]
+    if header == COMPRESSION_HEADERS["zlib"]:
+        return zlib.decompress(data[1:])
+    if header == COMPRESSION_HEADERS["zstd"]:
+        if zstandard is None:
+            raise RuntimeError("value is zstd-compressed, install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data[1:])
+    return data
+
+
+def compression_stats():
+    """Report the raw and stored size of each of COMPRESSED_KEYS
+
+    Returns:
+        dict: Codec, raw_bytes, stored_bytes and ratio (stored / raw) of each
+            key, as of its last write
+    """
+    stats = {}
+    for key, value in redis_connection().hgetall(COMPRESSION_STATS).items():
+        key_stats = json.loads(value)
+        raw_bytes = key_stats["raw_bytes"]
+        key_stats["ratio"] = key_stats["stored_bytes"] / raw_bytes if raw_bytes else 1
+        stats[key.decode("utf-8")] = key_stats
+    return stats
+
+
+def _redis_get_versioned(r_cache, key):
+    """Read a key through the process-local cache
+
+    Compares the key's version counter with the version of the local copy
+    and only fetches and decodes the value when they differ. Values written
+    without a version counter are never cached locally, since nothing would
+    invalidate them.
+
+    Args:
+        r_cache: Redis client
+        key: Redis key name, one of LOCAL_CACHE_KEYS
+
+    Returns:
+        dict or other: Deserialized value
+    """
+    version = r_cache.get(_version_key(key))
+    cached = _local_cache.get(key)
+    if version is not None and cached is not None and cached[0] == version:
+        return cached[1]
+
+    # read the value together with its version so the pair is consistent
+    pipe = r_cache.pipeline()
+    pipe.get(_version_key(key))
+    pipe.get(key)
+    version, raw = pipe.execute()
+    data = _decode(raw)
+    if version is not None:
+        _local_cache[key] = (version, data)
+    return data
+
+
+def redis_set_dataset(key, data):
+    """Cache cards or cases in all of their Redis layouts
+
+    Stores the whole dataset as a single JSON blob (used by the API and most
+    views) and as one hash field per record with secondary indexes (used by
+    the filtered views, see redis_get_records()). Cards also get their
+    CARD_INDEX rewritten. The stats snapshot is rebuilt afterwards, since it
+    is derived from both datasets.
+
+    Args:
+        key: Dataset name, either 'cards' or 'cases'
+        data: Dictionary of records keyed by card key or case number
+    """
+    redis_set(key, serialize(data))
+    redis_set_records(key, data)
+    if key == "cards":
+        redis_set(CARD_INDEX, serialize(build_card_index(data)))
+    refresh_stats_snapshot()
+
+
+def build_card_index(cards):
+    """Index cards by case number and their cases by engineer
+
+    Args:
+        cards: Dictionary of cards keyed by card key
+
+    Returns:
+        dict: 'case_cards' maps each case number to the sorted keys of its
+            cards, 'engineer_cases' maps each assignee's display name to the
+            sorted case numbers of their cards
+    """
+    case_cards = {}
+    engineer_cases = {}
+    for card, data in sorted(cards.items()):
+        case_cards.setdefault(data["case_number"], []).append(card)
+        engineer = card_engineer(data)
+        if engineer is not None:
+            engineer_cases.setdefault(engineer, set()).add(data["case_number"])
+    return {
+        "case_cards": case_cards,
+        "engineer_cases": {
+            engineer: sorted(cases) for (engineer, cases) in engineer_cases.items()
+        },
+    }
+
+
+def get_card_index():
+    """Retrieve the CARD_INDEX of the cached cards
+
+    Builds the index from the cards blob if it hasn't been cached yet.
+
+    Returns:
+        dict: Card index, see build_card_index()
+    """
+    index = redis_get(CARD_INDEX)
+    if not index:
+        logging.warning("no card index cached, building it from cards")
+        index = build_card_index(redis_get("cards"))
+    return index
+
+
+def _records_key(name):
+    """Name of the Redis hash holding one field per record"""
+    return f"{name}:records"
+
+
+def _index_key(name, field, value):
+    """Name of the Redis set holding the IDs of records with field == value"""
+    return f"{name}:index:{field}:{value}"
+
+
+def redis_set_records(name, records):
+    """Store records as individual hash fields plus secondary index sets
+
+    Replaces the '<name>:records' hash with one JSON-encoded field per record
+    and rebuilds the '<name>:index:<field>:<value>' sets defined in
+    RECORD_INDEXES. The names of all index sets are tracked in
+    '<name>:indexes' so that stale ones are dropped on the next rewrite. The
+    rewrite happens in a single transaction, so readers never observe a
+    partially written dataset.
+
+    Args:
+        name: Dataset name, a key of RECORD_INDEXES
+        records: Dictionary of records keyed by record ID
+    """
+    logging.warning("syncing {} records..".format(name))
+    index_sets = {}
+    for record_id, record in records.items():
+        for field, get_value in RECORD_INDEXES[name].items():
+            value = get_value(record)
+            if value is not None:
+                index_key = _index_key(name, field, value)
+                index_sets.setdefault(index_key, set()).add(record_id)
+
+    r_cache = redis_connection()
+    old_indexes = r_cache.smembers(f"{name}:indexes")
+    pipe = r_cache.pipeline()
+    pipe.delete(_records_key(name), f"{name}:indexes", *old_indexes)
+    if records:
+        pipe.hset(
+            _records_key(name),
+            mapping={
+                record_id: serialize(record) for record_id, record in records.items()
+            },
+        )
+    for index_key, members in index_sets.items():
+        pipe.sadd(index_key, *members)
+    if index_sets:
+        pipe.sadd(f"{name}:indexes", *index_sets)
+    pipe.execute()
+    logging.warning("{} records....synced".format(name))
+
+
+def redis_get_records(name, **filters):
+    """Retrieve records matching all of the given index filters
+
+    Intersects the index sets for the filters and fetches only the matching
+    records from the '<name>:records' hash. Falls back to filtering the JSON
+    blob if the per-record layout hasn't been written yet.
+
+    Args:
+        name: Dataset name, a key of RECORD_INDEXES
+        **filters: Index field/value pairs, e.g. account='Acme' or
+            engineer='Jane Doe'. Fields must be defined in RECORD_INDEXES.
+
+    Returns:
+        dict: Matching records keyed by record ID, sorted by ID, empty if
+            Redis can't be reached
+    """
+    logging.warning("fetching {} records for {}..".format(name, filters))
+    try:
+        return _redis_get_records(name, filters)
+    except redis.exceptions.ConnectionError:
+        logging.warning("Couldn't connect to redis host, no {} records".format(name))
+        return {}
+
+
+def _redis_get_records(name, filters):
+    """Fetch the records for redis_get_records()"""
+    r_cache = redis_connection()
+    if not r_cache.exists(_records_key(name)):
+        logging.warning("no {} records cached, filtering {} blob".format(name, name))
+        indexes = RECORD_INDEXES[name]
+        return {
+            record_id: record
+            for (record_id, record) in sorted(redis_get(name).items())
+            if all(indexes[f](record) == v for (f, v) in filters.items())
+        }
+
+    if filters:
+        record_ids = r_cache.sinter(
+            [_index_key(name, field, value) for (field, value) in filters.items()]
+        )
+        record_ids = sorted(record_id.decode("utf-8") for record_id in record_ids)
+        values = r_cache.hmget(_records_key(name), record_ids) if record_ids else []
+        records = zip(record_ids, values)
+    else:
+        records = (
+            (record_id.decode("utf-8"), value)
+            for (record_id, value) in r_cache.hgetall(_records_key(name)).items()
+        )
+    return {
+        record_id: deserialize(value)
+        for (record_id, value) in sorted(records)
+        if value is not None
+    }
+
+
+def _record_updated(name, record):
+    """Epoch seconds of the last update of a case, or of a card's case"""
+    if name == "cases":
+        timestamp = record.get("last_update_ts")
+        return timestamp if timestamp is not None else to_epoch(record["last_update"])
+    timestamp = record.get("case_updated_ts")
+    if timestamp is None:
+        updated = datetime.datetime.strptime(
+            record["case_updated_date"], "%Y-%m-%d %H:%M"
+        )
+        timestamp = updated.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return timestamp
+
+
+def query_records(
+    name, filters=None, updated_since=None, fields=None, limit=None, cursor=None
+):
+    """Retrieve one page of filtered cards or cases
+
+    Index filters are resolved with redis_get_records(). Cases have no
+    engineer index, so an engineer filter on cases goes through the card index
+    instead. Pages are ordered by record ID and continue after the cursor,
+    the last ID of the previous page.
+
+    Args:
+        name: Dataset name, either 'cards' or 'cases'
+        filters: Optional dictionary of RECORD_FILTERS to values
+        updated_since: Optional epoch seconds; only records whose case was
+            updated at or after this time are returned
+        fields: Optional list of record keys to return. Defaults to all.
+        limit: Optional maximum number of records in the page
+        cursor: Optional record ID to continue after
+
+    Returns:
+        tuple: A 2-tuple containing:
+            - Dictionary of matching records keyed by ID, sorted by ID
+            - Cursor of the next page, or None if this is the last page
+
+    Raises:
+        ValueError: If a filter is not one of RECORD_FILTERS
+    """
+    filters = dict(filters or {})
+    unknown = set(filters) - set(RECORD_FILTERS)
+    if unknown:
+        raise ValueError("unknown filter: {}".format(", ".join(sorted(unknown))))
+
+    case_numbers = None
+    if name == "cases" and "engineer" in filters:
+        engineer = filters.pop("engineer")
+        case_numbers = set(get_card_index()["engineer_cases"].get(engineer, []))
+    if filters:
+        records = redis_get_records(name, **filters)
+    else:
+        records = dict(sorted(redis_get(name).items()))
+
+    record_ids = list(records)
+    if cursor is not None:
+        record_ids = record_ids[bisect.bisect_right(record_ids, cursor) :]
+
+    page = {}
+    next_cursor = None
+    for record_id in record_ids:
+        record = records[record_id]
+        if case_numbers is not None and record_id not in case_numbers:
+            continue
+        if updated_since is not None and _record_updated(name, record) < updated_since:
+            continue
+        if limit is not None and len(page) == limit:
+            next_cursor = list(page)[-1]
+            break
+        if fields is not None:
+            record = {field: record[field] for field in fields if field in record}
+        page[record_id] = record
+    return page, next_cursor
+
+
+def card_writer_queued(batch_id, size):
+    """Record a batch of cards waiting to be stored in PostgreSQL
+
+    Args:
+        batch_id: Unique ID of the batch
+        size: Number of cards in the batch
+    """
+    redis_connection().hset(
+        CARD_WRITER_PENDING,
+        batch_id,
+        json.dumps({"queued_at": time.time(), "cards": size}),
+    )
+
+
+def card_writer_done(batch_id, failed=False):
+    """Record that a batch of cards left the PostgreSQL writer queue
+
+    Args:
+        batch_id: ID passed to card_writer_queued()
+        failed: Boolean indicating whether the batch was given up on
+    """
+    pipe = redis_connection().pipeline()
+    pipe.hdel(CARD_WRITER_PENDING, batch_id)
+    if failed:
+        pipe.hincrby(CARD_WRITER_STATE, "failed_batches", 1)
+    else:
+        pipe.hset(CARD_WRITER_STATE, "last_written", time.time())
+    pipe.execute()
+
+
+def card_writer_status():
+    """Report how far the PostgreSQL card writer is behind
+
+    Returns:
+        dict: Number of pending batches and cards, age in seconds of the
+            oldest pending batch, epoch time of the last written batch and
+            number of batches that failed for good
+    """
+    r_cache = redis_connection()
+    pending = [json.loads(batch) for batch in r_cache.hvals(CARD_WRITER_PENDING)]
+    state = {
+        field.decode("utf-8"): float(value)
+        for (field, value) in r_cache.hgetall(CARD_WRITER_STATE).items()
+    }
+    oldest = min((batch["queued_at"] for batch in pending), default=None)
+    return {
+        "pending_batches": len(pending),
+        "pending_cards": sum(batch["cards"] for batch in pending),
+        "lag_seconds": time.time() - oldest if oldest is not None else 0,
+        "last_written": state.get("last_written"),
+        "failed_batches": int(state.get("failed_batches", 0)),
+    }
+
+
 def get_case_from_link(jira_conn, card):
     """Extract case number from JIRA card's remote links
 
@@ -871,40 +1558,90 @@ def generate_stats(account=None, engineer=None):
     logging.warning("generating stats")
     start = time.time()
 
-    cards = redis_get("cards")
-    cases = redis_get("cases")
     bugs = redis_get("bugs")
     issues = redis_get("issues")
 
+    card_filters = {}
     if account is not None:
         logging.warning("filtering cases for {}".format(account))
-        cards = {c: d for (c, d) in cards.items() if d["account"] == account}
-        cases = {c: d for (c, d) in cases.items() if d["account"] == account}
+        card_filters["account"] = account
+        cases = redis_get_records("cases", account=account)
+    else:
+        cases = redis_get("cases")
     if engineer is not None:
         logging.warning("filtering cases for {}".format(engineer))
-        cards = {
-            c: d for (c, d) in cards.items() if d["assignee"]["displayName"] == engineer
-        }
+        card_filters["engineer"] = engineer
+    if card_filters:
+        cards = redis_get_records("cards", **card_filters)
+    else:
+        cards = redis_get("cards")
 
-        # get case number and assignee from cards so that we can determine which cases
-        # belong to the engineer
-        temp_cases = {}
-        for case, details in cases.items():
-            for card in cards:
-                if (
-                    case == cards[card]["case_number"]
-                    and cards[card]["assignee"]["displayName"] == engineer
-                ):
-                    temp_cases[case] = details
-        cases = temp_cases
+    if engineer is not None:
+        # only keep the cases whose cards are assigned to the engineer
+        case_numbers = get_card_index()["engineer_cases"].get(engineer, [])
+        cases = {case: cases[case] for case in case_numbers if case in cases}
+
+    stats = _compute_stats(cards, cases, bugs, issues)
+
+    end = time.time()
+    logging.warning("generated stats in {} seconds".format((end - start)))
+
+    return stats
+
+
+def _compute_stats(cards, cases, bugs, issues):
+    """Compute the statistics of generate_stats() for already filtered data
+
+    Args:
+        cards: Dictionary of cards to count, keyed by card key
+        cases: Dictionary of cases to count, keyed by case number
+        bugs: Dictionary of Bugzilla bugs per case number
+        issues: Dictionary of JIRA issues per case number
 
+    Returns:
+        dict: Statistics dictionary, see generate_stats()
+    """
     today = datetime.date.today()
+    if _stats_engine() == "numpy":
+        stats = stats_numpy.count_stats(cards, cases, today)
+    else:
+        stats = _count_stats(cards, cases, today)
+    stats["bugs"]["unique"], stats["bugs"]["no_target"] = _count_bugs(
+        cases, bugs, issues
+    )
+    return stats
+
+
+def _stats_engine():
+    """Engine used to compute stats, read from the config once"""
+    global _stats_engine_name
+    if _stats_engine_name is None:
+        name = set_cfg()["stats_engine"]
+        if name == "numpy" and stats_numpy is None:
+            logging.warning("numpy is not installed, computing stats in python")
+            name = "python"
+        if name != "numpy":
+            name = "python"
+        _stats_engine_name = name
+    return _stats_engine_name
+
+
+def _count_stats(cards, cases, today):
+    """Count cards and cases for _compute_stats() with plain Python loops
+
+    Args:
+        cards: Dictionary of cards to count, keyed by card key
+        cases: Dictionary of cases to count, keyed by case number
+        today: datetime.date the case ages are counted to
 
+    Returns:
+        dict: Statistics dictionary, see generate_stats(), with zero bug counts
+    """
     customers = [cards[card]["account"] for card in cards]
     engineers = [
-        cards[card]["assignee"]["displayName"]
+        card_engineer(cards[card])
         for card in cards
-        if cards[card]["assignee"]["displayName"] is not None
+        if card_engineer(cards[card]) is not None
     ]
     severities = [cards[card]["severity"] for card in cards]
     statuses = [cards[card]["case_status"] for card in cards]
@@ -930,7 +1667,7 @@ def generate_stats(account=None, engineer=None):
 
     for card, data in cards.items():
         account = data["account"]
-        engineer = data["assignee"]["displayName"]
+        engineer = card_engineer(data)
         severity = data["severity"]
         status = data["case_status"]
 
@@ -952,21 +1689,40 @@ def generate_stats(account=None, engineer=None):
             if cards[card]["bugzilla"] is None and cards[card]["issues"] is None:
                 stats["no_bzs"] += 1
 
+    # cases missing a date aren't counted in that date's windows
     for case, data in cases.items():
         if data["status"] == "Closed":
-            if (today - (format_date(data["closeddate"]).date())).days < 7:
+            days_closed = days_since(data, "closeddate", today)
+            if days_closed is not None and days_closed < 7:
                 stats["weekly_closed_cases"] += 1
-            if (today - format_date(data["closeddate"]).date()).days <= 1:
+            if days_closed is not None and days_closed <= 1:
                 stats["daily_closed_cases"] += 1
         else:
             stats["open_cases"] += 1
-            if (today - format_date(data["createdate"]).date()).days < 7:
+            days_open = days_since(data, "createdate", today)
+            if days_open is not None and days_open < 7:
                 stats["weekly_opened_cases"] += 1
-            if (today - format_date(data["createdate"]).date()).days <= 1:
+            if days_open is not None and days_open <= 1:
                 stats["daily_opened_cases"] += 1
-            if (today - format_date(data["last_update"]).date()).days < 7:
+            days_updated = days_since(data, "last_update", today)
+            if days_updated is not None and days_updated < 7:
                 stats["no_updates"] += 1
 
+    return stats
+
+
+def _count_bugs(cases, bugs, issues):
+    """Count the bugs and issues linked to open cases
+
+    Args:
+        cases: Dictionary of cases keyed by case number
+        bugs: Dictionary of Bugzilla bugs per case number
+        issues: Dictionary of JIRA issues per case number
+
+    Returns:
+        tuple: Number of unique bugs and issues, and the number of them that
+            are missing a target
+    """
     all_bugs = {}
     no_target = {}
     if bugs:
@@ -985,13 +1741,7 @@ def generate_stats(account=None, engineer=None):
                     if is_bug_missing_target(issue):
                         no_target[issue["id"]] = issue
 
-    stats["bugs"]["unique"] = len(all_bugs)
-    stats["bugs"]["no_target"] = len(no_target)
-
-    end = time.time()
-    logging.warning("generated stats in {} seconds".format((end - start)))
-
-    return stats
+    return len(all_bugs), len(no_target)
 
 
 def is_bug_missing_target(item):
@@ -1012,47 +1762,151 @@ def is_bug_missing_target(item):
         )
 
 
-def plot_stats():
+def _day_score(day):
+    """Score of a 'YYYY-MM-DD' date in the STATS_DAYS sorted set"""
+    return datetime.date.fromisoformat(day).toordinal()
+
+
+def _migrate_stats_blob(r_cache):
+    """Move the history from the STATS_LEGACY blob into the daily entries
+
+    Runs once: the blob is deleted afterwards. Days that already have a daily
+    entry keep it.
+
+    Args:
+        r_cache: Redis client
+    """
+    if not r_cache.exists(STATS_LEGACY):
+        return
+    historical_stats = _decode(r_cache.get(STATS_LEGACY))
+    logging.warning("migrating {} days of stats".format(len(historical_stats)))
+    pipe = r_cache.pipeline()
+    if historical_stats:
+        pipe.zadd(STATS_DAYS, {day: _day_score(day) for day in historical_stats})
+        for day, stats in historical_stats.items():
+            pipe.hsetnx(STATS_DAILY, day, json.dumps(stats))
+    pipe.delete(STATS_LEGACY)
+    pipe.execute()
+
+
+def add_daily_stats(day, stats):
+    """Store the stats of one day in the history
+
+    Args:
+        day: Date string in 'YYYY-MM-DD' format
+        stats: Statistics dictionary, see generate_stats()
+    """
+    r_cache = redis_connection()
+    _migrate_stats_blob(r_cache)
+    pipe = r_cache.pipeline()
+    pipe.zadd(STATS_DAYS, {day: _day_score(day)})
+    pipe.hset(STATS_DAILY, day, json.dumps(stats))
+    pipe.execute()
+
+
+def get_daily_stats(start=None, end=None):
+    """Retrieve the stats history for a range of days
+
+    Args:
+        start: Optional first date in 'YYYY-MM-DD' format. Defaults to the
+            oldest day.
+        end: Optional last date in 'YYYY-MM-DD' format. Defaults to the
+            newest day.
+
+    Returns:
+        dict: Statistics dictionaries keyed by date, oldest first
+    """
+    r_cache = redis_connection()
+    _migrate_stats_blob(r_cache)
+    days = r_cache.zrangebyscore(
+        STATS_DAYS,
+        _day_score(start) if start is not None else "-inf",
+        _day_score(end) if end is not None else "+inf",
+    )
+    if not days:
+        return {}
+    days = [day.decode("utf-8") for day in days]
+    return {
+        day: json.loads(stats)
+        for (day, stats) in zip(days, r_cache.hmget(STATS_DAILY, days))
+        if stats is not None
+    }
+
+
+def _plot_values(stat):
+    """Values of the plotted metrics in one day of stats"""
+    return {
+        "escalated": exists_or_zero(stat, "escalated"),
+        "open_cases": exists_or_zero(stat, "open_cases"),
+        "new_cases": exists_or_zero(stat, "daily_opened_cases"),
+        "closed_cases": exists_or_zero(stat, "daily_closed_cases"),
+        "no_updates": exists_or_zero(stat, "no_updates"),
+        "no_bzs": exists_or_zero(stat, "no_bzs"),
+        "bugs_unique": exists_or_zero(stat["bugs"], "unique"),
+        "bugs_no_tgt": exists_or_zero(stat["bugs"], "no_target"),
+        "high_prio": exists_or_zero(stat, "high_prio"),
+        "crit_sit": exists_or_zero(stat, "crit_sit"),
+        "total_escalations": exists_or_zero(stat, "total_escalations"),
+    }
+
+
+def _plot_bucket(day, resolution):
+    """First date of the day, week or month that a date is plotted in"""
+    date = datetime.date.fromisoformat(day)
+    if resolution == "week":
+        date -= datetime.timedelta(days=date.weekday())
+    elif resolution == "month":
+        date = date.replace(day=1)
+    return date.isoformat()
+
+
+def plot_stats(start=None, end=None):
     """Prepare historical statistics data for plotting
 
-    Retrieves cached historical statistics and transforms them into x and y
-    value lists suitable for time-series plotting.
+    Retrieves the daily statistics between start and end and transforms them
+    into x and y value lists suitable for time-series plotting. Ranges longer
+    than PLOT_DAILY_MAX_DAYS are plotted per week and ranges longer than
+    PLOT_WEEKLY_MAX_DAYS per month, using the mean of the days in each.
+
+    Args:
+        start: Optional first date in 'YYYY-MM-DD' format. Defaults to the
+            oldest day.
+        end: Optional last date in 'YYYY-MM-DD' format. Defaults to the
+            newest day.
 
     Returns:
         tuple: A 2-tuple containing:
-            - x_values: List of date strings
+            - x_values: List of date strings, the first day of each week or
+                month when downsampled
             - y_values: Dictionary of metric name to value lists, including:
                 escalated, open_cases, new_cases, closed_cases, no_updates,
                 no_bzs, bugs_unique, bugs_no_tgt, high_prio, crit_sit, and
                 total_escalations
     """
-    historical_stats = redis_get("stats")
-    x_values = [day for day in historical_stats]
-    y_values = {
-        "escalated": [],
-        "open_cases": [],
-        "new_cases": [],
-        "closed_cases": [],
-        "no_updates": [],
-        "no_bzs": [],
-        "bugs_unique": [],
-        "bugs_no_tgt": [],
-        "high_prio": [],
-        "crit_sit": [],
-        "total_escalations": [],
-    }
+    historical_stats = get_daily_stats(start, end)
+    resolution = "day"
+    if historical_stats:
+        days = list(historical_stats)
+        span = _day_score(days[-1]) - _day_score(days[0])
+        if span > PLOT_WEEKLY_MAX_DAYS:
+            resolution = "month"
+        elif span > PLOT_DAILY_MAX_DAYS:
+            resolution = "week"
+
+    buckets = {}
     for day, stat in historical_stats.items():
-        y_values["escalated"].append(exists_or_zero(stat, "escalated"))
-        y_values["open_cases"].append(exists_or_zero(stat, "open_cases"))
-        y_values["new_cases"].append(exists_or_zero(stat, "daily_opened_cases"))
-        y_values["closed_cases"].append(exists_or_zero(stat, "daily_closed_cases"))
-        y_values["no_updates"].append(exists_or_zero(stat, "no_updates"))
-        y_values["no_bzs"].append(exists_or_zero(stat, "no_bzs"))
-        y_values["bugs_unique"].append(exists_or_zero(stat["bugs"], "unique"))
-        y_values["bugs_no_tgt"].append(exists_or_zero(stat["bugs"], "no_target"))
-        y_values["high_prio"].append(exists_or_zero(stat, "high_prio"))
-        y_values["crit_sit"].append(exists_or_zero(stat, "crit_sit"))
-        y_values["total_escalations"].append(exists_or_zero(stat, "total_escalations"))
+        bucket = _plot_bucket(day, resolution)
+        buckets.setdefault(bucket, []).append(_plot_values(stat))
+
+    x_values = list(buckets)
+    y_values = {metric: [] for metric in _plot_values({"bugs": {}})}
+    for values in buckets.values():
+        for metric in y_values:
+            if len(values) == 1:
+                y_values[metric].append(values[0][metric])
+            else:
+                mean = statistics.mean(value[metric] for value in values)
+                y_values[metric].append(round(mean, 2))
 
     return x_values, y_values
 
@@ -1097,6 +1951,31 @@ def generate_histogram_stats(account=None, engineer=None):
               }
               The times are represented as the number of days until resolution / relief.
     """
+    filters = {}
+    if account is not None:
+        logging.warning(f"filtering cards for {account}")
+        filters["account"] = account
+    if engineer is not None:
+        logging.warning(f"filtering cards for {engineer}")
+        filters["engineer"] = engineer
+    cards = redis_get_records("cards", **filters) if filters else redis_get("cards")
+
+    return _compute_histogram_stats(cards)
+
+
+def _compute_histogram_stats(cards):
+    """Compute the histograms of generate_histogram_stats() for the given cards
+
+    Args:
+        cards: Dictionary of cards to include, keyed by card key
+
+    Returns:
+        dict: Resolved and relief times per severity, see
+            generate_histogram_stats()
+    """
+    if _stats_engine() == "numpy":
+        return stats_numpy.histogram_stats(cards)
+
     seconds_per_day = 60 * 60 * 24
     base_dictionary = {
         "Urgent": {"data": [], "mean": None, "median": None},
@@ -1104,16 +1983,6 @@ def generate_histogram_stats(account=None, engineer=None):
         "Normal": {"data": [], "mean": None, "median": None},
         "Low": {"data": [], "mean": None, "median": None},
     }
-    cards = redis_get("cards")
-    if account is not None:
-        logging.warning(f"filtering cards for {account}")
-        cards = {c: d for (c, d) in cards.items() if d["account"] == account}
-
-    if engineer is not None:
-        logging.warning(f"filtering cards for {engineer}")
-        cards = {
-            c: d for (c, d) in cards.items() if d["assignee"]["displayName"] == engineer
-        }
 
     histogram_data = {
         "Resolved": base_dictionary,
@@ -1123,32 +1992,19 @@ def generate_histogram_stats(account=None, engineer=None):
     # Iterate over each entry in the input dictionary
     for card, details in cards.items():
         severity = details.get("severity")
-        resolved_at = details.get("resolved_at")
-        relief_at = details.get("relief_at")
-        case_created = details.get("case_created")
 
         # Add time to resolution to the "Resolved" dictionary, indexed by severity
+        resolved_at = _card_epoch(details, "resolved_at")
         if resolved_at is not None:
-            if isinstance(resolved_at, int):
-                # Timestamp is provided w/ empty milliseconds, so divide by 1000
-                resolved_at = datetime.datetime.fromtimestamp(resolved_at / 1000)
-            else:
-                resolved_at = format_date(resolved_at)
-            days_until_resolved = (
-                resolved_at - format_date(case_created)
-            ).total_seconds() / seconds_per_day
+            case_created = _card_epoch(details, "case_created")
+            days_until_resolved = (resolved_at - case_created) / seconds_per_day
             histogram_data["Resolved"][severity]["data"].append(days_until_resolved)
 
         # Add time to relief to the "Relief" dictionary, indexed by severity
+        relief_at = _card_epoch(details, "relief_at")
         if relief_at is not None:
-            if isinstance(relief_at, int):
-                # Timestamp is provided w/ empty milliseconds, so divide by 1000
-                relief_at = datetime.datetime.fromtimestamp(relief_at / 1000)
-            else:
-                relief_at = format_date(relief_at)
-            days_until_relief = (
-                relief_at - format_date(case_created)
-            ).total_seconds() / seconds_per_day
+            case_created = _card_epoch(details, "case_created")
+            days_until_relief = (relief_at - case_created) / seconds_per_day
             histogram_data["Relief"][severity]["data"].append(days_until_relief)
 
     # Calculate mean and median for each severity level
@@ -1162,6 +2018,137 @@ def generate_histogram_stats(account=None, engineer=None):
     return histogram_data
 
 
+def _card_epoch(card, key):
+    """Epoch seconds of a card date, preferring the '<key>_ts' copy
+
+    Args:
+        card: Card dictionary
+        key: Name of the date field, e.g. 'resolved_at'
+
+    Returns:
+        float: Seconds since the epoch, or None if the card has no such date
+    """
+    timestamp = card.get(f"{key}_ts")
+    if timestamp is None and card.get(key) is not None:
+        timestamp = to_epoch(card[key])
+    return timestamp
+
+
+def _stats_field(account=None, engineer=None):
+    """Name of the STATS_SNAPSHOT field holding the stats for a page
+
+    Returns:
+        str: Field name, or None for an account and engineer together, which
+            aren't precomputed
+    """
+    if account is not None and engineer is not None:
+        return None
+    if account is not None:
+        return f"account:{account}"
+    if engineer is not None:
+        return f"engineer:{engineer}"
+    return "global"
+
+
+def refresh_stats_snapshot():
+    """Precompute the stats and histograms of the dashboard pages
+
+    Computes the same values as generate_stats() and generate_histogram_stats()
+    for all cards, for every account and for every engineer, grouping the
+    cards and cases in a single pass. The results replace the STATS_SNAPSHOT
+    hash in one transaction, one JSON-encoded field per page (see
+    _stats_field()).
+    """
+    logging.warning("refreshing stats snapshot")
+    start = time.time()
+
+    # bugs and issues may be refreshed before the first cards or cases
+    cards = redis_get("cards") or {}
+    cases = redis_get("cases") or {}
+    bugs = redis_get("bugs")
+    issues = redis_get("issues")
+
+    # sorted like redis_get_records() so the rollups match the live stats
+    engineer_cases = build_card_index(cards)["engineer_cases"]
+    cards_by_account = {}
+    cards_by_engineer = {}
+    for card, data in sorted(cards.items()):
+        cards_by_account.setdefault(data["account"], {})[card] = data
+        engineer = card_engineer(data)
+        if engineer is not None:
+            cards_by_engineer.setdefault(engineer, {})[card] = data
+    cases_by_account = {}
+    for case, data in sorted(cases.items()):
+        cases_by_account.setdefault(data["account"], {})[case] = data
+
+    snapshot = {
+        _stats_field(): {
+            "stats": _compute_stats(cards, cases, bugs, issues),
+            "histogram": _compute_histogram_stats(cards),
+        }
+    }
+    for account, account_cards in cards_by_account.items():
+        account_cases = cases_by_account.get(account, {})
+        snapshot[_stats_field(account=account)] = {
+            "stats": _compute_stats(account_cards, account_cases, bugs, issues),
+            "histogram": _compute_histogram_stats(account_cards),
+        }
+    for engineer, engineer_cards in cards_by_engineer.items():
+        cases_of_engineer = {
+            case: cases[case] for case in engineer_cases[engineer] if case in cases
+        }
+        snapshot[_stats_field(engineer=engineer)] = {
+            "stats": _compute_stats(engineer_cards, cases_of_engineer, bugs, issues),
+            "histogram": _compute_histogram_stats(engineer_cards),
+        }
+
+    pipe = redis_connection().pipeline()
+    pipe.delete(STATS_SNAPSHOT)
+    pipe.hset(
+        STATS_SNAPSHOT,
+        mapping={field: json.dumps(value) for (field, value) in snapshot.items()},
+    )
+    pipe.execute()
+
+    end = time.time()
+    logging.warning(
+        "refreshed {} stats snapshots in {} seconds".format(len(snapshot), end - start)
+    )
+
+
+def get_stats_snapshot(account=None, engineer=None):
+    """Retrieve the precomputed stats and histograms for a dashboard page
+
+    Reads the page's field of the STATS_SNAPSHOT hash written by
+    refresh_stats_snapshot(). Pages without a snapshot, e.g. an account that
+    has cases but no cards yet or an engineer within an account, are computed
+    live instead.
+
+    Args:
+        account: Optional account name. Defaults to None (all accounts).
+        engineer: Optional engineer name. Defaults to None (all engineers).
+
+    Returns:
+        dict: 'stats' as returned by generate_stats() and 'histogram' as
+            returned by generate_histogram_stats()
+    """
+    field = _stats_field(account, engineer)
+    snapshot = None
+    try:
+        if field is not None:
+            snapshot = redis_connection().hget(STATS_SNAPSHOT, field)
+    except redis.exceptions.ConnectionError:
+        logging.warning("Couldn't connect to redis host, generating stats")
+    if snapshot is not None:
+        return json.loads(snapshot)
+
+    logging.warning("no stats snapshot for {}, generating".format(field))
+    return {
+        "stats": generate_stats(account, engineer),
+        "histogram": generate_histogram_stats(account, engineer),
+    }
+
+
 def sync_priority(cfg):
     """Synchronize JIRA card priorities with case severities
 
@@ -1238,7 +2225,7 @@ def sync_portal_to_jira():
     cards = redis_get("cards")
 
     open_cases = [case for case in cases if cases[case]["status"] != "Closed"]
-    card_cases = [cards[card]["case_number"] for card in cards]
+    card_cases = get_card_index()["case_cards"]
     logging.warning("found {} cases in JIRA".format(len(card_cases)))
     new_cases = [case for case in open_cases if case not in card_cases]
     logging.warning("new cases: {}".format(new_cases))
@@ -1276,8 +2263,7 @@ def sync_portal_to_jira():
                 slack_notify(cfg, notification_content)
             else:
                 logging.warning("no slack token or channel specified")
-            cards.update(new_cards)
-            redis_set("cards", json.dumps(cards))
+            redis_set_dataset("cards", {**cards, **new_cards})
         response = {"cards_created": len(new_cases)}
     else:
         logging.warning("no new cards required")
@@ -0,0 +1,182 @@
+"""NumPy engine for the dashboard stats, see libtelco5g._stats_engine()"""
+
+import statistics
+
+import numpy as np
+from t5gweb.utils import EPOCH_ORDINAL, SECONDS_PER_DAY, card_engineer, to_epoch
+
+SEVERITIES = ("Urgent", "High", "Normal", "Low")
+
+
+def _categories(values):
+    """Encode values as categorical codes
+
+    Args:
+        values: List of hashable values
+
+    Returns:
+        tuple: A 2-tuple containing:
+            - List of the distinct values in order of first appearance
+            - Array with the index of each value in that list
+    """
+    categories = list(dict.fromkeys(values))
+    lookup = {value: code for (code, value) in enumerate(categories)}
+    codes = np.fromiter(
+        (lookup[value] for value in values), dtype=np.intp, count=len(values)
+    )
+    return categories, codes
+
+
+def _group_counts(categories, codes, mask):
+    """Count the masked codes of each category, including empty ones"""
+    counts = np.bincount(codes[mask], minlength=len(categories))
+    return {category: int(count) for (category, count) in zip(categories, counts)}
+
+
+def _flags(records, test):
+    """Boolean array of test(record) for each record"""
+    return np.array([bool(test(record)) for record in records], dtype=bool)
+
+
+def _epochs(records, key):
+    """Float array of the '<key>_ts' epoch of each record, NaN where missing
+
+    Records cached without the epoch copy have their date string converted,
+    like libtelco5g._card_epoch().
+    """
+    ts_key = f"{key}_ts"
+    timestamps = [
+        record[ts_key] if ts_key in record else _legacy_epoch(record, key)
+        for record in records
+    ]
+    # None becomes NaN
+    return np.array(timestamps, dtype=np.float64)
+
+
+def _legacy_epoch(record, key):
+    """Epoch of a date of a record cached without its '<key>_ts' copy"""
+    return to_epoch(record[key]) if record.get(key) is not None else None
+
+
+def _days_since(records, key, today):
+    """Vectorized utils.days_since() for a list of records
+
+    Records without the date are left out, as their NaN epochs have no day.
+    """
+    epochs = _epochs(records, key)
+    epochs = epochs[~np.isnan(epochs)]
+    days = np.floor_divide(epochs, SECONDS_PER_DAY).astype(np.int64)
+    return today.toordinal() - EPOCH_ORDINAL - days
+
+
+def count_stats(cards, cases, today):
+    """Count cards and cases like libtelco5g._count_stats()
+
+    Accounts, engineers, severities and statuses are encoded as categorical
+    codes and counted with np.bincount, the case ages are computed on arrays
+    of epoch timestamps.
+
+    Args:
+        cards: Dictionary of cards to count, keyed by card key
+        cases: Dictionary of cases to count, keyed by case number
+        today: datetime.date the case ages are counted to
+
+    Returns:
+        dict: Statistics dictionary, see libtelco5g.generate_stats(), with zero
+            bug counts
+    """
+    cards = list(cards.values())
+    accounts, account_codes = _categories([card["account"] for card in cards])
+    engineers, engineer_codes = _categories([card_engineer(card) for card in cards])
+    severities, severity_codes = _categories([card["severity"] for card in cards])
+    statuses, status_codes = _categories([card["case_status"] for card in cards])
+
+    is_open = np.ones(len(cards), dtype=bool)
+    if "Closed" in statuses:
+        is_open = status_codes != statuses.index("Closed")
+    high_prio = np.isin(
+        severity_codes,
+        [code for (code, s) in enumerate(severities) if s in ("High", "Urgent")],
+    )
+    escalated = _flags(cards, lambda card: card["escalated"])
+    crit_sit = _flags(cards, lambda card: card["crit_sit"])
+    no_bzs = _flags(
+        cards, lambda card: card["bugzilla"] is None and card["issues"] is None
+    )
+
+    by_engineer = _group_counts(engineers, engineer_codes, is_open)
+    by_engineer.pop(None, None)
+
+    cases = list(cases.values())
+    closed_cases = [case for case in cases if case["status"] == "Closed"]
+    open_cases = [case for case in cases if case["status"] != "Closed"]
+    days_closed = _days_since(closed_cases, "closeddate", today)
+    days_open = _days_since(open_cases, "createdate", today)
+    days_updated = _days_since(open_cases, "last_update", today)
+
+    return {
+        "by_customer": _group_counts(accounts, account_codes, is_open),
+        "by_engineer": by_engineer,
+        "by_severity": _group_counts(severities, severity_codes, is_open),
+        "by_status": _group_counts(statuses, status_codes, slice(None)),
+        "high_prio": int(np.count_nonzero(is_open & high_prio)),
+        "escalated": int(np.count_nonzero(is_open & escalated)),
+        "open_cases": len(open_cases),
+        "weekly_closed_cases": int(np.count_nonzero(days_closed < 7)),
+        "weekly_opened_cases": int(np.count_nonzero(days_open < 7)),
+        "daily_closed_cases": int(np.count_nonzero(days_closed <= 1)),
+        "daily_opened_cases": int(np.count_nonzero(days_open <= 1)),
+        "no_updates": int(np.count_nonzero(days_updated < 7)),
+        "no_bzs": int(np.count_nonzero(is_open & no_bzs)),
+        "bugs": {"unique": 0, "no_target": 0},
+        "crit_sit": int(np.count_nonzero(is_open & crit_sit)),
+        "total_escalations": int(np.count_nonzero(is_open & (escalated | crit_sit))),
+    }
+
+
+def histogram_stats(cards):
+    """Compute resolved and relief times like libtelco5g._compute_histogram_stats()
+
+    The days until resolution and relief of all cards are computed as one
+    array per kind. Like the Python engine, both kinds share one dictionary,
+    so each severity's data holds the resolved and relief times of its cards
+    in card order. Means are computed with statistics.mean to return exactly
+    the same values as the Python engine.
+
+    Args:
+        cards: Dictionary of cards to include, keyed by card key
+
+    Returns:
+        dict: Resolved and relief times per severity, see
+            libtelco5g.generate_histogram_stats()
+    """
+    cards = list(cards.values())
+    severities, severity_codes = _categories([card.get("severity") for card in cards])
+    case_created = _epochs(cards, "case_created")
+    # one row per card: days until resolution, then days until relief
+    days = (
+        np.column_stack([_epochs(cards, "resolved_at"), _epochs(cards, "relief_at")])
+        - case_created[:, None]
+    ) / SECONDS_PER_DAY
+    has_data = ~np.isnan(days)
+
+    base_dictionary = {}
+    for severity in SEVERITIES:
+        data = np.empty(0)
+        if severity in severities:
+            in_severity = (severity_codes == severities.index(severity))[:, None]
+            data = days[has_data & in_severity]
+        base_dictionary[severity] = {
+            "data": data.tolist(),
+            "mean": statistics.mean(data.tolist()) if data.size else None,
+            "median": float(np.median(data)) if data.size else None,
+        }
+    unknown = [
+        severity
+        for (code, severity) in enumerate(severities)
+        if severity not in SEVERITIES and has_data[severity_codes == code].any()
+    ]
+    if unknown:
+        raise KeyError(unknown[0])
+
+    return {"Resolved": base_dictionary, "Relief": base_dictionary}
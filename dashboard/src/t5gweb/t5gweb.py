@@ -9,7 +9,13 @@ from datetime import date, datetime, timezone
 
 import click
 from flask.cli import with_appcontext
-from t5gweb.utils import format_date, get_fake_data, set_cfg
+from t5gweb.utils import (
+    SECONDS_PER_DAY,
+    comment_epoch,
+    days_since,
+    get_fake_data,
+    set_cfg,
+)
 
 from . import cache, libtelco5g
 
@@ -30,15 +36,12 @@ def get_new_cases():
 
     interval = 7
     today = date.today()
+    # copy the matching cases, the cached data is shared and must not change
     new_cases = {
-        c: d
+        c: dict(d, severity=re.sub(r"\(|\)| |\d", "", d["severity"]))
         for (c, d) in sorted(cases.items(), key=lambda i: i[1]["severity"])
-        if (today - format_date(d["createdate"]).date()).days <= interval
+        if days_since(d, "createdate", today) <= interval
     }
-    for case in new_cases:
-        new_cases[case]["severity"] = re.sub(
-            r"\(|\)| |\d", "", new_cases[case]["severity"]
-        )
     return new_cases
 
 
@@ -70,7 +73,8 @@ def get_new_comments(cards, new_comments_only=True, account=None, engineer=None)
             c: d for (c, d) in cards.items() if d["assignee"]["displayName"] == engineer
         }
     logging.warning("found %d JIRA cards" % (len(cards)))
-    time_now = datetime.now(timezone.utc)
+    time_now = datetime.now(timezone.utc).timestamp()
+    week = 7 * SECONDS_PER_DAY
 
     # filter cards for comments created in the last week
     detailed_cards = {}
@@ -80,14 +84,14 @@ def get_new_comments(cards, new_comments_only=True, account=None, engineer=None)
         comments = []
         if new_comments_only:
             if cards[card]["comments"] is not None:
+                # comments cached before the epoch copy was added only have
+                # the body and the timestamp string
                 comments = [
                     comment
                     for comment in cards[card]["comments"]
-                    if (
-                        time_now
-                        - datetime.strptime(comment[1], "%Y-%m-%dT%H:%M:%S.%f%z")
-                    ).days
-                    < 7
+                    if time_now
+                    - (comment[2] if len(comment) > 2 else comment_epoch(comment[1]))
+                    < week
                 ]
         else:
             if cards[card]["comments"] is not None:
@@ -95,8 +99,8 @@ def get_new_comments(cards, new_comments_only=True, account=None, engineer=None)
         if len(comments) == 0:
             continue  # no updates
         else:
-            detailed_cards[card] = cards[card]
-            detailed_cards[card]["comments"] = comments
+            # copy the card, the cached data is shared and must not change
+            detailed_cards[card] = dict(cards[card], comments=comments)
         account_list.append(cards[card]["account"])
     account_list.sort()
     logging.warning("found %d detailed cards" % (len(detailed_cards)))
@@ -206,7 +210,7 @@ def init_cache():
         issues = libtelco5g.redis_get("issues")
         details = libtelco5g.redis_get("details")
         escalations = libtelco5g.redis_get("escalations")
-        stats = libtelco5g.redis_get("stats")
+        stats = libtelco5g.get_daily_stats()
         if cases == {}:
             logging.warning("no cases found in cache. refreshing...")
             cache.get_cases(cfg)
@@ -234,7 +238,10 @@ def init_cache():
         logging.warning("using fake data")
         data = get_fake_data()
         for key, value in data.items():
-            libtelco5g.redis_set(key, json.dumps(value))
+            if key in libtelco5g.RECORD_INDEXES:
+                libtelco5g.redis_set_dataset(key, value)
+            else:
+                libtelco5g.redis_set(key, json.dumps(value))
 
 
 def init_app(app):
@@ -6,16 +6,50 @@ import os
 import xmlrpc
 
 import bugzilla
-import redis
 import t5gweb.cache as cache
 import t5gweb.libtelco5g as libtelco5g
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_init, worker_process_init
+from t5gweb.database import db_config, ensure_indexes, load_jira_cards_postgres
 from t5gweb.utils import email_notify, set_cfg
 
 mgr = Celery("t5gweb", broker="redis://redis:6379/0", backend="redis://redis:6379/0")
 
 
+@worker_init.connect
+def add_missing_indexes(**kwargs):
+    """Add the indexes missing from existing tables before the worker starts
+
+    Runs once in the main worker process instead of in every web worker, see
+    ensure_indexes(). The worker starts even if the database can't be
+    reached. The connections are closed again so the forked worker
+    processes don't inherit them.
+
+    Args:
+        **kwargs: Keyword arguments from the signal
+    """
+    try:
+        ensure_indexes(db_config.engine)
+    except Exception as e:
+        logging.error("Failed to add missing indexes: %s", e)
+    finally:
+        db_config.dispose()
+
+
+@worker_process_init.connect
+def reset_database_pool(**kwargs):
+    """Give each prefork worker process its own database connection pool
+
+    Discards the engine inherited from the parent process without closing
+    the parent's connections, see DatabaseConfig.dispose().
+
+    Args:
+        **kwargs: Keyword arguments from the signal
+    """
+    db_config.dispose(close=False)
+
+
 # https://docs.celeryproject.org/en/stable/userguide/periodic-tasks.html#entries
 @mgr.on_after_configure.connect
 def setup_scheduled_tasks(sender, **kwargs):
@@ -145,7 +179,7 @@ def portal_jira_sync():
 
     logging.warning("job: checking for new cases")
     have_lock = False
-    sync_lock = redis.Redis(host="redis").lock("sync_lock", timeout=60 * 60 * 2)
+    sync_lock = libtelco5g.redis_connection().lock("sync_lock", timeout=60 * 60 * 2)
     try:
         have_lock = sync_lock.acquire(blocking=False)
         if have_lock:
@@ -171,8 +205,8 @@ def cache_data(data_type):
 
     Args:
         data_type: Type of data to cache. Valid values:
-            - 'cases': Red Hat Portal cases
-            - 'cards': JIRA cards (uses locking)
+            - 'cases': Red Hat Portal cases (incremental refresh)
+            - 'cards': JIRA cards (uses locking, incremental refresh)
             - 'details': Case details including CritSit status
             - 'bugs': Bugzilla bug details
             - 'issues': JIRA issues linked to cases
@@ -189,16 +223,18 @@ def cache_data(data_type):
     result = None
 
     if data_type == "cases":
-        cache.get_cases(cfg)
+        cache.get_cases(cfg, incremental=True)
     elif data_type == "cards":
         # Use redis locks to prevent concurrent refreshes
 
         have_lock = False
-        refresh_lock = redis.Redis(host="redis").lock("refresh_lock", timeout=60 * 30)
+        refresh_lock = libtelco5g.redis_connection().lock(
+            "refresh_lock", timeout=60 * 30
+        )
         try:
             have_lock = refresh_lock.acquire(blocking=False)
             if have_lock:
-                result = cache.get_cards(cfg)
+                result = cache.get_cards(cfg, incremental=True)
             else:
                 logging.warning("lock found. bailing...")
         finally:
@@ -262,36 +298,39 @@ def tag_bz():
     }
 
     logging.warning("tagging bugzillas")
-    for case in bugs:
-        if case in cases:
-            for bug in bugs[case]:
-                try:
-                    bz = bz_api.getbug(bug["bugzillaNumber"])
-                except xmlrpc.client.Fault:
-                    logging.warning(
-                        "error: {} is restricted".format(bug["bugzillaNumber"])
-                    )
-                    bz = None
-                if bz:
-                    update = None
-                    if "telco" not in bz.internal_whiteboard.lower():
-                        update = bz_api.build_update(
-                            internal_whiteboard="Telco Telco:Case "
-                            + bz.internal_whiteboard,
-                            minor_update=True,
-                        )
-                    elif "telco:case" not in bz.internal_whiteboard.lower():
-                        update = bz_api.build_update(
-                            internal_whiteboard=bz.internal_whiteboard + " Telco:Case",
-                            minor_update=True,
-                        )
-                    if update:
-                        logging.warning("tagging BZ:" + str(bz.id))
-                        try:
-                            bz_api.update_bugs([bz.id], update)
-                        except xmlrpc.client.Fault:
-                            logging.warning("Tried and failed to tag " + str(bz.id))
-                            continue
+    # Bugs that are tagged according to the bug cache are skipped, the others
+    # are fetched again so a whiteboard edited since then isn't overwritten
+    bz_bugs = libtelco5g.redis_get("bz_bugs")
+    bug_ids = [
+        bug_id
+        for bug_id in dict.fromkeys(
+            bug["bugzillaNumber"]
+            for case in bugs
+            if case in cases
+            for bug in bugs[case]
+        )
+        if bug_id not in bz_bugs
+        or "telco:case" not in bz_bugs[bug_id]["internal_whiteboard"].lower()
+    ]
+    for bz in cache.fetch_bz_bugs(bz_api, bug_ids, cfg).values():
+        update = None
+        if "telco" not in bz.internal_whiteboard.lower():
+            update = bz_api.build_update(
+                internal_whiteboard="Telco Telco:Case " + bz.internal_whiteboard,
+                minor_update=True,
+            )
+        elif "telco:case" not in bz.internal_whiteboard.lower():
+            update = bz_api.build_update(
+                internal_whiteboard=bz.internal_whiteboard + " Telco:Case",
+                minor_update=True,
+            )
+        if update:
+            logging.warning("tagging BZ:" + str(bz.id))
+            try:
+                bz_api.update_bugs([bz.id], update)
+            except xmlrpc.client.Fault:
+                logging.warning("Tried and failed to tag " + str(bz.id))
+                continue
     logging.warning("tagging Jira Bugs")
     for case in issues:
         if case in cases:
@@ -412,13 +451,40 @@ def cache_stats():
     cache.get_stats()
 
 
+@mgr.task(bind=True, autoretry_for=(Exception,), max_retries=3, retry_backoff=30)
+def persist_cards(self, batch_id, cases, cards):
+    """Celery task to store a batch of refreshed cards in PostgreSQL
+
+    Queued by cache.get_cards once the cards are cached in Redis, so the
+    refresh doesn't wait for the database. The batch is removed from the
+    pending batches reported by /api/status when it is stored, or when the
+    last retry fails.
+
+    Task automatically retries up to 3 times with 30-second backoff on failure.
+
+    Args:
+        self: Celery task instance (bound), used to count retries
+        batch_id: ID of the batch in the pending batches
+        cases: Dictionary of case data for the cards in the batch
+        cards: List of card records, see database.jira_card_record()
+    """
+    try:
+        load_jira_cards_postgres(cases, cards, len(cards) or 1)
+    except Exception:
+        if self.request.retries >= self.max_retries:
+            libtelco5g.card_writer_done(batch_id, failed=True)
+        raise
+    libtelco5g.card_writer_done(batch_id)
+
+
 @mgr.task(bind=True)
 def refresh_background(self):
     """Celery task to refresh JIRA cards cache in background
 
-    Refreshes the JIRA cards cache and reports progress updates during
-    execution. Uses a distributed lock to prevent concurrent refreshes
-    (30-minute timeout). The task ID is stored in Redis for progress tracking.
+    Refreshes the JIRA cards that changed since the last refresh and reports
+    progress updates during execution. Uses a distributed lock to prevent
+    concurrent refreshes (30-minute timeout). The task ID is stored in Redis
+    for progress tracking.
 
     If the refresh is already in progress, the task will not run and returns
     a locked status. Lock code derived from:
@@ -434,13 +500,13 @@ def refresh_background(self):
     """
 
     have_lock = False
-    refresh_lock = redis.Redis(host="redis").lock("refresh_lock", timeout=60 * 30)
+    refresh_lock = libtelco5g.redis_connection().lock("refresh_lock", timeout=60 * 30)
     try:
         have_lock = refresh_lock.acquire(blocking=False)
         if have_lock:
             libtelco5g.redis_set("refresh_id", json.dumps(self.request.id))
             cfg = set_cfg()
-            cache.get_cards(cfg, self, background=True)
+            cache.get_cards(cfg, self, background=True, incremental=True)
             response = {
                 "current": 100,
                 "total": 100,
@@ -6,6 +6,7 @@
 import json
 import logging
 import os
+from datetime import date
 from urllib.parse import urljoin, urlparse
 
 from flask import (
@@ -22,10 +23,10 @@ from flask_login import LoginManager, UserMixin, login_required, login_user
 from onelogin.saml2.auth import OneLogin_Saml2_Auth
 from onelogin.saml2.utils import OneLogin_Saml2_Utils
 from t5gweb.libtelco5g import (
-    generate_histogram_stats,
-    generate_stats,
+    get_stats_snapshot,
     plot_stats,
     redis_get,
+    redis_get_records,
     redis_set,
 )
 from t5gweb.t5gweb import get_new_cases, get_new_comments, get_trending_cards, plots
@@ -513,15 +514,25 @@ def get_stats():
 
     Generates and displays overall statistics including counts by customer,
     engineer, severity, status, historical trends, and time-to-resolution
-    histograms for all cases and cards.
+    histograms for all cases and cards. The 'from' and 'to' query parameters
+    (YYYY-MM-DD) limit the range of the historical trends.
 
     Returns:
         str: Rendered HTML template with statistics, time-series plots, and
             histogram data
     """
-    stats = generate_stats()
-    x_values, y_values = plot_stats()
-    histogram_stats = generate_histogram_stats()
+    start = request.args.get("from")
+    end = request.args.get("to")
+    try:
+        for day in (start, end):
+            if day is not None:
+                date.fromisoformat(day)
+    except ValueError:
+        abort(400)
+    snapshot = get_stats_snapshot()
+    x_values, y_values = plot_stats(start, end)
+    stats = snapshot["stats"]
+    histogram_stats = snapshot["histogram"]
     return render_template(
         "ui/stats.html",
         now=redis_get("timestamp"),
@@ -548,11 +559,12 @@ def get_account(account):
         str: Rendered HTML template with account-specific data and statistics
     """
     cfg = set_cfg()
-    stats = generate_stats(account)
-    cards = redis_get("cards")
+    snapshot = get_stats_snapshot(account=account)
+    stats = snapshot["stats"]
+    cards = redis_get_records("cards", account=account)
     comments = get_new_comments(cards=cards, new_comments_only=False, account=account)
     pie_stats = make_pie_dict(stats)
-    histogram_stats = generate_histogram_stats(account)
+    histogram_stats = snapshot["histogram"]
     return render_template(
         "ui/account.html",
         page_title=account,
@@ -583,11 +595,12 @@ def get_engineer(engineer):
         str: Rendered HTML template with engineer-specific data and statistics
     """
     cfg = set_cfg()
-    cards = redis_get("cards")
-    stats = generate_stats(engineer=engineer)
+    cards = redis_get_records("cards", engineer=engineer)
+    snapshot = get_stats_snapshot(engineer=engineer)
+    stats = snapshot["stats"]
     comments = get_new_comments(cards=cards, new_comments_only=False, engineer=engineer)
     pie_stats = make_pie_dict(stats)
-    histogram_stats = generate_histogram_stats(engineer=engineer)
+    histogram_stats = snapshot["histogram"]
     return render_template(
         "ui/account.html",
         page_title=engineer,
@@ -1,6 +1,7 @@
 """utils.py: utility functions for the t5gweb"""
 
 import datetime
+import functools
 import json
 import logging
 import os
@@ -188,7 +189,7 @@ def set_cfg():
             - API credentials and endpoints (Portal, JIRA, Bugzilla)
             - Email and Slack notification settings
             - Team member assignments
-            - Database connection parameters
+            - Database and Redis connection parameters
             - RBAC and authentication settings
             - Query and result limits
     """
@@ -207,8 +208,12 @@ def set_cfg():
     cfg["offline_token"] = os.environ.get("offline_token")  # portal
     cfg["redhat_api"] = os.environ.get("redhat_api")  # redhat api url
     cfg["query"] = os.environ.get("case_query")
-    cfg["max_portal_results"] = os.environ.get("max_portal_results")
+    cfg["max_portal_results"] = os.environ.get(
+        "max_portal_results", cfg["max_portal_results"]
+    )
+    cfg["portal_workers"] = os.environ.get("portal_workers", cfg["portal_workers"])
     cfg["bz_key"] = os.environ.get("bz_key")
+    cfg["bz_chunk_size"] = os.environ.get("bz_chunk_size", cfg["bz_chunk_size"])
     cfg["sheet_id"] = os.environ.get("sheet_id")
     cfg["jira_escalations_project"] = os.environ.get("jira_escalations_project")
     cfg["jira_escalations_label"] = os.environ.get("jira_escalations_label")
@@ -230,7 +235,15 @@ def set_cfg():
     cfg["component"] = os.environ.get("jira_component")
     cfg["board"] = os.environ.get("jira_board")
     cfg["jira_query"] = os.environ.get("jira_query")
-    cfg["max_jira_results"] = os.environ.get("max_jira_results")
+    cfg["max_jira_results"] = os.environ.get(
+        "max_jira_results", cfg["max_jira_results"]
+    )
+    cfg["card_full_sync_hours"] = os.environ.get(
+        "card_full_sync_hours", cfg["card_full_sync_hours"]
+    )
+    cfg["case_full_sync_hours"] = os.environ.get(
+        "case_full_sync_hours", cfg["case_full_sync_hours"]
+    )
     cfg["password"] = os.environ.get("jira_pass")
     cfg["labels"] = (
         os.environ.get("jira_labels").split(",")
@@ -246,6 +259,44 @@ def set_cfg():
     cfg["POSTGRESQL_SERVICE_HOST"] = os.environ.get("POSTGRESQL_SERVICE_HOST")
     cfg["POSTGRESQL_SERVICE_PORT"] = os.environ.get("POSTGRESQL_SERVICE_PORT")
     cfg["POSTGRESQL_DATABASE"] = os.environ.get("POSTGRESQL_DATABASE")
+    cfg["postgres_batch_size"] = os.environ.get(
+        "postgres_batch_size", cfg["postgres_batch_size"]
+    )
+    cfg["postgres_pool_size"] = os.environ.get(
+        "postgres_pool_size", cfg["postgres_pool_size"]
+    )
+    cfg["postgres_max_overflow"] = os.environ.get(
+        "postgres_max_overflow", cfg["postgres_max_overflow"]
+    )
+    cfg["postgres_pool_timeout"] = os.environ.get(
+        "postgres_pool_timeout", cfg["postgres_pool_timeout"]
+    )
+    cfg["postgres_statement_timeout"] = os.environ.get(
+        "postgres_statement_timeout", cfg["postgres_statement_timeout"]
+    )
+    # redis
+    cfg["redis_host"] = os.environ.get("redis_host", cfg["redis_host"])
+    cfg["redis_port"] = os.environ.get("redis_port", cfg["redis_port"])
+    cfg["redis_db"] = os.environ.get("redis_db", cfg["redis_db"])
+    cfg["redis_max_connections"] = os.environ.get(
+        "redis_max_connections", cfg["redis_max_connections"]
+    )
+    cfg["redis_socket_timeout"] = os.environ.get(
+        "redis_socket_timeout", cfg["redis_socket_timeout"]
+    )
+    cfg["redis_socket_connect_timeout"] = os.environ.get(
+        "redis_socket_connect_timeout", cfg["redis_socket_connect_timeout"]
+    )
+    cfg["redis_pool_timeout"] = os.environ.get(
+        "redis_pool_timeout", cfg["redis_pool_timeout"]
+    )
+    cfg["redis_compression"] = os.environ.get(
+        "redis_compression", cfg["redis_compression"]
+    )
+    cfg["redis_serializer"] = os.environ.get(
+        "redis_serializer", cfg["redis_serializer"]
+    )
+    cfg["stats_engine"] = os.environ.get("stats_engine", cfg["stats_engine"])
     # sso
     cfg["rbac"] = os.environ.get("rbac").split(",") if os.environ.get("rbac") else []
     cfg["max_to_create"] = os.environ.get("max_to_create")
@@ -266,6 +317,7 @@ def set_defaults():
             - Portal API field lists
             - Slack settings
             - API result limits
+            - PostgreSQL and Redis connection pool settings
             - SLA day thresholds by severity level
     """
     defaults = {}
@@ -309,6 +361,25 @@ def set_defaults():
     defaults["low_severity_slack_channel"] = ""
     defaults["max_jira_results"] = 1000
     defaults["max_portal_results"] = 5000
+    defaults["portal_workers"] = 8
+    defaults["bz_chunk_size"] = 100
+    defaults["postgres_batch_size"] = 500
+    defaults["postgres_pool_size"] = 5
+    defaults["postgres_max_overflow"] = 10
+    defaults["postgres_pool_timeout"] = 30
+    defaults["postgres_statement_timeout"] = 0
+    defaults["card_full_sync_hours"] = 24
+    defaults["case_full_sync_hours"] = 24
+    defaults["redis_host"] = "redis"
+    defaults["redis_port"] = 6379
+    defaults["redis_db"] = 0
+    defaults["redis_max_connections"] = 20
+    defaults["redis_socket_timeout"] = 30
+    defaults["redis_socket_connect_timeout"] = 5
+    defaults["redis_pool_timeout"] = 10
+    defaults["redis_compression"] = "none"
+    defaults["redis_serializer"] = "json"
+    defaults["stats_engine"] = "python"
     defaults["sla_settings"] = {
         "days": {"Urgent": 14, "High": 20, "Normal": 90, "Low": 180},
         "partners": [],
@@ -429,9 +500,18 @@ def make_headers(token):
     return headers
 
 
+# ordinal of the day that epoch timestamps count from, see days_since()
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 60 * 60 * 24
+
+
+@functools.lru_cache(maxsize=16384)
 def format_date(the_date):
     """Converts a date string in to the required format
 
+    Parsed dates are memoized, since the cached cases and cards hold the same
+    few thousand strings and the views ask for them on every request.
+
     Args:
         date(str): A date stored as a string
 
@@ -442,6 +522,73 @@ def format_date(the_date):
     return formatted_date
 
 
+def to_epoch(the_date):
+    """Convert a UTC date to seconds since the epoch
+
+    Args:
+        the_date: Date string in the format read by format_date(), or
+            milliseconds since the epoch as returned by JIRA for some fields
+
+    Returns:
+        float: Seconds since the epoch
+    """
+    if isinstance(the_date, int):
+        return the_date / 1000
+    return _date_epoch(the_date)
+
+
+@functools.lru_cache(maxsize=16384)
+def _date_epoch(the_date):
+    """Memoized to_epoch() of a date string"""
+    return format_date(the_date).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def days_since(record, key, today):
+    """Count the calendar days from a record's date until today
+
+    Uses the epoch timestamp stored next to the date string as '<key>_ts' at
+    ingestion, and only parses the string for records cached without one.
+
+    Args:
+        record: Case or card dictionary holding the date string under key
+        key: Name of the date field, e.g. 'createdate'
+        today: datetime.date to count to
+
+    Returns:
+        int: Number of days, like (today - format_date(record[key]).date()).days,
+            or None if the record has no such date
+    """
+    timestamp = record.get(f"{key}_ts")
+    if timestamp is None:
+        if record.get(key) is None:
+            return None
+        return (today - format_date(record[key]).date()).days
+    return today.toordinal() - EPOCH_ORDINAL - int(timestamp // SECONDS_PER_DAY)
+
+
+def card_engineer(card):
+    """Display name of a card's assignee, or None if the card is unassigned
+
+    Cards created without a team configured have no assignee at all, while
+    cards read back from JIRA have an assignee with a None display name.
+    """
+    assignee = card["assignee"] or {}
+    return assignee.get("displayName")
+
+
+@functools.lru_cache(maxsize=16384)
+def comment_epoch(timestamp):
+    """Convert a JIRA comment timestamp to seconds since the epoch
+
+    Args:
+        timestamp: Timestamp string such as '2024-03-25T23:37:07.158+0000'
+
+    Returns:
+        float: Seconds since the epoch
+    """
+    return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+
+
 def format_comment(comment):
     """Format a JIRA comment for HTML display with clickable links
 
@@ -0,0 +1,196 @@
+"""
+Tests for the t5gweb.database.analytics queries
+
+These tests run the SQL aggregates against an in-memory SQLite database.
+"""
+
+from datetime import date, datetime
+
+import pytest
+from t5gweb.database import (
+    Case,
+    JiraCard,
+    JiraComment,
+    case_counts,
+    comment_velocity,
+    time_to_close,
+)
+
+
+def add_case(session, case_number, created, updated, **fields):
+    """Add a case with the given creation and last update datetimes"""
+    values = {
+        "owner": "Test Owner",
+        "severity": 3,
+        "account": "Test Account",
+        "summary": "Test Summary",
+        "status": "Closed",
+        "description": "Test Description",
+        "product": "Test Product 1.0",
+        "product_version": "1.0",
+    }
+    values.update(fields)
+    session.add(
+        Case(
+            case_number=case_number,
+            created_date=created,
+            last_update=updated,
+            **values,
+        )
+    )
+
+
+def add_comments(session, card_id, author, dates):
+    """Add a JIRA card with one comment by author per date"""
+    created = datetime(2024, 1, 1)
+    add_case(session, card_id, created, created, status="Waiting on Red Hat")
+    session.add(
+        JiraCard(
+            jira_card_id=card_id,
+            case_number=card_id,
+            created_date=created,
+            summary="{}: Test Summary".format(card_id),
+        )
+    )
+    for index, comment_date in enumerate(dates):
+        session.add(
+            JiraComment(
+                jira_comment_id="{}-{}".format(card_id, index),
+                jira_card_id=card_id,
+                author=author,
+                body="Test comment body",
+                last_update_date=comment_date,
+            )
+        )
+
+
+class TestTimeToClose:
+    """Test the days to close per quarter and severity"""
+
+    def test_groups_by_closing_quarter_and_severity(self, test_db_session):
+        """Test aggregates per quarter the cases were closed in"""
+        add_case(test_db_session, "1", datetime(2024, 1, 1), datetime(2024, 1, 3))
+        add_case(test_db_session, "2", datetime(2024, 1, 1), datetime(2024, 1, 5))
+        add_case(
+            test_db_session,
+            "3",
+            datetime(2024, 1, 1),
+            datetime(2024, 1, 2, 12),
+            severity=1,
+        )
+        add_case(test_db_session, "4", datetime(2024, 3, 1), datetime(2024, 4, 1))
+        # open cases aren't counted
+        add_case(
+            test_db_session,
+            "5",
+            datetime(2024, 1, 1),
+            datetime(2024, 2, 1),
+            status="Waiting on Red Hat",
+        )
+        test_db_session.commit()
+
+        result = time_to_close(date(2024, 1, 1), date(2024, 6, 30))
+
+        assert result == [
+            {
+                "quarter": "2024-Q1",
+                "severity": 1,
+                "cases": 1,
+                "mean_days": 1.5,
+                "min_days": 1.5,
+                "max_days": 1.5,
+            },
+            {
+                "quarter": "2024-Q1",
+                "severity": 3,
+                "cases": 2,
+                "mean_days": 3.0,
+                "min_days": 2.0,
+                "max_days": 4.0,
+            },
+            {
+                "quarter": "2024-Q2",
+                "severity": 3,
+                "cases": 1,
+                "mean_days": 31.0,
+                "min_days": 31.0,
+                "max_days": 31.0,
+            },
+        ]
+
+    def test_filters_by_window_and_account(self, test_db_session):
+        """Test that cases outside the dates or of other accounts are skipped"""
+        add_case(test_db_session, "1", datetime(2024, 1, 1), datetime(2024, 1, 3))
+        add_case(test_db_session, "2", datetime(2024, 1, 1), datetime(2024, 5, 1))
+        add_case(
+            test_db_session,
+            "3",
+            datetime(2024, 1, 1),
+            datetime(2024, 1, 3),
+            account="Other Account",
+        )
+        test_db_session.commit()
+
+        result = time_to_close(date(2024, 1, 1), date(2024, 3, 31), "Test Account")
+
+        assert [(row["quarter"], row["cases"]) for row in result] == [("2024-Q1", 1)]
+
+    def test_rejects_reversed_window(self):
+        """Test that a start date after the end date raises ValueError"""
+        with pytest.raises(ValueError):
+            time_to_close(date(2024, 2, 1), date(2024, 1, 1))
+
+
+class TestCommentVelocity:
+    """Test the comments per engineer"""
+
+    def test_counts_comments_per_engineer(self, test_db_session):
+        """Test comment and card counts and the weekly rate"""
+        add_comments(test_db_session, "CARD-1", "alice", [datetime(2024, 1, 2)] * 3)
+        add_comments(test_db_session, "CARD-2", "alice", [datetime(2024, 1, 9)])
+        add_comments(test_db_session, "CARD-3", "bob", [datetime(2024, 1, 10)])
+        # outside the window
+        add_comments(test_db_session, "CARD-4", "bob", [datetime(2024, 2, 1)])
+        test_db_session.commit()
+
+        result = comment_velocity(date(2024, 1, 1), date(2024, 1, 14))
+
+        assert result == [
+            {"engineer": "alice", "comments": 4, "cards": 2, "per_week": 2.0},
+            {"engineer": "bob", "comments": 1, "cards": 1, "per_week": 0.5},
+        ]
+        assert comment_velocity(date(2024, 1, 1), date(2024, 1, 14), "bob") == [
+            result[1]
+        ]
+
+
+class TestCaseCounts:
+    """Test the cases per account and status"""
+
+    def test_counts_cases_per_account_and_status(self, test_db_session):
+        """Test counts of the cases created in the window"""
+        add_case(test_db_session, "1", datetime(2024, 1, 1), datetime(2024, 1, 3))
+        add_case(
+            test_db_session,
+            "2",
+            datetime(2024, 1, 2),
+            datetime(2024, 1, 3),
+            status="Waiting on Red Hat",
+        )
+        add_case(
+            test_db_session,
+            "3",
+            datetime(2024, 1, 3),
+            datetime(2024, 1, 3),
+            account="Other Account",
+        )
+        add_case(test_db_session, "4", datetime(2023, 12, 31), datetime(2024, 1, 3))
+        test_db_session.commit()
+
+        assert case_counts(date(2024, 1, 1), date(2024, 1, 31)) == {
+            "Other Account": {"Closed": 1},
+            "Test Account": {"Closed": 1, "Waiting on Red Hat": 1},
+        }
+        assert case_counts(date(2024, 1, 1), date(2024, 1, 31), "Other Account") == {
+            "Other Account": {"Closed": 1}
+        }
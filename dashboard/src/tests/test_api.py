@@ -0,0 +1,166 @@
+"""unit tests for api.py"""
+
+import json
+from datetime import datetime
+
+import pytest
+import redis
+from flask import Flask
+from t5gweb import api, libtelco5g
+from t5gweb.database import Case
+
+
+@pytest.fixture
+def client():
+    """Test client of an app serving the API blueprint without login"""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, LOGIN_DISABLED=True)
+    app.register_blueprint(api.BP)
+    return app.test_client()
+
+
+def add_case(session, case_number, created, account="Test Account"):
+    """Add a closed case created at the given datetime"""
+    session.add(
+        Case(
+            case_number=case_number,
+            account=account,
+            status="Closed",
+            severity=3,
+            created_date=created,
+            last_update=created,
+        )
+    )
+
+
+def test_analytics_returns_query_result(client, test_db_session):
+    """The query runs over the from/to range of the request"""
+    add_case(test_db_session, "1", datetime(2024, 1, 10))
+    add_case(test_db_session, "2", datetime(2024, 2, 10))
+    test_db_session.commit()
+
+    response = client.get("/api/analytics/case-counts?from=2024-01-01&to=2024-01-31")
+
+    assert response.status_code == 200
+    assert response.get_json() == {"Test Account": {"Closed": 1}}
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["from=2024-13-01", "to=yesterday", "from=2024-02-01&to=2024-01-01"],
+)
+def test_analytics_rejects_invalid_dates(client, query):
+    """Invalid or reversed dates are a 400 describing the problem"""
+    response = client.get("/api/analytics/time-to-close?{}".format(query))
+
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_analytics_case_counts_with_null_account(client, test_db_session):
+    """Cases without an account are counted under an empty account name"""
+    add_case(test_db_session, "1", datetime(2024, 1, 10))
+    add_case(test_db_session, "2", datetime(2024, 1, 11), account=None)
+    test_db_session.commit()
+
+    response = client.get("/api/analytics/case-counts?from=2024-01-01&to=2024-01-31")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "": {"Closed": 1},
+        "Test Account": {"Closed": 1},
+    }
+
+
+@pytest.fixture
+def cached_cards(mocker):
+    """Raw cards JSON at version 3 of the cards key"""
+    mocker.patch.object(api, "redis_version", return_value=3)
+    return mocker.patch.object(
+        api, "redis_get_raw", return_value=b'{"CARD-1": {"account": "Acme"}}'
+    )
+
+
+def test_show_cards_sends_raw_json(client, cached_cards):
+    """Without query parameters the stored JSON is sent as it is"""
+    response = client.get("/api/cards")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert response.data == b'{"CARD-1": {"account": "Acme"}}'
+    assert response.headers["ETag"] == '"cards-3"'
+    cached_cards.assert_called_once_with("cards")
+
+    response = client.get("/api/cards", headers={"If-None-Match": '"cards-3"'})
+
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("query", ["limit=0", "format=xml", "updated_since=today"])
+def test_show_cards_rejects_invalid_query_with_matching_etag(
+    client, cached_cards, query
+):
+    """An invalid request gets a 400 even if its ETag is current"""
+    response = client.get(
+        "/api/cards?{}".format(query), headers={"If-None-Match": '"cards-3"'}
+    )
+
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_show_cards_without_redis(client, mocker):
+    """An unreachable Redis gives an empty result, not an error"""
+    connection = mocker.patch.object(libtelco5g, "redis_connection")
+    connection.return_value.get.side_effect = redis.exceptions.ConnectionError
+
+    response = client.get("/api/cards")
+
+    assert response.status_code == 200
+    assert response.get_json() == {}
+    assert "ETag" not in response.headers
+
+
+def test_show_cards_streams_ndjson(client, mocker):
+    """Filtered records are streamed as one JSON object per line"""
+    mocker.patch.object(api, "redis_version", return_value=None)
+    records = {"CARD-1": {"account": "Acme"}, "CARD-2": {"account": "Acme"}}
+    query = mocker.patch.object(api, "query_records", return_value=(records, "CARD-3"))
+
+    response = client.get("/api/cards?account=Acme&limit=2&format=ndjson")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["X-Next-Cursor"] == "CARD-3"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"CARD-1": {"account": "Acme"}},
+        {"CARD-2": {"account": "Acme"}},
+    ]
+    query.assert_called_once_with("cards", {"account": "Acme"}, None, None, 2, None)
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_stream_records_in_chunks(mocker, ndjson):
+    """Records are serialized in chunks that join to the whole result"""
+    mocker.patch.object(api, "STREAM_CHUNK_SIZE", 100)
+    records = {
+        "{:08}".format(index): {"summary": "case {}".format(index)}
+        for index in range(50)
+    }
+
+    chunks = list(api._stream_records(records, ndjson))
+
+    assert len(chunks) > 1
+    body = "".join(chunks)
+    if ndjson:
+        lines = [json.loads(line) for line in body.splitlines()]
+        assert lines == [{key: value} for (key, value) in records.items()]
+    else:
+        assert json.loads(body) == records
+
+
+def test_stream_records_without_records():
+    """No records stream as an empty object"""
+    assert "".join(api._stream_records({})) == "{}"
+    assert "".join(api._stream_records({}, ndjson=True)) == ""
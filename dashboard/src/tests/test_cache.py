@@ -0,0 +1,524 @@
+"""unit tests for cache.py"""
+
+import datetime
+import json
+import threading
+import time
+import xmlrpc
+from unittest.mock import Mock
+
+import pytest
+import requests
+from jira.exceptions import JIRAError
+from t5gweb import cache, libtelco5g, taskmgr
+
+JQL = 'project=1 AND labels = "field"'
+
+
+@pytest.fixture
+def redis_store(mocker):
+    """Dictionary standing in for the Redis keys read and written by cache.py"""
+    store = {}
+    mocker.patch.object(
+        libtelco5g, "redis_get", side_effect=lambda key: store.get(key, {})
+    )
+    mocker.patch.object(
+        libtelco5g,
+        "redis_set",
+        side_effect=lambda key, value: store.__setitem__(key, json.loads(value)),
+    )
+    mocker.patch.object(
+        libtelco5g,
+        "redis_set_dataset",
+        side_effect=lambda key, value: store.__setitem__(key, value),
+    )
+    return store
+
+
+def portal_case(problem="Test Problem", status="Waiting on Red Hat"):
+    """Cached portal case with the fields cards are built from"""
+    return {
+        "account": "Test Account",
+        "problem": problem,
+        "description": "Test Description",
+        "severity": "3 (Normal)",
+        "product": "Test Product",
+        "status": status,
+        "createdate": "2024-01-01T00:00:00Z",
+        "last_update": "2024-01-02T00:00:00Z",
+    }
+
+
+def jira_issue(key, case_number, status="In Progress"):
+    """Mock JIRA card tracking case_number"""
+    issue = Mock()
+    issue.key = key
+    issue.fields.summary = "{}: Test Summary".format(case_number)
+    issue.fields.status.name = status
+    issue.fields.created = "2024-01-01T00:00:00.000+0000"
+    issue.fields.comment.comments = []
+    issue.fields.assignee = None
+    issue.fields.customfield_12315950 = None
+    issue.fields.labels = []
+    issue.fields.priority.name = "Major"
+    issue.fields.customfield_10007 = None
+    return issue
+
+
+class FakeJira:
+    """Answers the JQL searches of get_cards() from a list of cards"""
+
+    def __init__(self, issues):
+        self.issues = issues
+        self.updated = set()
+        self.searches = []
+
+    def search(self, jira_conn, query, cfg, max_results, fields=None, **kwargs):
+        self.searches.append((query, fields))
+        if query == JQL:
+            return list(self.issues)
+        if query.startswith(JQL + " AND updated >="):
+            return [issue for issue in self.issues if issue.key in self.updated]
+        keys = query[len("key in (") : -1].split(",")
+        return [issue for issue in self.issues if issue.key in keys]
+
+
+@pytest.fixture
+def card_cfg():
+    """Configuration read by get_cards()"""
+    return {
+        "max_jira_results": 1000,
+        "card_full_sync_hours": 24,
+        "jira_escalations_project": "ESCALATION",
+        "postgres_batch_size": 500,
+    }
+
+
+@pytest.fixture
+def fake_jira(mocker, redis_store):
+    """Cards of two cached cases, searched through FakeJira"""
+    redis_store.update(
+        cases={"01234567": portal_case(), "01234568": portal_case()},
+        bugs={},
+        issues={},
+        escalations=[],
+        details={},
+    )
+    jira = FakeJira(
+        [jira_issue("CARD-1", "01234567"), jira_issue("CARD-2", "01234568")]
+    )
+    mocker.patch.object(libtelco5g, "jira_connection")
+    mocker.patch.object(cache, "_get_jira_cards_query", return_value=JQL)
+    mocker.patch.object(
+        cache, "_execute_jira_query_with_retry", side_effect=jira.search
+    )
+    jira.queued = mocker.patch.object(cache, "_queue_cards_postgres")
+    return jira
+
+
+def bz_bug(bug_id):
+    """Mock Bugzilla bug with the given numeric ID"""
+    return Mock(id=int(bug_id), summary="bug {}".format(bug_id))
+
+
+def test_fetch_bz_bugs_skips_bugs_missing_from_chunk():
+    """A bug left out of a chunk doesn't shift the later bugs"""
+    bz_api = Mock()
+    bz_api.getbugs.side_effect = lambda ids, include_fields: [
+        bz_bug(bug_id) for bug_id in ids if bug_id != "2"
+    ]
+
+    bz_bugs = cache.fetch_bz_bugs(bz_api, ["1", "2", "3", "4"], {"bz_chunk_size": 3})
+
+    assert {bug_id: bug.summary for bug_id, bug in bz_bugs.items()} == {
+        "1": "bug 1",
+        "3": "bug 3",
+        "4": "bug 4",
+    }
+    assert bz_api.getbugs.call_count == 2
+
+
+def test_fetch_bz_bugs_fetches_failed_chunk_one_by_one():
+    """A faulting chunk only loses the bugs that can't be fetched alone"""
+    bz_api = Mock()
+    bz_api.getbugs.side_effect = xmlrpc.client.Fault(102, "restricted")
+
+    def getbug(bug_id, include_fields):
+        if bug_id == "2":
+            raise xmlrpc.client.Fault(102, "restricted")
+        return bz_bug(bug_id)
+
+    bz_api.getbug.side_effect = getbug
+
+    bz_bugs = cache.fetch_bz_bugs(bz_api, ["1", "2", "3"], {"bz_chunk_size": 3})
+
+    assert sorted(bz_bugs) == ["1", "3"]
+    assert bz_bugs["3"].summary == "bug 3"
+
+
+def test_get_bz_details_refreshes_stats_snapshot(mocker, redis_store):
+    """The snapshot's bug counts follow the newly cached bugs"""
+    redis_store["case_bz"] = {"0001": [{"bugzillaNumber": "1"}]}
+    bug = bz_bug("1")
+    bug.configure_mock(
+        target_release=["4.16"],
+        assigned_to="dev@example.com",
+        last_change_time=xmlrpc.client.DateTime("20240101T10:00:00"),
+        internal_whiteboard="",
+        qa_contact="qa@example.com",
+        severity="high",
+    )
+    mocker.patch.object(cache.bugzilla, "Bugzilla")
+    mocker.patch.object(cache, "fetch_bz_bugs", return_value={"1": bug})
+    refresh = mocker.patch.object(libtelco5g, "refresh_stats_snapshot")
+
+    cache.get_bz_details({"bz_key": "key", "bz_chunk_size": 100})
+
+    assert redis_store["bugs"]["0001"][0]["target_release"] == ["4.16"]
+    refresh.assert_called_once_with()
+
+
+def test_get_linked_jira_fields_falls_back_per_key(mocker):
+    """A failing search only loses the keys that can't be fetched alone"""
+    mocker.patch.object(cache, "JIRA_PAGE_SIZE", 2)
+    mocker.patch.object(cache, "_extract_jira_fields", side_effect=lambda bug: bug.key)
+
+    def search(jira_conn, query, cfg, max_results, **kwargs):
+        if "BAD-1" in query:
+            raise JIRAError(status_code=400, text="An issue does not exist")
+        return [Mock(key=key) for key in query[len("key in (") : -1].split(",")]
+
+    def issue(key, fields):
+        if key == "BAD-1":
+            raise JIRAError(status_code=404)
+        return Mock(key=key)
+
+    mocker.patch.object(cache, "_execute_jira_query_with_retry", side_effect=search)
+    jira_conn = Mock()
+    jira_conn.issue.side_effect = issue
+
+    jira_fields = cache._get_linked_jira_fields(
+        {}, jira_conn, ["OK-1", "BAD-1", "OK-2"]
+    )
+
+    assert jira_fields == {"OK-1": "OK-1", "OK-2": "OK-2"}
+    assert [c.args[0] for c in jira_conn.issue.call_args_list] == ["OK-1", "BAD-1"]
+
+
+@pytest.mark.parametrize(
+    "cached_cards, sync_state",
+    [
+        (False, {"last_sync": time.time() - 60, "last_full_sync": time.time()}),
+        (True, {}),
+        (True, {"last_sync": time.time() - 60, "last_full_sync": 0}),
+    ],
+    ids=["empty cache", "no last_sync", "full sync hours elapsed"],
+)
+def test_get_cards_incremental_falls_back_to_full_sync(
+    fake_jira, redis_store, card_cfg, cached_cards, sync_state
+):
+    """A full refresh is done when there is no recent refresh to build on"""
+    if cached_cards:
+        redis_store["cards"] = {"CARD-1": {}}
+    redis_store["cards_sync"] = sync_state
+
+    result = cache.get_cards(card_cfg, incremental=True)
+
+    assert result == {"cards cached": 2}
+    assert fake_jira.searches == [(JQL, cache.CARD_FIELDS)]
+    sync = redis_store["cards_sync"]
+    assert sync["last_full_sync"] == sync["last_sync"] > time.time() - 60
+
+
+def test_get_cards_incremental_merges_changed_cards(fake_jira, redis_store, card_cfg):
+    """Changed cards are fetched and merged with the cached ones"""
+    cache.get_cards(card_cfg)
+    full_sync = redis_store["cards_sync"]["last_full_sync"]
+    fake_jira.issues[0].fields.status.name = "Done"
+    fake_jira.issues.append(jira_issue("CARD-3", "01234567"))
+    fake_jira.updated = {"CARD-1"}
+    fake_jira.searches = []
+
+    result = cache.get_cards(card_cfg, incremental=True)
+
+    assert result == {"cards cached": 3}
+    # the keys matching the query, the updated cards, then the uncached card
+    assert [fields for (_, fields) in fake_jira.searches] == [
+        ["key"],
+        cache.CARD_FIELDS,
+        cache.CARD_FIELDS,
+    ]
+    assert fake_jira.searches[-1][0] == "key in (CARD-3)"
+    cards = redis_store["cards"]
+    assert list(cards) == ["CARD-1", "CARD-2", "CARD-3"]
+    assert cards["CARD-1"]["card_status"] == "Done"
+    assert cards["CARD-2"]["card_status"] == "Eng Working"
+    # only the fetched cards are written to PostgreSQL
+    fetched = fake_jira.queued.call_args.args[1]
+    assert sorted(card.key for card in fetched) == ["CARD-1", "CARD-3"]
+    assert redis_store["cards_sync"]["last_full_sync"] == full_sync
+
+
+def test_get_cards_incremental_drops_cards_left_the_query(
+    fake_jira, redis_store, card_cfg
+):
+    """Cached cards that no longer match the query are dropped"""
+    cache.get_cards(card_cfg)
+    del fake_jira.issues[0]
+
+    result = cache.get_cards(card_cfg, incremental=True)
+
+    assert result == {"cards cached": 1}
+    assert list(redis_store["cards"]) == ["CARD-2"]
+    assert fake_jira.queued.call_args.args[1] == []
+
+
+def test_get_cards_incremental_rebuilds_cards_from_changed_cases(
+    fake_jira, redis_store, card_cfg
+):
+    """Unchanged cards pick up the current data of their case"""
+    cache.get_cards(card_cfg)
+    redis_store["cases"]["01234567"] = portal_case(
+        problem="Updated Problem", status="Waiting on Customer"
+    )
+
+    cache.get_cards(card_cfg, incremental=True)
+
+    card = redis_store["cards"]["CARD-1"]
+    assert card["summary"] == "Updated Problem"
+    assert card["case_status"] == "Waiting on Customer"
+    assert card["card_status"] == "Eng Working"
+    assert redis_store["cards"]["CARD-2"]["summary"] == "Test Problem"
+    assert fake_jira.queued.call_args.args[1] == []
+
+
+@pytest.fixture
+def portal(mocker, redis_store):
+    """Mock portal search returning the cases in portal.cases per query"""
+    portal = Mock(cases={})
+    mocker.patch.object(libtelco5g, "get_token", return_value="token")
+    portal.search = mocker.patch.object(
+        cache,
+        "_search_portal_cases",
+        side_effect=lambda cfg, token, query, num_cases: dict(portal.cases),
+    )
+    portal.upsert = mocker.patch.object(cache, "upsert_cases_postgres")
+    return portal
+
+
+@pytest.fixture
+def case_cfg():
+    """Configuration read by get_cases()"""
+    return {
+        "offline_token": "offline",
+        "max_portal_results": 100,
+        "query": "case_status:Open",
+        "case_full_sync_hours": 24,
+        "postgres_batch_size": 500,
+    }
+
+
+def test_get_cases_incremental_merges_changed_cases(portal, redis_store, case_cfg):
+    """Changed cases replace their cached copy, the others are kept"""
+    last_full_sync = time.time() - 3600
+    redis_store["cases"] = {
+        "01234567": portal_case(),
+        "01234568": portal_case(),
+    }
+    redis_store["cases_sync"] = {
+        "case_status:Open": {
+            "last_sync": time.time() - 600,
+            "last_full_sync": last_full_sync,
+        }
+    }
+    portal.cases = {
+        "01234568": portal_case(problem="Updated Problem"),
+        "01234569": portal_case(),
+    }
+
+    cache.get_cases(case_cfg, incremental=True)
+
+    query = portal.search.call_args.args[2]
+    assert query.startswith("(case_status:Open) AND case_lastModifiedDate:[")
+    assert redis_store["cases"] == {
+        "01234567": portal_case(),
+        "01234568": portal_case(problem="Updated Problem"),
+        "01234569": portal_case(),
+    }
+    # only the changed cases are written to PostgreSQL
+    assert portal.upsert.call_args.args[0] == portal.cases
+    sync = redis_store["cases_sync"]["case_status:Open"]
+    assert sync["last_full_sync"] == last_full_sync
+    assert sync["last_sync"] > last_full_sync
+
+
+def test_get_cases_full_sync_after_case_full_sync_hours(portal, redis_store, case_cfg):
+    """A full pull replaces the cached cases once the last one is too old"""
+    redis_store["cases"] = {"01234567": portal_case()}
+    redis_store["cases_sync"] = {
+        "case_status:Open": {
+            "last_sync": time.time() - 600,
+            "last_full_sync": time.time() - 25 * 3600,
+        }
+    }
+    portal.cases = {"01234568": portal_case()}
+
+    cache.get_cases(case_cfg, incremental=True)
+
+    portal.search.assert_called_once()
+    assert portal.search.call_args.args[2] == "(case_status:Open)"
+    assert redis_store["cases"] == {"01234568": portal_case()}
+    sync = redis_store["cases_sync"]["case_status:Open"]
+    assert sync["last_full_sync"] == sync["last_sync"]
+
+
+def test_process_cards_keeps_order_and_isolates_failures(card_cfg):
+    """Each card is built in place, a failing card only loses itself"""
+    cases = {"0123456{}".format(index): portal_case() for index in range(10)}
+    cached_data = (cases, {}, {}, [], {})
+    card_list = [
+        jira_issue("CARD-{}".format(index), "0123456{}".format(index % 10))
+        for index in range(30)
+    ]
+    # unknown JIRA status, raises while the card is built
+    card_list[7].fields.status.name = "Unknown"
+    time_now = datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc)
+
+    cards = cache._process_cards(card_list, cached_data, time_now, card_cfg)
+
+    assert cards[7] is None
+    assert [card["case_number"] for card in cards[:7] + cards[8:]] == [
+        "0123456{}".format(index % 10) for index in range(30) if index != 7
+    ]
+
+
+def portal_response(status_code, body=None):
+    """Portal API response with a JSON body"""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body or {}).encode()
+    return response
+
+
+class FakePortalSession:
+    """Shared requests session answering case detail requests with handler"""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def get(self, url, headers):
+        return self.handler(url.rsplit("/", 1)[-1], headers["Authorization"])
+
+
+@pytest.fixture
+def detail_cases(redis_store, mocker):
+    """Four open cases, one of them with a bug, and a closed case"""
+    redis_store["cases"] = {
+        "01234561": dict(portal_case(), bug="1234"),
+        "01234562": portal_case(),
+        "01234563": portal_case(),
+        "01234564": portal_case(),
+        "01234565": portal_case(status="Closed"),
+    }
+    return {
+        "offline_token": "offline",
+        "redhat_api": "https://api",
+        "portal_workers": 4,
+    }
+
+
+def test_get_case_details_refreshes_expired_token_once(
+    mocker, redis_store, detail_cases
+):
+    """Concurrent requests getting a 401 share a single token refresh"""
+    get_token = mocker.patch.object(
+        libtelco5g, "get_token", side_effect=["expired", "fresh", "unused"]
+    )
+    # every worker holds the expired token before any of them refreshes it
+    barrier = threading.Barrier(4)
+
+    def handler(case, authorization):
+        if authorization == "Bearer expired":
+            barrier.wait(timeout=5)
+            return portal_response(401)
+        return portal_response(200, {"critSit": True, "bugzillas": [case]})
+
+    mocker.patch.object(
+        cache, "_portal_session", return_value=FakePortalSession(handler)
+    )
+
+    cache.get_case_details(detail_cases)
+
+    assert get_token.call_count == 2
+    details = redis_store["details"]
+    assert sorted(details) == ["01234561", "01234562", "01234563", "01234564"]
+    assert all(detail["crit_sit"] for detail in details.values())
+    assert redis_store["case_bz"] == {"01234561": ["01234561"]}
+
+
+def test_get_case_details_skips_failed_requests(mocker, redis_store, detail_cases):
+    """A failing case detail request doesn't affect the other cases"""
+    mocker.patch.object(libtelco5g, "get_token", return_value="token")
+
+    def handler(case, authorization):
+        if case == "01234562":
+            raise requests.exceptions.ConnectionError("connection reset")
+        if case == "01234563":
+            return portal_response(500, {"error": "internal"})
+        return portal_response(200, {"groupName": case, "bugzillas": []})
+
+    mocker.patch.object(
+        cache, "_portal_session", return_value=FakePortalSession(handler)
+    )
+
+    cache.get_case_details(detail_cases)
+
+    details = redis_store["details"]
+    assert sorted(details) == ["01234561", "01234564"]
+    assert details["01234564"]["group_name"] == "01234564"
+    assert redis_store["case_bz"] == {"01234561": []}
+
+
+def test_queue_cards_postgres_releases_batch_that_fails_to_queue(mocker, card_cfg):
+    """A batch whose enqueue fails isn't left pending in the card writer state"""
+    queued = mocker.patch.object(libtelco5g, "card_writer_queued")
+    done = mocker.patch.object(libtelco5g, "card_writer_done")
+    delay = mocker.patch.object(
+        taskmgr.persist_cards,
+        "delay",
+        side_effect=[ConnectionError("broker unavailable"), None],
+    )
+    cases = {"01234567": portal_case(), "01234568": portal_case()}
+    card_list = [jira_issue("CARD-1", "01234567"), jira_issue("CARD-2", "01234568")]
+    built_cards = {
+        "CARD-1": {"case_number": "01234567"},
+        "CARD-2": {"case_number": "01234568"},
+    }
+
+    cache._queue_cards_postgres(
+        cases, card_list, built_cards, dict(card_cfg, postgres_batch_size=1)
+    )
+
+    assert delay.call_count == 2
+    failed_batch = queued.call_args_list[0].args[0]
+    done.assert_called_once_with(failed_batch, failed=True)
+    assert queued.call_args_list[1].args[0] == delay.call_args.args[0]
+
+
+def test_add_missing_indexes_releases_connections(mocker):
+    """The worker starts and closes its connections when indexing fails"""
+    ensure = mocker.patch.object(
+        taskmgr, "ensure_indexes", side_effect=RuntimeError("database down")
+    )
+    db_config = mocker.patch.object(taskmgr, "db_config")
+
+    taskmgr.add_missing_indexes()
+
+    ensure.assert_called_once_with(db_config.engine)
+    db_config.dispose.assert_called_once_with()
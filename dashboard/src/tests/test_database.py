@@ -6,18 +6,26 @@ to test database operations, model relationships, and data integrity.
 """
 
 import re
+import sqlite3
 from datetime import datetime, timezone
 from unittest.mock import Mock, patch
 
 import pytest
 from dateutil import parser
+from sqlalchemy import exc, inspect, select, text
+from sqlalchemy.schema import CreateIndex
 from t5gweb.database import (
     Case,
     JiraCard,
     JiraComment,
+    ensure_indexes,
+    jira_card_record,
     load_cases_postgres,
     load_jira_card_postgres,
+    load_jira_cards_postgres,
+    upsert_cases_postgres,
 )
+from t5gweb.database.session import DatabaseConfig, _TimedQueuePool, pool_stats
 
 
 @pytest.fixture
@@ -337,6 +345,179 @@ class TestDatabaseOperations:
         assert len(comments) == 2
 
 
+class TestBulkUpsert:
+    """Test the bulk upsert path for cases"""
+
+    def test_upsert_cases_inserts_all_cases(self, test_db_session, fake_data):
+        """Test that upserting in small batches stores every case"""
+        cases_data = prepare_fake_data_with_missing_fields(fake_data["cases"])
+
+        counts = upsert_cases_postgres(cases_data, batch_size=7)
+
+        assert counts == {"inserted": len(cases_data), "updated": 0, "unchanged": 0}
+        assert test_db_session.query(Case).count() == len(cases_data)
+
+    def test_upsert_cases_matches_load_cases(self, test_db_session):
+        """Test that both loading paths store the same column values"""
+        upsert_cases_postgres(create_test_case_data("11111111"))
+        load_cases_postgres(create_test_case_data("22222222"))
+
+        upserted, loaded = (
+            test_db_session.query(Case).filter_by(case_number=number).one()
+            for number in ("11111111", "22222222")
+        )
+        for column in ("owner", "severity", "account", "summary", "status"):
+            assert getattr(upserted, column) == getattr(loaded, column)
+        assert upserted.created_date == loaded.created_date
+        assert upserted.last_update == loaded.last_update
+
+    def test_upsert_cases_counts_updates_and_unchanged(self, test_db_session):
+        """Test that a second upsert only writes the cases that changed"""
+        cases_data = {
+            **create_test_case_data("11111111"),
+            **create_test_case_data("22222222"),
+        }
+        upsert_cases_postgres(cases_data)
+
+        cases_data["22222222"] = dict(
+            cases_data["22222222"],
+            status="Closed",
+            last_update="2024-01-02T12:00:00Z",
+        )
+        counts = upsert_cases_postgres(cases_data, batch_size=1)
+
+        assert counts == {"inserted": 0, "updated": 1, "unchanged": 1}
+        assert test_db_session.query(Case).count() == 2
+        case = test_db_session.query(Case).filter_by(case_number="22222222").one()
+        assert case.status == "Closed"
+        assert case.last_update == datetime(2024, 1, 2, 12, 0)
+
+    def test_upsert_cases_on_existing_rows(self, test_db_session):
+        """Test that upserting cases stored by load_cases_postgres updates them"""
+        cases_data = create_test_case_data()
+        load_cases_postgres(cases_data)
+
+        cases_data["12345678"] = dict(cases_data["12345678"], owner="New Owner")
+        counts = upsert_cases_postgres(cases_data)
+
+        assert counts == {"inserted": 0, "updated": 1, "unchanged": 0}
+        case = test_db_session.query(Case).filter_by(case_number="12345678").one()
+        assert case.owner == "New Owner"
+
+
+class TestBatchedCardLoading:
+    """Test the batched JIRA card loading path"""
+
+    def card_records(self, mock_jira_issue):
+        """Build the card record for mock_jira_issue"""
+        with patch(
+            "t5gweb.database.operations.format_comment", side_effect=lambda x: x.body
+        ):
+            return [jira_card_record("12345678", mock_jira_issue)]
+
+    def test_load_jira_cards_creates_cards_and_comments(
+        self, test_db_session, mock_jira_issue
+    ):
+        """Test that a batch load stores the same card as load_jira_card_postgres"""
+        case_data = create_test_case_data()
+        load_cases_postgres(case_data)
+
+        counts = load_jira_cards_postgres(case_data, self.card_records(mock_jira_issue))
+
+        assert counts["inserted"] == 1
+        assert counts["comments"] == 2
+        jira_card = test_db_session.query(JiraCard).filter_by(jira_card_id="TEST-123")
+        assert jira_card.one().priority == "High"
+        assert jira_card.one().severity == 3
+        comments = test_db_session.query(JiraComment).filter_by(jira_card_id="TEST-123")
+        assert sorted(comment.body for comment in comments) == [
+            "Test comment 1",
+            "Test comment 2",
+        ]
+
+    def test_load_jira_cards_skips_unchanged(self, test_db_session, mock_jira_issue):
+        """Test that reloading the same cards writes nothing"""
+        case_data = create_test_case_data()
+        load_cases_postgres(case_data)
+        load_jira_cards_postgres(case_data, self.card_records(mock_jira_issue))
+
+        counts = load_jira_cards_postgres(case_data, self.card_records(mock_jira_issue))
+
+        assert counts["unchanged"] == 1
+        assert counts["comments"] == 0
+
+    def test_load_jira_cards_updates_changes(self, test_db_session, mock_jira_issue):
+        """Test that changed cards and edited comments are written again"""
+        case_data = create_test_case_data()
+        load_cases_postgres(case_data)
+        load_jira_cards_postgres(case_data, self.card_records(mock_jira_issue))
+
+        mock_jira_issue.fields.status.name = "Done"
+        edited = mock_jira_issue.fields.comment.comments[1]
+        edited.body = "Edited comment"
+        edited.updated = "2024-01-02T02:00:00.000+0000"
+        counts = load_jira_cards_postgres(case_data, self.card_records(mock_jira_issue))
+
+        assert counts["updated"] == 1
+        assert counts["comments"] == 1
+        test_db_session.expire_all()
+        assert test_db_session.get(JiraCard, "TEST-123").status == "Done"
+        assert test_db_session.get(JiraComment, "comment-2").body == "Edited comment"
+
+    def test_load_jira_cards_skips_cards_without_case(
+        self, test_db_session, mock_jira_issue
+    ):
+        """Test that cards whose case isn't stored are skipped"""
+        case_data = create_test_case_data()
+
+        counts = load_jira_cards_postgres(case_data, self.card_records(mock_jira_issue))
+
+        assert counts["skipped"] == 1
+        assert test_db_session.query(JiraCard).count() == 0
+        assert test_db_session.query(JiraComment).count() == 0
+
+    def test_load_jira_cards_with_many_comments(self, test_db_session):
+        """Test that comment upserts are split below the bind parameter limit"""
+        # the limit SQLite is built with by default, some builds allow more
+        test_db_session.connection().connection.driver_connection.setlimit(
+            sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766
+        )
+        case_data = create_test_case_data()
+        load_cases_postgres(case_data)
+        comments = [
+            {
+                "jira_comment_id": "comment-{}".format(index),
+                "author": "author1",
+                "body": "Test comment {}".format(index),
+                "last_update_date": "2024-01-01T01:00:00.000+0000",
+            }
+            for index in range(10000)
+        ]
+        cards = [
+            {
+                "jira_card_id": "TEST-{}".format(card),
+                "case_number": "12345678",
+                "summary": "TEST-{}: Test Summary".format(card),
+                "priority": "High",
+                "status": "In Progress",
+                "assignee": "testuser",
+                "sprint": None,
+                "comments": comments[card * 5000 : (card + 1) * 5000],
+            }
+            for card in range(2)
+        ]
+
+        counts = load_jira_cards_postgres(case_data, cards)
+
+        # 10000 comments of 5 columns are more parameters than SQLite accepts
+        assert counts["comments"] == 10000
+        assert test_db_session.query(JiraComment).count() == 10000
+        assert (
+            test_db_session.query(JiraComment).filter_by(jira_card_id="TEST-1").count()
+            == 5000
+        )
+
+
 class TestDataIntegrity:
     """Test data integrity and edge cases"""
 
@@ -554,5 +735,163 @@ class TestPerformanceAndScaling:
         assert card.case.case_number == "12345678"
 
 
+def query_plan(session, stmt):
+    """Return the details of SQLite's EXPLAIN QUERY PLAN for a statement"""
+    compiled = stmt.compile(
+        dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    rows = session.execute(text("EXPLAIN QUERY PLAN {}".format(compiled)))
+    return [row[-1] for row in rows]
+
+
+class TestIndexes:
+    """Test that the hot lookups are served by indexes"""
+
+    @pytest.mark.parametrize(
+        "stmt",
+        [
+            select(JiraCard).where(JiraCard.jira_card_id == "TEST-123"),
+            select(JiraComment).where(JiraComment.jira_comment_id == "comment-1"),
+            select(JiraComment).where(JiraComment.jira_card_id == "TEST-123"),
+            select(JiraComment).where(
+                JiraComment.jira_card_id.in_(["TEST-123", "TEST-456"])
+            ),
+            select(Case).where(
+                Case.case_number == "12345678",
+                Case.created_date == "2024-01-01 00:00:00.000000",
+            ),
+            select(Case).where(Case.case_number.in_(["12345678", "87654321"])),
+            select(Case).where(Case.account == "Test Account"),
+            select(Case).where(Case.account == "Test Account", Case.status == "Closed"),
+            select(Case).where(Case.status == "Closed"),
+            select(JiraCard).where(
+                JiraCard.case_number == "12345678",
+                JiraCard.created_date == "2024-01-01 00:00:00.000000",
+            ),
+        ],
+        ids=[
+            "card_by_id",
+            "comment_by_id",
+            "comments_by_card",
+            "comments_by_cards",
+            "case_by_key",
+            "cases_by_number",
+            "cases_by_account",
+            "cases_by_account_status",
+            "cases_by_status",
+            "cards_by_case",
+        ],
+    )
+    def test_lookup_does_not_scan(self, test_db_session, stmt):
+        """Test that the query plan has no full table or index scan"""
+        plan = query_plan(test_db_session, stmt)
+
+        assert not [step for step in plan if step.startswith("SCAN")], plan
+
+    def test_ensure_indexes_adds_missing_indexes(self, test_db_engine):
+        """Test that indexes missing from an existing database are created"""
+        with test_db_engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_jira_comments_jira_card_id"))
+            connection.execute(text("DROP INDEX ix_cases_status_last_update"))
+
+        created = ensure_indexes(test_db_engine)
+
+        assert created == [
+            "ix_cases_status_last_update",
+            "ix_jira_comments_jira_card_id",
+        ]
+        indexes = inspect(test_db_engine).get_indexes("jira_comments")
+        assert "ix_jira_comments_jira_card_id" in [index["name"] for index in indexes]
+        assert ensure_indexes(test_db_engine) == []
+
+    def test_ensure_indexes_skips_failing_index(self, test_db_engine):
+        """Test that an index failing to build doesn't stop the others"""
+        with test_db_engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_jira_comments_jira_card_id"))
+            connection.execute(text("DROP INDEX ix_cases_status_last_update"))
+
+        def broken_cases_index(index, **kwargs):
+            if index.name == "ix_cases_status_last_update":
+                return text("CREATE INDEX broken ON missing_table (id)")
+            return CreateIndex(index, **kwargs)
+
+        with patch(
+            "t5gweb.database.session.CreateIndex", side_effect=broken_cases_index
+        ):
+            created = ensure_indexes(test_db_engine)
+
+        assert created == ["ix_jira_comments_jira_card_id"]
+        assert ensure_indexes(test_db_engine) == ["ix_cases_status_last_update"]
+
+
+class TestDatabaseConfig:
+    """Test the per-process engine and sessionmaker of DatabaseConfig"""
+
+    def test_session_local_reuses_engine_and_sessionmaker(self, test_db_engine):
+        """Test that sessions of one process share one engine and sessionmaker"""
+        config = DatabaseConfig()
+        with patch(
+            "t5gweb.database.session.create_engine", return_value=test_db_engine
+        ) as create_engine:
+            config.SessionLocal().close()
+            session_local = config._session_local
+            config.SessionLocal().close()
+
+        create_engine.assert_called_once()
+        assert config._session_local is session_local
+
+    def test_engine_uses_pool_settings(self):
+        """Test that the pool and statement timeout come from the configuration"""
+        config = DatabaseConfig()
+        with patch.dict(
+            "os.environ",
+            {"postgres_pool_size": "3", "postgres_statement_timeout": "5000"},
+        ), patch("t5gweb.database.session.create_engine") as create_engine:
+            config.engine
+
+        kwargs = create_engine.call_args.kwargs
+        assert kwargs["poolclass"] is _TimedQueuePool
+        assert kwargs["pool_size"] == 3
+        assert kwargs["max_overflow"] == 10
+        assert kwargs["pool_timeout"] == 30
+        assert kwargs["connect_args"]["options"] == "-c statement_timeout=5000"
+
+    def test_engine_is_recreated_after_fork(self):
+        """Test that a child process doesn't reuse its parent's engine"""
+        config = DatabaseConfig()
+        with patch("t5gweb.database.session.create_engine") as create_engine:
+            create_engine.side_effect = [Mock(), Mock()]
+            parent_engine = config.engine
+            config._session_local = Mock()
+            assert config.engine is parent_engine
+            with patch("os.getpid", return_value=config._pid + 1):
+                child_engine = config.engine
+
+        assert child_engine is not parent_engine
+        assert config._session_local is None
+        parent_engine.dispose.assert_called_once_with(close=False)
+
+    def test_pool_stats_count_checkouts_and_timeouts(self):
+        """Test the checkout and wait metrics of the pool"""
+        pool = _TimedQueuePool(
+            lambda: sqlite3.connect(":memory:", check_same_thread=False),
+            pool_size=1,
+            max_overflow=0,
+            timeout=0.01,
+        )
+        connection = pool.connect()
+        with pytest.raises(exc.TimeoutError):
+            pool.connect()
+
+        stats = pool_stats(pool)
+        assert stats["checked_out"] == 1
+        assert stats["checkouts"] == 1
+        assert stats["timeouts"] == 1
+        assert stats["wait_seconds"] >= 0
+
+        connection.close()
+        assert pool_stats(pool)["checked_out"] == 0
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -1,11 +1,20 @@
+import datetime
+import json
+import time
+
 import pytest
+from t5gweb import libtelco5g
 from t5gweb.libtelco5g import (
     get_case_number,
     is_bug_missing_target,
     jira_connection,
+    redis_connection,
     redis_get,
+    redis_get_records,
     redis_set,
+    redis_set_records,
 )
+from t5gweb.utils import to_epoch
 
 
 def test_get_jira_connection(mocker):
@@ -20,7 +29,7 @@ def test_get_jira_connection(mocker):
 
 @pytest.fixture
 def mock_redis(mocker):
-    return mocker.patch("t5gweb.libtelco5g.redis.Redis")
+    return mocker.patch("t5gweb.libtelco5g.redis_connection")
 
 
 def test_redis_set(mock_redis):
@@ -28,7 +37,7 @@ def test_redis_set(mock_redis):
     value = "test_value"
     redis_set(key, value)
 
-    mock_redis.assert_called_once_with(host="redis")
+    mock_redis.assert_called_once_with()
     mock_redis.return_value.mset.assert_called_once_with({key: value})
 
 
@@ -41,11 +50,646 @@ def test_redis_get(key, value, expected_result, mock_redis):
 
     result = redis_get(key)
 
-    mock_redis.assert_called_once_with(host="redis")
+    mock_redis.assert_called_once_with()
     mock_redis.return_value.get.assert_called_once_with(key)
     assert result == expected_result
 
 
+@pytest.fixture
+def empty_local_cache(mocker):
+    mocker.patch.dict(libtelco5g._local_cache, clear=True)
+
+
+def test_redis_set_bumps_version_of_locally_cached_key(mock_redis):
+    pipe = mock_redis.return_value.pipeline.return_value
+
+    redis_set("cards", '{"foo": "bar"}')
+
+    pipe.mset.assert_called_once_with({"cards": '{"foo": "bar"}'})
+    pipe.incr.assert_called_once_with("cards:version")
+    pipe.execute.assert_called_once()
+    mock_redis.return_value.mset.assert_not_called()
+
+
+@pytest.fixture
+def zlib_compression(mocker):
+    mocker.patch.object(libtelco5g, "_compression_codec", "zlib")
+
+
+def test_redis_set_compresses_large_keys(mock_redis, zlib_compression):
+    pipe = mock_redis.return_value.pipeline.return_value
+    value = json.dumps({"description": "x" * 1000})
+
+    redis_set("cases", value)
+
+    stored = pipe.mset.call_args.args[0]["cases"]
+    assert stored[:1] == b"\x01"
+    assert libtelco5g._decode(stored) == {"description": "x" * 1000}
+    key, field, stats = pipe.hset.call_args.args
+    assert (key, field) == ("compression_stats", "cases")
+    assert json.loads(stats) == {
+        "codec": "zlib",
+        "raw_bytes": len(value),
+        "stored_bytes": len(stored),
+    }
+
+
+def test_redis_set_leaves_small_keys_uncompressed(mock_redis, zlib_compression):
+    redis_set("timestamp", '"2024-01-01"')
+
+    mock_redis.return_value.mset.assert_called_once_with({"timestamp": '"2024-01-01"'})
+
+
+def test_decode_reads_uncompressed_values(zlib_compression):
+    assert libtelco5g._decode(b'{"foo": "bar"}') == {"foo": "bar"}
+
+
+def test_decompress_zstd_without_zstandard(mocker):
+    mocker.patch.object(libtelco5g, "zstandard", None)
+
+    with pytest.raises(RuntimeError, match="zstandard"):
+        libtelco5g._decompress(libtelco5g.COMPRESSION_HEADERS["zstd"] + b"data")
+
+
+def test_compression_stats(mock_redis):
+    mock_redis.return_value.hgetall.return_value = {
+        b"cards": json.dumps({"codec": "zlib", "raw_bytes": 400, "stored_bytes": 100})
+    }
+
+    assert libtelco5g.compression_stats() == {
+        "cards": {"codec": "zlib", "raw_bytes": 400, "stored_bytes": 100, "ratio": 0.25}
+    }
+
+
+@pytest.fixture
+def json_serializer(mocker):
+    mocker.patch.object(libtelco5g, "_serializer_name", "json")
+
+
+def test_serialize_round_trip(json_serializer, fake_data):
+    encoded = libtelco5g.serialize(fake_data["cards"])
+
+    assert json.loads(encoded) == fake_data["cards"]
+    assert libtelco5g.deserialize(encoded) == fake_data["cards"]
+    assert libtelco5g.deserialize(json.dumps(fake_data["cards"])) == fake_data["cards"]
+
+
+def test_deserialize_reads_msgpack(mocker, fake_data):
+    msgpack = pytest.importorskip("msgpack")
+    mocker.patch.object(libtelco5g, "_serializer_name", "msgpack")
+
+    encoded = libtelco5g.serialize(fake_data["cases"])
+
+    assert encoded[:1] == b"\x03"
+    assert encoded[1:] == msgpack.packb(fake_data["cases"])
+    assert libtelco5g.deserialize(encoded) == fake_data["cases"]
+
+
+def test_deserialize_msgpack_without_msgpack(mocker):
+    mocker.patch.object(libtelco5g, "msgpack", None)
+
+    with pytest.raises(RuntimeError, match="msgpack"):
+        libtelco5g.deserialize(libtelco5g.MSGPACK_HEADER + b"\x80")
+
+
+def test_deserialize_msgpack_with_non_str_keys(mocker):
+    pytest.importorskip("msgpack")
+    mocker.patch.object(libtelco5g, "_serializer_name", "msgpack")
+
+    encoded = libtelco5g.serialize({1: "one", "2": "two"})
+
+    assert libtelco5g.deserialize(encoded) == {1: "one", "2": "two"}
+
+
+@pytest.mark.performance
+def test_serializer_benchmark(json_serializer, fake_data, record_property):
+    pytest.importorskip("orjson")
+    cards = scale_fake_data(fake_data, 1000, 1000)["cards"]
+
+    def best_of(func):
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    stdlib = best_of(lambda: json.loads(json.dumps(cards).encode("utf-8")))
+    pluggable = best_of(lambda: libtelco5g.deserialize(libtelco5g.serialize(cards)))
+    record_property("stdlib_seconds", stdlib)
+    record_property("pluggable_seconds", pluggable)
+
+    assert libtelco5g.deserialize(libtelco5g.serialize(cards)) == cards
+
+
+def test_redis_get_reuses_local_copy_until_version_changes(
+    mock_redis, empty_local_cache
+):
+    r_cache = mock_redis.return_value
+    pipe = r_cache.pipeline.return_value
+    r_cache.get.return_value = b"1"
+    pipe.execute.return_value = [b"1", b'{"foo": "bar"}']
+
+    first = redis_get("cards")
+    second = redis_get("cards")
+
+    assert first == {"foo": "bar"}
+    assert second is first
+    assert pipe.execute.call_count == 1
+    r_cache.get.assert_called_with("cards:version")
+
+    r_cache.get.return_value = b"2"
+    pipe.execute.return_value = [b"2", b'{"foo": "baz"}']
+
+    assert redis_get("cards") == {"foo": "baz"}
+    assert pipe.execute.call_count == 2
+
+
+def test_redis_get_does_not_cache_unversioned_value(mock_redis, empty_local_cache):
+    r_cache = mock_redis.return_value
+    pipe = r_cache.pipeline.return_value
+    r_cache.get.return_value = None
+    pipe.execute.return_value = [None, b'{"foo": "bar"}']
+
+    assert redis_get("cases") == {"foo": "bar"}
+    assert redis_get("cases") == {"foo": "bar"}
+    assert pipe.execute.call_count == 2
+    assert "cases" not in libtelco5g._local_cache
+
+
+@pytest.fixture
+def sample_cards():
+    return {
+        "CARD-1": {
+            "account": "Acme",
+            "assignee": {"displayName": "Jane Doe"},
+            "case_status": "Waiting on Red Hat",
+            "severity": "High",
+        },
+        "CARD-2": {
+            "account": "Initech",
+            "assignee": {"displayName": None},
+            "case_status": "Closed",
+            "severity": "Low",
+        },
+    }
+
+
+def test_redis_set_records_builds_indexes(mock_redis, sample_cards):
+    r_cache = mock_redis.return_value
+    r_cache.smembers.return_value = {b"cards:index:account:Stale"}
+    pipe = r_cache.pipeline.return_value
+    sample_cards["CARD-3"] = {
+        "account": "Umbrella",
+        "assignee": None,
+        "case_status": "Waiting on Customer",
+        "severity": "Low",
+    }
+
+    redis_set_records("cards", sample_cards)
+
+    pipe.delete.assert_called_once_with(
+        "cards:records", "cards:indexes", b"cards:index:account:Stale"
+    )
+    mapping = pipe.hset.call_args.kwargs["mapping"]
+    assert json.loads(mapping["CARD-1"]) == sample_cards["CARD-1"]
+    sadd_calls = {c.args[0]: set(c.args[1:]) for c in pipe.sadd.call_args_list}
+    assert sadd_calls["cards:index:account:Acme"] == {"CARD-1"}
+    assert sadd_calls["cards:index:engineer:Jane Doe"] == {"CARD-1"}
+    assert sadd_calls["cards:index:status:Closed"] == {"CARD-2"}
+    # unassigned records are indexed under an empty engineer
+    assert sadd_calls["cards:index:engineer:"] == {"CARD-2", "CARD-3"}
+    assert "cards:index:engineer:None" not in sadd_calls
+    assert "cards:index:severity:Low" in sadd_calls["cards:indexes"]
+    pipe.execute.assert_called_once()
+
+
+def test_redis_get_records_fetches_only_matching_members(mock_redis, sample_cards):
+    r_cache = mock_redis.return_value
+    r_cache.exists.return_value = 1
+    r_cache.sinter.return_value = {b"CARD-1"}
+    r_cache.hmget.return_value = [json.dumps(sample_cards["CARD-1"]).encode()]
+
+    result = redis_get_records("cards", account="Acme", engineer="Jane Doe")
+
+    r_cache.sinter.assert_called_once_with(
+        ["cards:index:account:Acme", "cards:index:engineer:Jane Doe"]
+    )
+    r_cache.hmget.assert_called_once_with("cards:records", ["CARD-1"])
+    r_cache.hgetall.assert_not_called()
+    assert result == {"CARD-1": sample_cards["CARD-1"]}
+
+
+def test_redis_get_records_falls_back_to_blob(mock_redis, mocker, sample_cards):
+    mock_redis.return_value.exists.return_value = 0
+    mocker.patch("t5gweb.libtelco5g.redis_get", return_value=sample_cards)
+
+    result = redis_get_records("cards", status="Closed")
+
+    assert result == {"CARD-2": sample_cards["CARD-2"]}
+
+
+@pytest.fixture
+def cached_fake_data(mock_redis, mocker, fake_data):
+    # no per-record layout, so redis_get_records() filters the blobs
+    mock_redis.return_value.exists.return_value = 0
+    mocker.patch(
+        "t5gweb.libtelco5g.redis_get", side_effect=lambda key: fake_data.get(key, {})
+    )
+    return fake_data
+
+
+def test_stats_snapshot_matches_live_stats(mock_redis, cached_fake_data):
+    libtelco5g.refresh_stats_snapshot()
+
+    pipe = mock_redis.return_value.pipeline.return_value
+    pipe.delete.assert_called_once_with("stats_snapshot")
+    mapping = pipe.hset.call_args.kwargs["mapping"]
+    cards = cached_fake_data["cards"].values()
+    pages = [{}]
+    pages += [{"account": account} for account in {c["account"] for c in cards}]
+    pages += [
+        {"engineer": engineer}
+        for engineer in {c["assignee"]["displayName"] for c in cards}
+        if engineer is not None
+    ]
+    assert len(mapping) == len(pages)
+    for page in pages:
+        live = {
+            "stats": libtelco5g.generate_stats(**page),
+            "histogram": libtelco5g.generate_histogram_stats(**page),
+        }
+        field = libtelco5g._stats_field(**page)
+        assert json.loads(mapping[field]) == json.loads(json.dumps(live))
+
+
+def test_stats_snapshot_with_unassigned_card(mock_redis, mocker, fake_data):
+    cards = dict(fake_data["cards"])
+    unassigned = next(iter(cards))
+    cards[unassigned] = dict(cards[unassigned], assignee=None)
+    data = dict(fake_data, cards=cards)
+    mock_redis.return_value.exists.return_value = 0
+    mocker.patch(
+        "t5gweb.libtelco5g.redis_get", side_effect=lambda key: data.get(key, {})
+    )
+
+    libtelco5g.refresh_stats_snapshot()
+
+    mapping = mock_redis.return_value.pipeline.return_value.hset.call_args.kwargs[
+        "mapping"
+    ]
+    stats = json.loads(mapping["global"])["stats"]
+    assert stats == json.loads(json.dumps(libtelco5g.generate_stats()))
+    assert None not in stats["by_engineer"]
+    assert "engineer:None" not in mapping
+
+
+def test_get_stats_snapshot_reads_page_field(mock_redis, mocker):
+    snapshot = {"stats": {"open_cases": 3}, "histogram": {}}
+    mock_redis.return_value.hget.return_value = json.dumps(snapshot).encode()
+    mock_generate = mocker.patch("t5gweb.libtelco5g.generate_stats")
+
+    assert libtelco5g.get_stats_snapshot(account="Acme") == snapshot
+    mock_redis.return_value.hget.assert_called_once_with(
+        "stats_snapshot", "account:Acme"
+    )
+    mock_generate.assert_not_called()
+
+
+def test_get_stats_snapshot_generates_missing_page(mock_redis, mocker):
+    mock_redis.return_value.hget.return_value = None
+    mocker.patch("t5gweb.libtelco5g.generate_stats", return_value={"open_cases": 1})
+    mocker.patch("t5gweb.libtelco5g.generate_histogram_stats", return_value={})
+
+    snapshot = libtelco5g.get_stats_snapshot(engineer="Jane Doe")
+
+    assert snapshot == {"stats": {"open_cases": 1}, "histogram": {}}
+    libtelco5g.generate_stats.assert_called_once_with(None, "Jane Doe")
+
+
+def test_get_stats_snapshot_generates_account_engineer_page(mock_redis, mocker):
+    mocker.patch("t5gweb.libtelco5g.generate_stats", return_value={"open_cases": 1})
+    mocker.patch("t5gweb.libtelco5g.generate_histogram_stats", return_value={})
+
+    snapshot = libtelco5g.get_stats_snapshot(account="Acme", engineer="Jane Doe")
+
+    assert snapshot == {"stats": {"open_cases": 1}, "histogram": {}}
+    mock_redis.return_value.hget.assert_not_called()
+    libtelco5g.generate_stats.assert_called_once_with("Acme", "Jane Doe")
+
+
+def test_build_card_index(sample_cards):
+    sample_cards["CARD-1"]["case_number"] = "0001"
+    sample_cards["CARD-2"]["case_number"] = "0002"
+    sample_cards["CARD-3"] = dict(sample_cards["CARD-1"])
+    sample_cards["CARD-4"] = dict(sample_cards["CARD-2"], assignee=None)
+
+    assert libtelco5g.build_card_index(sample_cards) == {
+        "case_cards": {"0001": ["CARD-1", "CARD-3"], "0002": ["CARD-2", "CARD-4"]},
+        "engineer_cases": {"Jane Doe": ["0001"]},
+    }
+
+
+def scale_fake_data(fake_data, num_cases, num_cards):
+    """Copy the fake cases and cards under new keys until they reach the sizes"""
+    cases = list(fake_data["cases"].items())
+    cards = list(fake_data["cards"].values())
+    scaled_cases = {
+        f"{number}{i // len(cases)}": case
+        for i, (number, case) in enumerate(cases * (num_cases // len(cases)))
+    }
+    scaled_cards = {
+        f"CARD-{i}": dict(card, case_number=f"{card['case_number']}{i // len(cards)}")
+        for i, card in enumerate(cards * (num_cards // len(cards)))
+    }
+    return {"cases": scaled_cases, "cards": scaled_cards, "bugs": {}, "issues": {}}
+
+
+@pytest.mark.performance
+def test_engineer_stats_scale_linearly(mock_redis, mocker, fake_data, record_property):
+    data = scale_fake_data(fake_data, 5000, 1000)
+    data["cards_index"] = libtelco5g.build_card_index(data["cards"])
+    mock_redis.return_value.exists.return_value = 0
+    mocker.patch(
+        "t5gweb.libtelco5g.redis_get", side_effect=lambda key: data.get(key, {})
+    )
+    engineer = next(
+        card["assignee"]["displayName"]
+        for card in data["cards"].values()
+        if card["assignee"]["displayName"] is not None
+    )
+    cards = redis_get_records("cards", engineer=engineer)
+
+    # the nested loop generate_stats() used before the card index
+    start = time.perf_counter()
+    expected = {}
+    for case, details in data["cases"].items():
+        for card in cards:
+            if (
+                case == cards[card]["case_number"]
+                and cards[card]["assignee"]["displayName"] == engineer
+            ):
+                expected[case] = details
+    nested_loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stats = libtelco5g.generate_stats(engineer=engineer)
+    indexed_time = time.perf_counter() - start
+
+    expected_stats = libtelco5g._compute_stats(cards, expected, {}, {})
+    assert stats == expected_stats
+    assert stats["open_cases"] + sum(
+        1 for case in expected.values() if case["status"] == "Closed"
+    ) == len(expected)
+    record_property("nested_loop_seconds", nested_loop_time)
+    record_property("indexed_seconds", indexed_time)
+
+
+def test_query_records_pages_filtered_records(cached_fake_data):
+    closed = sorted(
+        c for (c, d) in cached_fake_data["cases"].items() if d["status"] == "Closed"
+    )
+
+    first, cursor = libtelco5g.query_records(
+        "cases", {"status": "Closed"}, fields=["status"], limit=2
+    )
+    rest, last_cursor = libtelco5g.query_records(
+        "cases", {"status": "Closed"}, fields=["status"], cursor=cursor
+    )
+
+    assert list(first) == closed[:2]
+    assert cursor == closed[1]
+    assert list(rest) == closed[2:]
+    assert last_cursor is None
+    assert all(record == {"status": "Closed"} for record in first.values())
+
+
+def test_query_records_filters_cases_by_engineer_and_update(cached_fake_data):
+    cards = cached_fake_data["cards"].values()
+    engineer = next(c["assignee"]["displayName"] for c in cards)
+    expected = {
+        c["case_number"] for c in cards if c["assignee"]["displayName"] == engineer
+    }
+
+    records, _ = libtelco5g.query_records("cases", {"engineer": engineer})
+    assert set(records) == expected
+
+    updated_since = max(
+        to_epoch(d["last_update"]) for d in cached_fake_data["cases"].values()
+    )
+    records, _ = libtelco5g.query_records("cases", updated_since=updated_since)
+    assert [d["last_update"] for d in records.values()] == [
+        max(d["last_update"] for d in cached_fake_data["cases"].values())
+    ]
+
+
+def test_query_records_rejects_unknown_filter(cached_fake_data):
+    with pytest.raises(ValueError, match="owner"):
+        libtelco5g.query_records("cases", {"owner": "Jane Doe"})
+
+
+def test_get_daily_stats_migrates_legacy_blob(mock_redis):
+    r_cache = mock_redis.return_value
+    pipe = r_cache.pipeline.return_value
+    legacy = {"2024-01-01": {"open_cases": 1}, "2024-01-02": {"open_cases": 2}}
+    r_cache.exists.return_value = 1
+    r_cache.get.return_value = json.dumps(legacy).encode()
+    r_cache.zrangebyscore.return_value = [b"2024-01-02"]
+    r_cache.hmget.return_value = [json.dumps(legacy["2024-01-02"]).encode()]
+
+    result = libtelco5g.get_daily_stats(start="2024-01-02")
+
+    pipe.zadd.assert_called_once_with(
+        "stats:days", {"2024-01-01": 738886, "2024-01-02": 738887}
+    )
+    assert pipe.hsetnx.call_count == 2
+    pipe.delete.assert_called_once_with("stats")
+    r_cache.zrangebyscore.assert_called_once_with("stats:days", 738887, "+inf")
+    r_cache.hmget.assert_called_once_with("stats:daily", ["2024-01-02"])
+    assert result == {"2024-01-02": {"open_cases": 2}}
+
+
+def daily_stats(days):
+    """Stats history of consecutive days from 2024-01-01, open_cases counting up"""
+    start = datetime.date(2024, 1, 1)
+    return {
+        (start + datetime.timedelta(days=i)).isoformat(): {
+            "open_cases": i,
+            "bugs": {"unique": 1},
+        }
+        for i in range(days)
+    }
+
+
+@pytest.mark.parametrize(
+    "days, x_values, open_cases",
+    [
+        (3, ["2024-01-01", "2024-01-02", "2024-01-03"], [0, 1, 2]),
+        # 2024-01-01 is a Monday
+        (100, ["2024-01-01", "2024-01-08"], [3, 10]),
+        (800, ["2024-01-01", "2024-02-01"], [15, 45]),
+    ],
+)
+def test_plot_stats_downsamples_long_ranges(mocker, days, x_values, open_cases):
+    mocker.patch("t5gweb.libtelco5g.get_daily_stats", return_value=daily_stats(days))
+
+    x, y = libtelco5g.plot_stats()
+
+    assert x[: len(x_values)] == x_values
+    assert y["open_cases"][: len(open_cases)] == open_cases
+    assert set(y["bugs_unique"]) == {1}
+    assert y["escalated"][0] == 0
+
+
+def with_epochs(data):
+    """Copy of fake data with the epoch fields added at ingestion"""
+    cases = {
+        number: dict(
+            case,
+            **{
+                f"{key}_ts": to_epoch(case[key])
+                for key in ("createdate", "last_update", "closeddate")
+                if key in case
+            },
+        )
+        for (number, case) in data["cases"].items()
+    }
+    cards = {
+        key: dict(
+            card,
+            **{
+                f"{field}_ts": to_epoch(card[field])
+                for field in ("case_created", "resolved_at", "relief_at")
+                if card[field] is not None
+            },
+        )
+        for (key, card) in data["cards"].items()
+    }
+    return dict(data, cases=cases, cards=cards)
+
+
+def run_engine(mocker, engine, data):
+    """Stats and histograms of data computed by an engine, and the time taken"""
+    mocker.patch.object(libtelco5g, "_stats_engine_name", engine)
+    start = time.perf_counter()
+    stats = libtelco5g._compute_stats(
+        data["cards"], data["cases"], data["bugs"], data["issues"]
+    )
+    histogram = libtelco5g._compute_histogram_stats(data["cards"])
+    seconds = time.perf_counter() - start
+    # compare the serialized form, so types and float bits must match as well
+    return json.dumps({"stats": stats, "histogram": histogram}), seconds
+
+
+@pytest.mark.parametrize("epochs", [False, True])
+def test_numpy_engine_matches_python_engine(mocker, fake_data, epochs):
+    pytest.importorskip("numpy")
+    data = with_epochs(fake_data) if epochs else fake_data
+
+    numpy_result, _ = run_engine(mocker, "numpy", data)
+    python_result, _ = run_engine(mocker, "python", data)
+
+    assert numpy_result == python_result
+
+
+@pytest.mark.parametrize("epochs", [False, True])
+def test_numpy_engine_skips_missing_dates(mocker, fake_data, epochs):
+    pytest.importorskip("numpy")
+    data = with_epochs(fake_data) if epochs else fake_data
+    cases = dict(data["cases"])
+    closed = next(c for (c, d) in cases.items() if d["status"] == "Closed")
+    cases[closed] = {
+        k: v for (k, v) in cases[closed].items() if not k.startswith("closeddate")
+    }
+    data = dict(data, cases=cases)
+
+    numpy_result, _ = run_engine(mocker, "numpy", data)
+    python_result, _ = run_engine(mocker, "python", data)
+
+    assert numpy_result == python_result
+
+
+def test_stats_engine_falls_back_without_numpy(mocker):
+    mocker.patch.object(libtelco5g, "_stats_engine_name", None)
+    mocker.patch.object(libtelco5g, "stats_numpy", None)
+    mocker.patch("t5gweb.libtelco5g.set_cfg", return_value={"stats_engine": "numpy"})
+
+    assert libtelco5g._stats_engine() == "python"
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("num_cards", [1000, 10000, 100000])
+def test_numpy_engine_benchmark(mocker, fake_data, record_property, num_cards):
+    pytest.importorskip("numpy")
+    data = with_epochs(scale_fake_data(fake_data, num_cards, num_cards))
+
+    results = {}
+    for engine in ("python", "numpy"):
+        results[engine], seconds = run_engine(mocker, engine, data)
+        record_property(f"{engine}_seconds", seconds)
+
+    assert results["numpy"] == results["python"]
+
+
+@pytest.fixture
+def fresh_redis_client(mocker):
+    mocker.patch.object(libtelco5g, "_redis_client", None)
+    mocker.patch.object(libtelco5g, "_redis_connections_opened", 0)
+
+
+def test_redis_connection_is_shared(fresh_redis_client, mocker):
+    mock_pool = mocker.patch("t5gweb.libtelco5g.redis.BlockingConnectionPool")
+    mock_client = mocker.patch("t5gweb.libtelco5g.redis.Redis")
+
+    first = redis_connection()
+    second = redis_connection()
+
+    assert first is second
+    mock_pool.assert_called_once()
+    mock_client.assert_called_once_with(connection_pool=mock_pool.return_value)
+    pool_kwargs = mock_pool.call_args.kwargs
+    assert pool_kwargs["host"] == "redis"
+    assert pool_kwargs["port"] == 6379
+    assert pool_kwargs["max_connections"] == 20
+
+
+def test_redis_connection_counts_new_sockets(fresh_redis_client, mocker):
+    mocker.patch("t5gweb.libtelco5g.redis.Connection._connect")
+    connection = libtelco5g._CountingConnection(host="redis")
+
+    connection._connect()
+    connection._connect()
+
+    assert libtelco5g._redis_connections_opened == 2
+
+
+def test_card_writer_status_reports_oldest_pending_batch(mock_redis, mocker):
+    mocker.patch("t5gweb.libtelco5g.time.time", return_value=1000.0)
+    mock_redis.return_value.hvals.return_value = [
+        json.dumps({"queued_at": 940.0, "cards": 500}),
+        json.dumps({"queued_at": 990.0, "cards": 20}),
+    ]
+    mock_redis.return_value.hgetall.return_value = {b"last_written": b"900.5"}
+
+    assert libtelco5g.card_writer_status() == {
+        "pending_batches": 2,
+        "pending_cards": 520,
+        "lag_seconds": 60.0,
+        "last_written": 900.5,
+        "failed_batches": 0,
+    }
+
+
+def test_card_writer_status_without_pending_batches(mock_redis):
+    mock_redis.return_value.hvals.return_value = []
+    mock_redis.return_value.hgetall.return_value = {}
+
+    status = libtelco5g.card_writer_status()
+
+    assert status["lag_seconds"] == 0
+    assert status["last_written"] is None
+
+
 @pytest.mark.parametrize(
     "link, pfilter, expected_case_number",
     [
@@ -1,5 +1,15 @@
+import datetime
+
 import pytest
-from t5gweb.utils import exists_or_zero, get_random_member, set_defaults
+from t5gweb.utils import (
+    card_engineer,
+    comment_epoch,
+    days_since,
+    exists_or_zero,
+    get_random_member,
+    set_defaults,
+    to_epoch,
+)
 
 
 @pytest.mark.parametrize(
@@ -21,6 +31,56 @@ def sample_team():
     return ["Alice", "Bob", "Charlie", "David"]
 
 
+@pytest.mark.parametrize(
+    "the_date, expected",
+    [("1970-01-02T00:00:00Z", 86400.0), (1700000000000, 1700000000.0)],
+)
+def test_to_epoch(the_date, expected):
+    assert to_epoch(the_date) == expected
+
+
+@pytest.mark.parametrize(
+    "the_date",
+    ["2024-03-25T23:59:59Z", "2024-03-26T00:00:00Z", "2024-03-19T12:00:00Z"],
+)
+def test_days_since_matches_parsed_date(the_date):
+    today = datetime.date(2024, 3, 26)
+    legacy = {"createdate": the_date}
+    ingested = {"createdate": the_date, "createdate_ts": to_epoch(the_date)}
+
+    expected = (
+        today - datetime.datetime.strptime(the_date, "%Y-%m-%dT%H:%M:%SZ").date()
+    ).days
+    assert days_since(legacy, "createdate", today) == expected
+    assert days_since(ingested, "createdate", today) == expected
+
+
+@pytest.mark.parametrize(
+    "assignee, expected",
+    [
+        ({"displayName": "Jane Doe"}, "Jane Doe"),
+        ({"displayName": None}, None),
+        (None, None),
+    ],
+)
+def test_card_engineer(assignee, expected):
+    assert card_engineer({"assignee": assignee}) == expected
+
+
+def test_days_since_missing_date():
+    today = datetime.date(2024, 3, 26)
+
+    assert days_since({}, "closeddate", today) is None
+    assert days_since({"closeddate": None}, "closeddate", today) is None
+
+
+def test_comment_epoch():
+    assert comment_epoch("1970-01-01T01:00:00.500+0100") == 0.5
+    assert comment_epoch("2023-05-17T05:44:05.830199Z") == pytest.approx(
+        to_epoch("2023-05-17T05:44:05Z") + 0.830199
+    )
+
+
 def test_get_random_member_basic(sample_team):
     result = get_random_member(sample_team)
     assert result in sample_team
@@ -90,3 +150,19 @@ def test_set_default():
     assert defaults["low_severity_slack_channel"] == ""
     assert defaults["max_jira_results"] == 1000
     assert defaults["max_portal_results"] == 5000
+    assert defaults["portal_workers"] == 8
+    assert defaults["bz_chunk_size"] == 100
+    assert defaults["postgres_batch_size"] == 500
+    assert defaults["postgres_pool_size"] == 5
+    assert defaults["postgres_max_overflow"] == 10
+    assert defaults["postgres_pool_timeout"] == 30
+    assert defaults["postgres_statement_timeout"] == 0
+    assert defaults["card_full_sync_hours"] == 24
+    assert defaults["case_full_sync_hours"] == 24
+    assert defaults["redis_host"] == "redis"
+    assert defaults["redis_port"] == 6379
+    assert defaults["redis_compression"] == "none"
+    assert defaults["redis_serializer"] == "json"
+    assert defaults["stats_engine"] == "python"
+    assert defaults["redis_db"] == 0
+    assert defaults["redis_max_connections"] == 20